@@ -0,0 +1,79 @@
+# This Python file uses the following encoding: utf-8
+""" Replays synthetic blocks from a local stand-in node through the threaded
+    Blockchain.blocks() and checks that the resident memory stays flat.
+
+    The blocks are requested over http from a :class:`morphenepythonapi.localnode.LocalNode`,
+    so that the http client, its connection pool and the worker threads are part
+    of the measurement. After the warmup, the RSS is sampled in regular intervals
+    and all samples have to stay within ``--max-spread-mb``.
+
+    Usage::
+
+        python benchmarks/blocks_memory.py --blocks 1000000 --threads 8
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import argparse
+import os
+import resource
+import sys
+import time
+from morphenepython import MorpheneClient
+from morphenepython.blockchain import Blockchain
+from morphenepythonapi.localnode import LocalNode, SyntheticChain
+
+
+def current_rss():
+    """Returns the resident set size of this process in bytes"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (IOError, OSError):
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == "darwin":
+            return rss
+        return rss * 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--blocks", type=int, default=1000000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--read-ahead", type=int, default=None)
+    parser.add_argument("--warmup", type=int, default=50000,
+                        help="blocks after which the RSS sampling starts")
+    parser.add_argument("--samples", type=int, default=20,
+                        help="number of RSS samples after the warmup")
+    parser.add_argument("--max-spread-mb", type=float, default=8.,
+                        help="largest allowed difference between the RSS samples")
+    args = parser.parse_args()
+    warmup = min(args.warmup, args.blocks // 2)
+    interval = max(1, (args.blocks - warmup) // args.samples)
+
+    chain = SyntheticChain(head_block_num=args.blocks + 1, irreversible_lag=0)
+    with LocalNode(chain) as node:
+        mph = MorpheneClient(node=node.url, handshake_cache=False, node_stats={})
+        blockchain = Blockchain(morphene_instance=mph)
+        samples = []
+        start_time = time.time()
+        for block in blockchain.blocks(start=1, stop=args.blocks, threading=True, thread_num=args.threads,
+                                       read_ahead=args.read_ahead):
+            block_num = block.block_num
+            if block_num >= warmup and (block_num - warmup) % interval == 0:
+                samples.append(current_rss())
+        duration = time.time() - start_time
+        requests = node.stats["requests"]
+    spread_mb = (max(samples) - min(samples)) / 1024. / 1024.
+    print("blocks: %d, requests: %d, duration: %.1f s, %.0f blocks/s" % (
+        args.blocks, requests, duration, args.blocks / duration))
+    print("rss samples: %s MB" % ", ".join("%.1f" % (rss / 1024. / 1024.) for rss in samples))
+    print("rss after warmup: %.1f MB, final rss: %.1f MB, spread: %.1f MB" % (
+        samples[0] / 1024. / 1024., samples[-1] / 1024. / 1024., spread_mb))
+    assert spread_mb <= args.max_spread_mb, "RSS is not flat, the samples spread by %.1f MB" % spread_mb
+
+
+if __name__ == "__main__":
+    main()
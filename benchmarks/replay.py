@@ -0,0 +1,73 @@
+# This Python file uses the following encoding: utf-8
+""" Records the rpc traffic of a workload to a cassette, or replays a cassette
+    to time the library against exactly the same traffic.
+
+    Usage::
+
+        python benchmarks/replay.py record --node https://morphene.io/rpc \\
+            --cassette stream.cassette.gz --workload stream --start 1000000 --blocks 100000
+        python benchmarks/replay.py replay --cassette stream.cassette.gz \\
+            --workload stream --start 1000000 --blocks 100000
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import argparse
+import time
+from morphenepython import MorpheneClient
+from morphenepython.account import Account
+from morphenepython.blockchain import Blockchain
+
+
+def run_workload(mph, args):
+    """Runs the workload and returns the number of processed items"""
+    count = 0
+    if args.workload == "history":
+        account = Account(args.account, morphene_instance=mph)
+        for op in account.history(batch_size=args.batch_size):
+            count += 1
+    else:
+        blockchain = Blockchain(morphene_instance=mph)
+        for op in blockchain.stream(start=args.start, stop=args.start + args.blocks - 1,
+                                    max_batch_size=args.max_batch_size):
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("mode", choices=["record", "replay"])
+    parser.add_argument("--cassette", required=True)
+    parser.add_argument("--node", default=None, help="node url, needed for record")
+    parser.add_argument("--workload", choices=["history", "stream"], default="stream")
+    parser.add_argument("--account", default="morphene")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--start", type=int, default=1)
+    parser.add_argument("--blocks", type=int, default=1000)
+    parser.add_argument("--max-batch-size", type=int, default=None)
+    parser.add_argument("--realtime", action="store_true",
+                        help="replay with the recorded latency of every request")
+    args = parser.parse_args()
+
+    if args.mode == "record":
+        mph = MorpheneClient(node=args.node, record=args.cassette, num_retries=10)
+    else:
+        mph = MorpheneClient(node=args.node or "", replay=args.cassette, replay_realtime=args.realtime)
+    start_time = time.time()
+    try:
+        count = run_workload(mph, args)
+    finally:
+        mph.rpc.stop_recording()
+    duration = time.time() - start_time
+    metrics = mph.rpc.metrics()
+    requests = sum(m["requests"] for node in metrics.values() for m in node.get("methods", {}).values())
+    print("%s %s: %d items, %d requests, duration: %.2f s, %.0f items/s" % (
+        args.mode, args.workload, count, requests, duration, count / max(duration, 1e-9)))
+    if args.mode == "replay" and mph.rpc.cassette_player.misses > 0:
+        print("%d requests were not found on the cassette" % mph.rpc.cassette_player.misses)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,7 @@ __all__ = [
     "amount",
     "asset",
     "block",
+    "blockarchive",
     "blockchain",
     "storage",
     "utils",
@@ -18,5 +19,6 @@ __all__ = [
     "profile",
     "nodelist",
     "imageuploader",
-    "snapshot"
+    "snapshot",
+    "streamconsumer"
 ]
@@ -14,6 +14,7 @@ from prettytable import PrettyTable
 from morphenepython.instance import shared_morphene_instance
 from .exceptions import AccountDoesNotExistsException, OfflineHasNoRPCException
 from morphenepythonapi.exceptions import ApiNotSupported, MissingRequiredActiveAuthority
+from morphenepythonapi import jsoncodec
 from .blockchainobject import BlockchainObject
 from .blockchain import Blockchain
 from .utils import formatTimeString, formatTimedelta, remove_from_dict, addTzInfo
@@ -188,7 +189,7 @@ class Account(BlockchainObject):
             if p in output:
                 if p in output:
                     output[p] = output.get(p).json()
-        return json.loads(str(json.dumps(output)))
+        return jsoncodec.loads(jsoncodec.dumpb(output))
 
     def get_rc(self):
         """Return RC of account"""
@@ -1845,12 +1846,12 @@ class Accounts(AccountsObject):
         if not self.morphene.is_connected():
             return
         accounts = []
-        name_cnt = 0
-
-        while name_cnt < len(name_list):
-            self.morphene.rpc.set_next_node_on_empty_reply(False)
-            accounts += self.morphene.rpc.get_accounts(name_list[name_cnt:batch_limit + name_cnt])
-            name_cnt += batch_limit
+        self.morphene.rpc.set_next_node_on_empty_reply(False)
+        with self.morphene.rpc.batch() as batch:
+            for name_cnt in range(0, len(name_list), batch_limit):
+                batch.get_accounts(name_list[name_cnt:batch_limit + name_cnt])
+        for future in batch.futures:
+            accounts += future.result()
 
         super(Accounts, self).__init__(
             [
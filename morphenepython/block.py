@@ -4,11 +4,11 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 from datetime import datetime, timedelta, date
-import json
 from .exceptions import BlockDoesNotExistsException
 from .utils import parse_time, formatTimeString
 from .blockchainobject import BlockchainObject
 from morphenepythonapi.exceptions import ApiNotSupported
+from morphenepythonapi import jsoncodec
 from morphenepythongraphenebase.py23 import bytes_types, integer_types, string_types, text_type
 
 
@@ -115,36 +115,96 @@ class Block(BlockchainObject):
                 if 'timestamp' in output["operations"][i] and isinstance(output["operations"][i]["timestamp"], (datetime, date)):
                     output["operations"][i]["timestamp"] = formatTimeString(output["operations"][i]["timestamp"])
 
-        ret = json.loads(str(json.dumps(output)))
+        ret = jsoncodec.loads(jsoncodec.dumpb(output))
         output = self._parse_json_data(output)
         return ret
 
     def refresh(self):
         """ Even though blocks never change, you freshly obtain its contents
             from an API with this method
+
+            Irreversible blocks are taken from the immutable cache tier, when available,
+            and full blocks from the block archive of the client, see
+            :class:`morphenepython.blockarchive.BlockArchive`.
         """
         if self.identifier is None:
             return
-        if not self.morphene.is_connected():
-            return
-        self.morphene.rpc.set_next_node_on_empty_reply(False)
-        if self.only_ops or self.only_virtual_ops:
-            ops = self.morphene.rpc.get_ops_in_block(self.identifier, self.only_virtual_ops)
-            if bool(ops):
-                block = {'block': ops[0]["block"],
-                         'timestamp': ops[0]["timestamp"],
-                         'operations': ops}
+        cache_key = self._get_immutable_cache_key()
+        block = None
+        if cache_key is not None:
+            block = self.getcache_immutable(cache_key)
+        if block is None and cache_key is not None and not self.only_ops and not self.only_virtual_ops and \
+                self.morphene.block_archive is not None:
+            block = self.morphene.block_archive.get(cache_key[0])
+            if block is not None:
+                block = self._parse_json_data(block)
+        if block is None:
+            if not self.morphene.is_connected():
+                return
+            self.morphene.rpc.set_next_node_on_empty_reply(False)
+            if self.only_ops or self.only_virtual_ops:
+                ops = self.morphene.rpc.get_ops_in_block(self.identifier, self.only_virtual_ops)
+                if bool(ops):
+                    block = {'block': ops[0]["block"],
+                             'timestamp': ops[0]["timestamp"],
+                             'operations': ops}
+                else:
+                    block = {'block': self.identifier,
+                             'timestamp': "1970-01-01T00:00:00",
+                             'operations': []}
             else:
-                block = {'block': self.identifier,
-                         'timestamp': "1970-01-01T00:00:00",
-                         'operations': []}
-        else:
-            block = self.morphene.rpc.get_block(self.identifier)
-        if not block:
-            raise BlockDoesNotExistsException("output: %s of identifier %s" % (str(block), str(self.identifier)))
-        block = self._parse_json_data(block)
+                block = self.morphene.rpc.get_block(self.identifier)
+            if not block:
+                raise BlockDoesNotExistsException("output: %s of identifier %s" % (str(block), str(self.identifier)))
+            block = self._parse_json_data(block)
+            if cache_key is not None and self._is_irreversible(cache_key[0]):
+                self.cache_immutable(cache_key, block)
         super(Block, self).__init__(block, lazy=self.lazy, full=self.full, morphene_instance=self.morphene)
 
+    @staticmethod
+    def immutable_cache_key(block_num, only_ops=False, only_virtual_ops=False):
+        """ Returns the key of a block within the immutable cache tier
+
+            :param int block_num: block number
+            :param bool only_ops: Includes only operations (default: False)
+            :param bool only_virtual_ops: Includes only virtual operations (default: False)
+        """
+        if only_virtual_ops:
+            flavour = "only_virtual_ops"
+        elif only_ops:
+            flavour = "only_ops"
+        else:
+            flavour = "full"
+        return (int(block_num), flavour)
+
+    @staticmethod
+    def is_immutable_cached(block_num, only_ops=False, only_virtual_ops=False):
+        """ Returns True when the block is stored in the immutable cache tier
+
+            :param int block_num: block number
+            :param bool only_ops: Includes only operations (default: False)
+            :param bool only_virtual_ops: Includes only virtual operations (default: False)
+        """
+        key = Block.immutable_cache_key(block_num, only_ops=only_ops, only_virtual_ops=only_virtual_ops)
+        return BlockchainObject._immutable_cache.contains(key, namespace=Block.__name__)
+
+    def cache_if_irreversible(self):
+        """ Stores the block in the immutable cache tier, when it is below the
+            last irreversible block
+        """
+        cache_key = self._get_immutable_cache_key()
+        if cache_key is not None and self._is_irreversible(cache_key[0]):
+            self.cache_immutable(cache_key, dict(self))
+
+    def _get_immutable_cache_key(self):
+        if not isinstance(self.identifier, integer_types):
+            return None
+        return self.immutable_cache_key(self.identifier, only_ops=self.only_ops, only_virtual_ops=self.only_virtual_ops)
+
+    def _is_irreversible(self, block_num):
+        last_irreversible_block_num = self.morphene.get_last_irreversible_block_num()
+        return last_irreversible_block_num is not None and block_num <= last_irreversible_block_num
+
     @property
     def block_num(self):
         """Returns the block number"""
@@ -313,14 +373,26 @@ class BlockHeader(BlockchainObject):
     def refresh(self):
         """ Even though blocks never change, you freshly obtain its contents
             from an API with this method
+
+            Irreversible block headers are taken from the immutable cache tier, when available.
         """
-        if not self.morphene.is_connected():
-            return None
-        self.morphene.rpc.set_next_node_on_empty_reply(False)
-        block = self.morphene.rpc.get_block_header(self.identifier)
-        if not block:
-            raise BlockDoesNotExistsException(str(self.identifier))
-        block = self._parse_json_data(block)
+        cache_key = None
+        if isinstance(self.identifier, integer_types):
+            cache_key = (int(self.identifier), "header")
+        block = None
+        if cache_key is not None:
+            block = self.getcache_immutable(cache_key)
+        if block is None:
+            if not self.morphene.is_connected():
+                return None
+            self.morphene.rpc.set_next_node_on_empty_reply(False)
+            block = self.morphene.rpc.get_block_header(self.identifier)
+            if not block:
+                raise BlockDoesNotExistsException(str(self.identifier))
+            block = self._parse_json_data(block)
+            last_irreversible_block_num = self.morphene.get_last_irreversible_block_num()
+            if cache_key is not None and last_irreversible_block_num is not None and cache_key[0] <= last_irreversible_block_num:
+                self.cache_immutable(cache_key, block)
         super(BlockHeader, self).__init__(
             block, lazy=self.lazy, full=self.full,
             morphene_instance=self.morphene
@@ -357,4 +429,4 @@ class BlockHeader(BlockchainObject):
                     output[p] = formatTimeString(p_date)
                 else:
                     output[p] = p_date
-        return json.loads(str(json.dumps(output)))
+        return jsoncodec.loads(jsoncodec.dumpb(output))
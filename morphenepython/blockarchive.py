@@ -0,0 +1,267 @@
+# This Python file uses the following encoding: utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from builtins import object, range
+import io
+import os
+import struct
+import threading
+import zlib
+import logging
+from morphenepythonapi import jsoncodec
+
+log = logging.getLogger(__name__)
+
+#: Version of the archive format
+ARCHIVE_VERSION = 1
+
+#: Number of blocks per segment file
+DEFAULT_SEGMENT_SIZE = 100000
+
+#: Index entry of a block: offset and length of its record in the data file, crc32 of the record
+INDEX_ENTRY = struct.Struct("<QII")
+
+_META_FILE = "archive.json"
+
+
+class BlockArchive(object):
+    """ Append-only archive of raw blocks on disk, with random access by block number.
+
+        The blocks are stored in segments of ``segment_size`` consecutive block numbers.
+        Every segment consists of a data file, to which the zlib compressed block json is
+        appended, and an index file with a fixed-width entry (offset, length, crc32) per
+        block number. A block is read with one read of its index entry and one read of
+        its record, and a block which is stored once is never changed.
+
+        :param str path: Directory of the archive, it is created when missing
+        :param int segment_size: Blocks per segment, only used for a new archive
+            (default is 100000)
+        :param int compresslevel: zlib compression level (default is 6)
+
+        .. code-block:: python
+
+            from morphenepython import MorpheneClient
+            from morphenepython.blockchain import Blockchain
+            mph = MorpheneClient(block_archive="/data/blocks")
+            Blockchain(morphene_instance=mph).archive(1, 1000000)
+            # Block and Blockchain.blocks() read archived blocks from disk
+            for block in Blockchain(morphene_instance=mph).blocks(start=1, stop=1000000):
+                print(block.block_num)
+
+        Only irreversible blocks should be stored, as an archived block is never replaced.
+        The archive can be read by several threads, writes are serialized.
+    """
+    def __init__(self, path, segment_size=DEFAULT_SEGMENT_SIZE, compresslevel=6):
+        self.path = path
+        self.compresslevel = compresslevel
+        self.lock = threading.RLock()
+        self._segments = {}
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        meta_file = os.path.join(path, _META_FILE)
+        if os.path.isfile(meta_file):
+            with io.open(meta_file, "rb") as f:
+                meta = jsoncodec.loads(f.read())
+            if meta.get("version") != ARCHIVE_VERSION:
+                raise ValueError("Block archive %s has version %s, version %d is supported" % (
+                    path, str(meta.get("version")), ARCHIVE_VERSION))
+            segment_size = meta["segment_size"]
+        else:
+            with io.open(meta_file, "wb") as f:
+                f.write(jsoncodec.dumpb({"version": ARCHIVE_VERSION, "segment_size": segment_size,
+                                         "compression": "zlib"}))
+        self.segment_size = segment_size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __contains__(self, block_num):
+        return self._get_entry(block_num) is not None
+
+    def _get_segment(self, segment, create=False):
+        """ Returns the file descriptors of the data and index file of a segment,
+            or None when the segment does not exist and create is False
+        """
+        fds = self._segments.get(segment)
+        if fds is None:
+            with self.lock:
+                fds = self._segments.get(segment)
+                if fds is None:
+                    name = os.path.join(self.path, "blocks-%010d" % (segment * self.segment_size))
+                    if not create and not os.path.isfile(name + ".idx"):
+                        return None
+                    flags = os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0)
+                    fds = (os.open(name + ".dat", flags, 0o644), os.open(name + ".idx", flags, 0o644))
+                    self._segments[segment] = fds
+        return fds
+
+    def _pread(self, fd, size, offset):
+        if hasattr(os, "pread"):
+            return os.pread(fd, size, offset)
+        with self.lock:
+            os.lseek(fd, offset, os.SEEK_SET)
+            return os.read(fd, size)
+
+    def _read_index(self, block_num, count=1):
+        """Returns the index entries of count blocks from block_num on, None for missing blocks"""
+        entries = []
+        while count > 0:
+            segment, slot = divmod(block_num, self.segment_size)
+            n = min(count, self.segment_size - slot)
+            fds = self._get_segment(segment)
+            data = b""
+            if fds is not None:
+                data = self._pread(fds[1], n * INDEX_ENTRY.size, slot * INDEX_ENTRY.size)
+            for i in range(n):
+                entry = None
+                if (i + 1) * INDEX_ENTRY.size <= len(data):
+                    entry = INDEX_ENTRY.unpack_from(data, i * INDEX_ENTRY.size)
+                    if entry[1] == 0:
+                        entry = None
+                entries.append(entry)
+            block_num += n
+            count -= n
+        return entries
+
+    def _get_entry(self, block_num):
+        if block_num < 0:
+            return None
+        return self._read_index(block_num)[0]
+
+    def _read_record(self, block_num, entry):
+        """Returns the compressed record of an index entry, or None when it is damaged"""
+        offset, length, crc = entry
+        record = self._pread(self._get_segment(block_num // self.segment_size)[0], length, offset)
+        if len(record) != length or zlib.crc32(record) & 0xffffffff != crc:
+            log.warning("Block %d of the archive %s is damaged" % (block_num, self.path))
+            return None
+        return record
+
+    def get_raw(self, block_num):
+        """ Returns the json of an archived block as bytes, or None when it is not
+            archived or its record is damaged
+
+            :param int block_num: Block number
+        """
+        block_num = int(block_num)
+        entry = self._get_entry(block_num)
+        if entry is None:
+            return None
+        record = self._read_record(block_num, entry)
+        if record is None:
+            return None
+        return zlib.decompress(record)
+
+    def get(self, block_num):
+        """ Returns an archived block as dict, or None when it is not archived
+            or its record is damaged
+
+            :param int block_num: Block number
+        """
+        raw = self.get_raw(block_num)
+        if raw is None:
+            return None
+        return jsoncodec.loads(raw)
+
+    def put(self, block_num, block):
+        """ Appends a block, a block which is already archived is not changed,
+            unless its record is damaged. Returns True when the block was added.
+
+            :param int block_num: Block number
+            :param block: Block as dict or as encoded json
+        """
+        block_num = int(block_num)
+        if block_num < 0:
+            raise ValueError("Invalid block number %d" % block_num)
+        if not isinstance(block, bytes):
+            block = jsoncodec.dumpb(block)
+        record = zlib.compress(block, self.compresslevel)
+        segment, slot = divmod(block_num, self.segment_size)
+        with self.lock:
+            data_fd, index_fd = self._get_segment(segment, create=True)
+            entry = self._get_entry(block_num)
+            if entry is not None and self._read_record(block_num, entry) is not None:
+                return False
+            offset = os.lseek(data_fd, 0, os.SEEK_END)
+            self._write(data_fd, record)
+            # The index entry is written after its record, so that it never points to missing data
+            os.lseek(index_fd, slot * INDEX_ENTRY.size, os.SEEK_SET)
+            self._write(index_fd, INDEX_ENTRY.pack(offset, len(record), zlib.crc32(record) & 0xffffffff))
+        return True
+
+    @staticmethod
+    def _write(fd, data):
+        while data:
+            written = os.write(fd, data)
+            data = data[written:]
+
+    def missing_ranges(self, start, stop):
+        """ Returns the ranges of block numbers from start to stop (including stop),
+            which are not archived, as list of (first, last) tuples. Only the index
+            is read, a damaged record is detected when the block is read.
+
+            :param int start: First block number
+            :param int stop: Last block number
+        """
+        ranges = []
+        first = None
+        block_num = start
+        while block_num <= stop:
+            count = min(stop - block_num + 1, self.segment_size)
+            for entry in self._read_index(block_num, count):
+                if entry is None and first is None:
+                    first = block_num
+                elif entry is not None and first is not None:
+                    ranges.append((first, block_num - 1))
+                    first = None
+                block_num += 1
+        if first is not None:
+            ranges.append((first, stop))
+        return ranges
+
+    def archived_until(self, start):
+        """ Returns the last block number of the archived blocks which follow on start
+            without a gap, or start - 1 when start is not archived
+
+            :param int start: First block number
+        """
+        block_num = start
+        while True:
+            count = self.segment_size - block_num % self.segment_size
+            for entry in self._read_index(block_num, count):
+                if entry is None:
+                    return block_num - 1
+                block_num += 1
+
+    def flush(self):
+        """Writes the archived blocks to the disk"""
+        with self.lock:
+            for fds in self._segments.values():
+                for fd in fds:
+                    os.fsync(fd)
+
+    def close(self):
+        """Closes all segment files"""
+        with self.lock:
+            for fds in self._segments.values():
+                for fd in fds:
+                    os.close(fd)
+            self._segments = {}
+
+
+def get_block_archive(block_archive):
+    """ Returns a :class:`BlockArchive` for the ``block_archive`` argument of
+        :class:`morphenepython.morphene.MorpheneClient`
+
+        :param block_archive: Directory of the archive, a :class:`BlockArchive` or None
+    """
+    if not block_archive:
+        return None
+    if isinstance(block_archive, BlockArchive):
+        return block_archive
+    return BlockArchive(block_archive)
@@ -12,8 +12,7 @@ import time
 import hashlib
 import json
 import math
-from threading import Thread, Event
-from time import sleep
+from threading import Thread, Event, Condition
 import logging
 from datetime import datetime, timedelta
 from .utils import formatTimeString, addTzInfo
@@ -21,155 +20,154 @@ from .block import Block
 from morphenepythonapi.node import Nodes
 from morphenepythonapi.morphenenoderpc import MorpheneNodeRPC
 from .exceptions import BatchedCallsNotSupported, BlockDoesNotExistsException, BlockWaitTimeExceeded, OfflineHasNoRPCException
-from morphenepythonapi.exceptions import NumRetriesReached
+from morphenepythonapi.exceptions import NumRetriesReached, NoMethodWithName, NoApiWithName, ApiNotSupported
+from morphenepythonapi.priority import BULK
+from morphenepythonapi.batchsize import AdaptiveBatchSize
 from morphenepythongraphenebase.py23 import py23_bytes
+from .blockarchive import get_block_archive
 from morphenepython.instance import shared_morphene_instance
 from .amount import Amount
-import morphenepython as mph
 log = logging.getLogger(__name__)
+
+#: Largest number of blocks which ``block_api.get_block_range`` returns in one call
+BLOCK_RANGE_LIMIT = 1000
+
 if sys.version_info < (3, 0):
-    from Queue import Queue
+    from Queue import PriorityQueue
 else:
-    from queue import Queue
-FUTURES_MODULE = None
-if not FUTURES_MODULE:
-    try:
-        from concurrent.futures import ThreadPoolExecutor, wait, as_completed
-        FUTURES_MODULE = "futures"
-        # FUTURES_MODULE = None
-    except ImportError:
-        FUTURES_MODULE = None
-
-
-# default exception handler. if you want to take some action on failed tasks
-# maybe add the task back into the queue, then make your own handler and pass it in
-def default_handler(name, exception, *args, **kwargs):
-    log.warn('%s raised %s with args %s and kwargs %s' % (name, str(exception), repr(args), repr(kwargs)))
-    pass
-
-
-class Worker(Thread):
-    """Thread executing tasks from a given tasks queue"""
-    def __init__(self, name, queue, results, abort, idle, exception_handler):
-        Thread.__init__(self)
-        self.name = name
-        self.queue = queue
-        self.results = results
-        self.abort = abort
-        self.idle = idle
-        self.exception_handler = exception_handler
-        self.daemon = True
-        self.start()
-
-    def run(self):
-        """Thread work loop calling the function with the params"""
-        # keep running until told to abort
-        while not self.abort.is_set():
-            try:
-                # get a task and raise immediately if none available
-                func, args, kwargs = self.queue.get(False)
-                self.idle.clear()
-            except:
-                # no work to do
-                # if not self.idle.is_set():
-                #  print >> stdout, '%s is idle' % self.name
-                self.idle.set()
-                # time.sleep(1)
-                continue
+    from queue import PriorityQueue
+
+
+class BlockFetcher(object):
+    """ Fetches blocks in parallel and yields them strictly in order
+
+        :param list morphene_instances: One MorpheneClient instance per
+            worker thread. As a client can be shared by threads, the same
+            instance may be given several times.
+        :param int read_ahead: Maximum number of blocks which are requested
+            or waiting to be consumed ahead of the next block to yield.
+            Defaults to twice the number of workers.
+        :param bool only_ops: Only fetch operations (default: False)
+        :param bool only_virtual_ops: Only fetch virtual operations (default: False)
+        :param int max_retries: Number of times a block which failed or came back
+            wrong is requested again, before the error is raised (default is 3)
+        :param float retry_delay: Seconds to wait before the first repetition of a
+            block, doubled for every further one (default is 0.5)
+        :param float timeout: Seconds to wait for a requested block, before
+            ``BlockWaitTimeExceeded`` is raised (default is 300)
+
+        Up to ``read_ahead`` block numbers are kept in flight at any time.
+        A new request is issued as soon as a block is handed to the
+        consumer, so the workers keep fetching while the consumer works,
+        and stop when the consumer falls ``read_ahead`` blocks behind.
+        Failed blocks are requested again before any later block, with a
+        growing delay between the repetitions.
+        Only the window between the next block to yield and the last
+        requested block is tracked, so memory usage is independent of
+        the length of the range.
 
+        .. code-block:: python
+
+            from morphenepython.blockchain import BlockFetcher
+            fetcher = BlockFetcher([mph1, mph2, mph3, mph4], read_ahead=16)
             try:
-                # the function may raise
-                result = func(*args, **kwargs)
-                # print(result)
-                if(result is not None):
-                    self.results.put(result)
-            except Exception as e:
-                # so we move on and handle it in whatever way the caller wanted
-                self.exception_handler(self.name, e, args, kwargs)
+                for block in fetcher.blocks(1000, 2000):
+                    print(block.block_num)
             finally:
-                # task complete no matter what happened
-                self.queue.task_done()
-
-
-# class for thread pool
-class Pool:
-    """Pool of threads consuming tasks from a queue"""
-    def __init__(self, thread_count, batch_mode=True, exception_handler=default_handler):
-        # batch mode means block when adding tasks if no threads available to process
-        self.queue = Queue(thread_count if batch_mode else 0)
-        self.resultQueue = Queue(0)
-        self.thread_count = thread_count
-        self.exception_handler = exception_handler
-        self.aborts = []
-        self.idles = []
+                fetcher.close()
+
+    """
+    def __init__(self, morphene_instances, read_ahead=None, only_ops=False, only_virtual_ops=False,
+                 max_retries=3, retry_delay=0.5, timeout=300):
+        self.morphene_instances = morphene_instances
+        self.read_ahead = read_ahead or 2 * len(morphene_instances)
+        self.only_ops = only_ops
+        self.only_virtual_ops = only_virtual_ops
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.timeout = timeout
+        self.tasks = PriorityQueue()
+        self.results = {}
+        self.result_ready = Condition()
+        self.abort = Event()
         self.threads = []
+        for n in range(len(morphene_instances)):
+            thread = Thread(target=self._work, args=(morphene_instances[n], ), name='block-fetcher-%d' % n)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def _work(self, morphene_instance):
+        """Thread work loop, fetches the lowest outstanding block number"""
+        while True:
+            block_num = self.tasks.get()
+            if self.abort.is_set() or block_num == sys.maxsize:
+                return
+            try:
+                with morphene_instance.rpc_priority(BULK):
+                    block = Block(block_num, only_ops=self.only_ops, only_virtual_ops=self.only_virtual_ops,
+                                  morphene_instance=morphene_instance)
+            except Exception as e:
+                block = e
+            with self.result_ready:
+                self.results[block_num] = block
+                self.result_ready.notify_all()
+
+    def _wait_for(self, block_num):
+        deadline = time.time() + self.timeout
+        with self.result_ready:
+            while block_num not in self.results:
+                if not any(thread.is_alive() for thread in self.threads):
+                    raise BlockWaitTimeExceeded("All workers stopped before block %d was fetched" % block_num)
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise BlockWaitTimeExceeded("Block %d was not fetched within %.1f s" % (block_num, self.timeout))
+                # Wake up regularly to notice stopped workers
+                self.result_ready.wait(min(remaining, 1.))
+            return self.results.pop(block_num)
+
+    def _retry(self, block_num, retries, error):
+        """Requests a block again after a delay, or raises error after the last retry"""
+        if retries > self.max_retries:
+            raise error
+        log.warning("Requesting block %d again (%d/%d): %s" % (block_num, retries, self.max_retries, str(error)))
+        time.sleep(self.retry_delay * 2 ** (retries - 1))
+        self.tasks.put(block_num)
+
+    def blocks(self, start, stop):
+        """ Yields all blocks from start to stop (including stop) in order
 
-    def __del__(self):
-        """Tell my threads to quit"""
-        self.abort()
-
-    def run(self, block=False):
-        """Start the threads, or restart them if you've aborted"""
-        # either wait for them to finish or return false if some arent
-        if block:
-            while self.alive():
-                sleep(1)
-        elif self.alive():
-            return False
+            :param int start: Starting block
+            :param int stop: Stop at this block
+        """
+        next_request = start
+        next_block = start
+        retries = 0
+        while next_block <= stop:
+            while next_request <= stop and next_request - next_block < self.read_ahead:
+                self.tasks.put(next_request)
+                next_request += 1
+            block = self._wait_for(next_block)
+            if isinstance(block, Exception):
+                retries += 1
+                self._retry(next_block, retries, block)
+                continue
+            if block.block_num is None or int(block.block_num) != next_block:
+                retries += 1
+                self._retry(next_block, retries, BlockDoesNotExistsException(
+                    "Received block %s instead of block %d" % (str(block.block_num), next_block)))
+                continue
+            retries = 0
+            block["id"] = block.block_num
+            block.identifier = block.block_num
+            next_block += 1
+            yield block
 
-        # go start them
-        self.aborts = []
-        self.idles = []
-        self.threads = []
-        for n in range(self.thread_count):
-            abort = Event()
-            idle = Event()
-            self.aborts.append(abort)
-            self.idles.append(idle)
-            self.threads.append(Worker('thread-%d' % n, self.queue, self.resultQueue, abort, idle, self.exception_handler))
-        return True
-
-    def enqueue(self, func, *args, **kargs):
-        """Add a task to the queue"""
-        self.queue.put((func, args, kargs))
-
-    def join(self):
-        """Wait for completion of all the tasks in the queue"""
-        self.queue.join()
-
-    def abort(self, block=False):
-        """Tell each worker that its done working"""
-        # tell the threads to stop after they are done with what they are currently doing
-        for a in self.aborts:
-            a.set()
-        # wait for them to finish if requested
-        while block and self.alive():
-            sleep(1)
-
-    def alive(self):
-        """Returns True if any threads are currently running"""
-        return True in [t.is_alive() for t in self.threads]
-
-    def idle(self):
-        """Returns True if all threads are waiting for work"""
-        return False not in [i.is_set() for i in self.idles]
-
-    def done(self):
-        """Returns True if not tasks are left to be completed"""
-        return self.queue.empty()
-
-    def results(self, sleep_time=0):
-        """Get the set of results that have been processed, repeatedly call until done"""
-        sleep(sleep_time)
-        results = []
-        try:
-            while True:
-                # get a result, raises empty exception immediately if none available
-                results.append(self.resultQueue.get(False))
-                self.resultQueue.task_done()
-        except:
-            return results
-        return results
+    def close(self):
+        """Stops all worker threads, outstanding requests are dropped"""
+        self.abort.set()
+        for thread in self.threads:
+            self.tasks.put(sys.maxsize)
 
 
 @python_2_unicode_compatible
@@ -182,6 +180,8 @@ class Blockchain(object):
             actual head block (``head``)
         :param int max_block_wait_repetition: maximum wait repetition for next block
             where each repetition is block_interval long (default is 3)
+        :param bool use_block_range: When True, full blocks are read with
+            ``block_api.get_block_range``, if the node serves it (default is True)
 
         This class let's you deal with blockchain related data and methods.
         Read blockchain related data:
@@ -228,8 +228,10 @@ class Blockchain(object):
         mode="irreversible",
         max_block_wait_repetition=None,
         data_refresh_time_seconds=900,
+        use_block_range=True,
     ):
         self.morphene = morphene_instance or shared_morphene_instance()
+        self.use_block_range = use_block_range
 
         if mode == "irreversible":
             self.mode = 'last_irreversible_block_num'
@@ -361,45 +363,95 @@ class Blockchain(object):
         ).time()
         return int(time.mktime(block_time.timetuple()))
 
-    def blocks(self, start=None, stop=None, max_batch_size=None, threading=False, thread_num=8, only_ops=False, only_virtual_ops=False):
+    def blocks(self, start=None, stop=None, max_batch_size=None, threading=False, thread_num=8, only_ops=False, only_virtual_ops=False,
+               read_ahead=None, adaptive_batch_size=True, max_batch_retries=3, use_archive=True):
         """ Yields blocks starting from ``start``.
 
             :param int start: Starting block
             :param int stop: Stop at this block
             :param int max_batch_size: When not None, batch calls of are used.
+                Up to four batches of max_batch_size blocks are sent at the same time.
                 Cannot be combined with threading
+            :param adaptive_batch_size: When True, the size of the batches is adapted between 1 and
+                ``max_batch_size`` from the response time, size and errors of the previous batches,
+                aiming at one second per batch. A :class:`morphenepythonapi.batchsize.AdaptiveBatchSize`
+                can be given to set the targets, False sends batches of ``max_batch_size`` (default is True)
+            :param int max_batch_retries: Number of times the blocks of a batch which failed
+                or have no reply are requested again, without the blocks which were received.
+                With `threading`, the number of times a failed block is requested again
+                (default is 3)
             :param bool threading: Enables threading. Cannot be combined with batch calls
             :param int thread_num: Defines the number of threads, when `threading` is set.
+                The pool of the client is enlarged, so that all threads fit into its ``bulk_share``.
             :param bool only_ops: Only yield operations (default: False).
                 Cannot be combined with ``only_virtual_ops=True``.
             :param bool only_virtual_ops: Only yield virtual operations (default: False)
+            :param int read_ahead: Maximum number of blocks which are fetched ahead of the
+                consumer, when `threading` is set (default is 2 * thread_num)
+            :param bool use_archive: Read full blocks from the ``block_archive`` of the client,
+                when one is configured, and only the missing blocks from the node (default is True)
 
             .. note:: If you want instant confirmation, you need to instantiate
                       class:`morphenepython.blockchain.Blockchain` with
                       ``mode="head"``, otherwise, the call will wait until
                       confirmed in an irreversible block.
 
+            .. note:: The blocks are fetched with ``bulk`` priority, see
+                      :func:`morphenepython.morphene.MorpheneClient.rpc_priority`, so
+                      that other calls of the process do not queue behind them.
+
+            .. note:: Only the sliding window of ``read_ahead`` outstanding blocks
+                      is tracked when `threading` is set, so memory usage does not
+                      grow with the length of the streamed range.
+
+            .. note:: In ``head`` mode, blocks above the last irreversible block can be
+                      orphaned by a fork later on. :func:`head_blocks` reports such
+                      blocks with rollback events.
+
+            .. note:: Full blocks are read with ``block_api.get_block_range``, when the node
+                      serves it and neither `threading` nor ``max_batch_size`` is set. The
+                      number of blocks per call is adapted like the batch size, up to 1000 blocks.
+
         """
+        block_archive = self.morphene.block_archive
+        if use_archive and block_archive is not None and start and not only_ops and not only_virtual_ops:
+            kwargs = {"max_batch_size": max_batch_size, "threading": threading, "thread_num": thread_num,
+                      "read_ahead": read_ahead, "adaptive_batch_size": adaptive_batch_size,
+                      "max_batch_retries": max_batch_retries, "use_archive": False}
+            if stop:
+                # Archived runs are read from disk, the gaps between them from the node
+                for first, last in block_archive.missing_ranges(start, stop) + [(stop + 1, stop)]:
+                    for blocknum in range(start, first):
+                        yield self._get_archived_block(block_archive, blocknum)
+                    if first <= last:
+                        for block in self.blocks(start=first, stop=last, **kwargs):
+                            yield block
+                    start = last + 1
+                return
+            for blocknum in range(start, block_archive.archived_until(start) + 1):
+                yield self._get_archived_block(block_archive, blocknum)
+                start = blocknum + 1
+            for block in self.blocks(start=start, **kwargs):
+                yield block
+            return
         # Let's find out how often blocks are generated!
         current_block = self.get_current_block()
         current_block_num = current_block.block_num
         if not start:
             start = current_block_num
         head_block_reached = False
-        if threading and FUTURES_MODULE is not None:
-            pool = ThreadPoolExecutor(max_workers=thread_num)
-        elif threading:
-            pool = Pool(thread_num, batch_mode=True)
         if threading:
-            morphene_instance = [self.morphene]
-            nodelist = self.morphene.rpc.nodes.export_working_nodes()
-            for i in range(thread_num - 1):
-                morphene_instance.append(mph.MorpheneClient(node=nodelist,
-                                                num_retries=self.morphene.rpc.num_retries,
-                                                num_retries_call=self.morphene.rpc.num_retries_call,
-                                                timeout=self.morphene.rpc.timeout))
+            # All worker threads share the client, whose pool needs a connection for each of them
+            if self.morphene.rpc is not None:
+                self.morphene.rpc.ensure_bulk_requests(thread_num)
+            morphene_instance = [self.morphene] * thread_num
+        if isinstance(adaptive_batch_size, AdaptiveBatchSize):
+            range_size = adaptive_batch_size
+        elif adaptive_batch_size:
+            range_size = AdaptiveBatchSize(BLOCK_RANGE_LIMIT)
+        else:
+            range_size = BLOCK_RANGE_LIMIT
         # We are going to loop indefinitely
-        latest_block = 0
         while True:
             if stop:
                 head_block = stop
@@ -407,120 +459,63 @@ class Blockchain(object):
                 current_block_num = self.get_current_block_num()
                 head_block = current_block_num
             if threading and not head_block_reached:
-                latest_block = start - 1
-                result_block_nums = []
-                for blocknum in range(start, head_block + 1, thread_num):
-                    # futures = []
-                    i = 0
-                    if FUTURES_MODULE is not None:
-                        futures = []
-                    block_num_list = []
-                    # freeze = self.morphene.rpc.nodes.freeze_current_node
-                    num_retries = self.morphene.rpc.nodes.num_retries
-                    # self.morphene.rpc.nodes.freeze_current_node = True
-                    self.morphene.rpc.nodes.num_retries = thread_num
-                    error_cnt = self.morphene.rpc.nodes.node.error_cnt
-                    while i < thread_num and blocknum + i <= head_block:
-                        block_num_list.append(blocknum + i)
-                        results = []
-                        if FUTURES_MODULE is not None:
-                            futures.append(pool.submit(Block, blocknum + i, only_ops=only_ops, only_virtual_ops=only_virtual_ops, morphene_instance=morphene_instance[i]))
-                        else:
-                            pool.enqueue(Block, blocknum + i, only_ops=only_ops, only_virtual_ops=only_virtual_ops, morphene_instance=morphene_instance[i])
-                        i += 1
-                    if FUTURES_MODULE is not None:
-                        try:
-                            results = [r.result() for r in as_completed(futures)]
-                        except Exception as e:
-                            log.error(str(e))
-                    else:
-                        pool.run(True)
-                        pool.join()
-                        for result in pool.results():
-                            results.append(result)
-                        pool.abort()
-                    self.morphene.rpc.nodes.num_retries = num_retries
-                    # self.morphene.rpc.nodes.freeze_current_node = freeze
-                    new_error_cnt = self.morphene.rpc.nodes.node.error_cnt
-                    self.morphene.rpc.nodes.node.error_cnt = error_cnt
-                    if new_error_cnt > error_cnt:
-                        self.morphene.rpc.nodes.node.error_cnt += 1
-                    #    self.morphene.rpc.next()
-
-                    checked_results = []
-                    for b in results:
-                        if b.block_num is not None and int(b.block_num) not in result_block_nums:
-                            b["id"] = b.block_num
-                            b.identifier = b.block_num
-                            checked_results.append(b)
-                            result_block_nums.append(int(b.block_num))
-
-                    missing_block_num = list(set(block_num_list).difference(set(result_block_nums)))
-                    while len(missing_block_num) > 0:
-                        for blocknum in missing_block_num:
-                            try:
-                                block = Block(blocknum, only_ops=only_ops, only_virtual_ops=only_virtual_ops, morphene_instance=self.morphene)
-                                checked_results.append(block)
-                                result_block_nums.append(int(block.block_num))
-                            except Exception as e:
-                                log.error(str(e))
-                        missing_block_num = list(set(block_num_list).difference(set(result_block_nums)))
-                    from operator import itemgetter
-                    blocks = sorted(checked_results, key=itemgetter('id'))
-                    for b in blocks:
-                        if latest_block < int(b.block_num):
-                            latest_block = int(b.block_num)
-                        yield b
-
-                if latest_block <= head_block:
-                    for blocknum in range(latest_block + 1, head_block + 1):
-                        if blocknum not in result_block_nums:
-                            block = Block(blocknum, only_ops=only_ops, only_virtual_ops=only_virtual_ops, morphene_instance=self.morphene)
-                            result_block_nums.append(blocknum)
-                            yield block
+                fetcher = BlockFetcher(morphene_instance, read_ahead=read_ahead, only_ops=only_ops,
+                                       only_virtual_ops=only_virtual_ops, max_retries=max_batch_retries)
+                try:
+                    for block in fetcher.blocks(start, head_block):
+                        yield block
+                finally:
+                    fetcher.close()
+            elif not threading and max_batch_size is None and not only_ops and not only_virtual_ops and \
+                    head_block > start and self._supports_block_range():
+                for block in self._blocks_by_range(start, head_block, range_size, max_batch_retries=max_batch_retries,
+                                                   last_current_block_num=current_block_num):
+                    yield block
             elif max_batch_size is not None and (head_block - start) >= max_batch_size and not head_block_reached:
                 if not self.morphene.is_connected():
                     raise OfflineHasNoRPCException("No RPC available in offline mode!")
                 self.morphene.rpc.set_next_node_on_empty_reply(False)
-                latest_block = start - 1
-                batches = max_batch_size
-                for blocknumblock in range(start, head_block + 1, batches):
-                    # Get full block
-                    if (head_block - blocknumblock) < batches:
-                        batches = head_block - blocknumblock + 1
-                    for blocknum in range(blocknumblock, blocknumblock + batches - 1):
-                        if only_virtual_ops:
-                            self.morphene.rpc.get_ops_in_block(blocknum, only_virtual_ops, add_to_queue=True)
-                        else:
-                            self.morphene.rpc.get_block(blocknum, add_to_queue=True)
-                        latest_block = blocknum
-                    if batches >= 1:
-                        latest_block += 1
-                    if latest_block <= head_block:
-                        if only_virtual_ops:
-                            block_batch = self.morphene.rpc.get_ops_in_block(blocknum, only_virtual_ops, add_to_queue=False)
-                        else:
-                            block_batch = self.morphene.rpc.get_block(latest_block, add_to_queue=False)
-                        if not bool(block_batch):
-                            raise BatchedCallsNotSupported()
-                        blocknum = latest_block - len(block_batch) + 1
-                        if not isinstance(block_batch, list):
-                            block_batch = [block_batch]
-                        for block in block_batch:
-                            if not bool(block):
-                                continue
-                            block = Block(block, only_ops=only_ops, only_virtual_ops=only_virtual_ops, morphene_instance=self.morphene)
-                            block["id"] = block.block_num
-                            block.identifier = block.block_num
+                if isinstance(adaptive_batch_size, AdaptiveBatchSize):
+                    batch_size = adaptive_batch_size
+                elif adaptive_batch_size:
+                    batch_size = AdaptiveBatchSize(max_batch_size)
+                else:
+                    batch_size = None
+                # Several batches are sent at the same time
+                batch_workers = 4
+                chunk_start = start
+                while chunk_start <= head_block:
+                    chunk_size = (max_batch_size if batch_size is None else batch_size.size) * batch_workers
+                    chunk_block_nums = range(chunk_start, min(chunk_start + chunk_size, head_block + 1))
+                    chunk_start += len(chunk_block_nums)
+                    if all(Block.is_immutable_cached(blocknum, only_ops=only_ops, only_virtual_ops=only_virtual_ops) for blocknum in chunk_block_nums):
+                        # Irreversible blocks which were already read before
+                        for blocknum in chunk_block_nums:
+                            block = Block(blocknum, only_ops=only_ops, only_virtual_ops=only_virtual_ops, morphene_instance=self.morphene)
                             yield block
-                            blocknum = block.block_num
+                        continue
+                    replies = self._get_batched_blocks(chunk_block_nums, batch_size or max_batch_size, batch_workers,
+                                                       only_virtual_ops=only_virtual_ops,
+                                                       max_batch_retries=max_batch_retries)
+                    block_batch = [replies[blocknum] for blocknum in chunk_block_nums]
+                    if not any(bool(block) for block in block_batch):
+                        raise BatchedCallsNotSupported()
+                    for block in block_batch:
+                        if not bool(block):
+                            continue
+                        block = Block(block, only_ops=only_ops, only_virtual_ops=only_virtual_ops, morphene_instance=self.morphene)
+                        block["id"] = block.block_num
+                        block.identifier = block.block_num
+                        block.cache_if_irreversible()
+                        yield block
             else:
                 # Blocks from start until head block
                 if start is None:
                     start = head_block - 1
                 for blocknum in range(start, head_block + 1):
                     # Get full block
-                    block = self.wait_for_and_get_block(blocknum, only_ops=only_ops, only_virtual_ops=only_virtual_ops, block_number_check_cnt=5, last_current_block_num=current_block_num)
+                    with self.morphene.rpc_priority(BULK):
+                        block = self.wait_for_and_get_block(blocknum, only_ops=only_ops, only_virtual_ops=only_virtual_ops, block_number_check_cnt=5, last_current_block_num=current_block_num)
                     yield block
             # Set new start
             start = head_block + 1
@@ -532,6 +527,182 @@ class Blockchain(object):
             # Sleep for one block
             time.sleep(self.block_interval)
 
+    def _get_archived_block(self, block_archive, blocknum):
+        """ Returns an archived block as :class:`morphenepython.block.Block`, a block
+            whose record is damaged is requested from the node and archived again
+        """
+        data = block_archive.get(blocknum)
+        if data is None:
+            with self.morphene.rpc_priority(BULK):
+                block = self.wait_for_and_get_block(blocknum, block_number_check_cnt=5)
+            data = block.json()
+            data.pop("id", None)
+            block_archive.put(blocknum, data)
+            return block
+        block = Block(data, morphene_instance=self.morphene)
+        block["id"] = block.block_num
+        block.identifier = block.block_num
+        return block
+
+    def archive(self, start, stop=None, block_archive=None, max_batch_size=None, threading=False, thread_num=8):
+        """ Stores the blocks from start to stop (including stop) in a
+            :class:`morphenepython.blockarchive.BlockArchive` and returns the number of
+            added blocks. Blocks which are already archived are skipped, so that an
+            interrupted job can simply be started again.
+
+            :param int start: Starting block
+            :param int stop: Stop at this block (default is the last irreversible block).
+                Only irreversible blocks are archived, stop is lowered to the last
+                irreversible block.
+            :param block_archive: Archive or its directory (default is the ``block_archive``
+                of the client)
+            :param int max_batch_size: When not None, batch calls are used, see :func:`blocks`
+            :param bool threading: Enables threading, see :func:`blocks`
+            :param int thread_num: Defines the number of threads, when `threading` is set.
+
+            .. code-block:: python
+
+                from morphenepython.blockchain import Blockchain
+                blockchain = Blockchain()
+                blockchain.archive(1, 100000, block_archive="/data/blocks", max_batch_size=50)
+
+        """
+        block_archive = get_block_archive(block_archive) or self.morphene.block_archive
+        if block_archive is None:
+            raise ValueError("No block archive is configured!")
+        if not self.morphene.is_connected():
+            raise OfflineHasNoRPCException("No RPC available in offline mode!")
+        props = self.morphene.get_dynamic_global_properties(False)
+        last_irreversible_block_num = int(props["last_irreversible_block_num"])
+        if stop is None or stop > last_irreversible_block_num:
+            stop = last_irreversible_block_num
+        count = 0
+        for first, last in block_archive.missing_ranges(start, stop):
+            for block in self.blocks(start=first, stop=last, max_batch_size=max_batch_size, threading=threading,
+                                     thread_num=thread_num, use_archive=False):
+                data = block.json()
+                data.pop("id", None)
+                if block_archive.put(block.block_num, data):
+                    count += 1
+        block_archive.flush()
+        return count
+
+    def _supports_block_range(self):
+        """Returns True, when full blocks can be read with ``block_api.get_block_range``"""
+        if not self.use_block_range or not self.morphene.is_connected():
+            return False
+        rpc = self.morphene.rpc
+        if not hasattr(rpc, "supports_method"):
+            return False
+        return rpc.supports_method("block_api.get_block_range")
+
+    def _blocks_by_range(self, start, stop, range_size, max_batch_retries=3, last_current_block_num=None):
+        """ Yields the blocks from start to stop (including stop), which are read with
+            ``block_api.get_block_range``. A block which the node does not return is read
+            on its own. When the node does not serve the call, all further blocks are read
+            on their own.
+
+            :param int start: Starting block
+            :param int stop: Stop at this block
+            :param range_size: Blocks per call, int or :class:`morphenepythonapi.batchsize.AdaptiveBatchSize`
+            :param int max_batch_retries: Number of times a failed call is repeated with half the blocks
+            :param int last_current_block_num: Current block number, for waiting on missing blocks
+        """
+        self.morphene.rpc.set_next_node_on_empty_reply(False)
+        block_num = start
+        retries = 0
+        # Blocks of the repeated call, after a call of a fixed range_size failed
+        retry_count = None
+        while block_num <= stop:
+            adaptive = isinstance(range_size, AdaptiveBatchSize)
+            count = min(range_size.size if adaptive else retry_count or range_size, stop - block_num + 1)
+            start_time = time.time()
+            try:
+                with self.morphene.rpc_priority(BULK):
+                    reply = self.morphene.rpc.get_block_range({"starting_block_num": block_num, "count": count},
+                                                              api="block")
+            except (NoMethodWithName, NoApiWithName, ApiNotSupported) as e:
+                log.warning("get_block_range is not available, reading blocks one by one: %s" % str(e))
+                self.use_block_range = False
+                break
+            except Exception as e:
+                if adaptive:
+                    range_size.observe(count, time.time() - start_time, error=True)
+                else:
+                    retry_count = max(1, count // 2)
+                if retries >= max_batch_retries:
+                    raise
+                retries += 1
+                log.warning("get_block_range of %d blocks failed (%s), requesting them again" % (count, str(e)))
+                continue
+            if adaptive:
+                range_size.observe(count, time.time() - start_time,
+                                   getattr(self.morphene.rpc, "last_reply_bytes", None))
+            retries = 0
+            retry_count = None
+            blocks = reply.get("blocks", []) if isinstance(reply, dict) else []
+            first_block_num = block_num
+            for block in blocks:
+                block = Block(block, morphene_instance=self.morphene)
+                if block.block_num != block_num:
+                    break
+                block["id"] = block.block_num
+                block.identifier = block.block_num
+                block.cache_if_irreversible()
+                block_num += 1
+                yield block
+            if block_num <= stop and block_num - first_block_num < count:
+                # The node does not have the block yet
+                with self.morphene.rpc_priority(BULK):
+                    block = self.wait_for_and_get_block(block_num, block_number_check_cnt=5,
+                                                        last_current_block_num=last_current_block_num)
+                block_num += 1
+                yield block
+        for blocknum in range(block_num, stop + 1):
+            with self.morphene.rpc_priority(BULK):
+                block = self.wait_for_and_get_block(blocknum, block_number_check_cnt=5,
+                                                    last_current_block_num=last_current_block_num)
+            yield block
+
+    def _get_batched_blocks(self, block_nums, max_batch_size, max_workers, only_virtual_ops=False, max_batch_retries=3):
+        """ Requests the blocks with batch calls and returns the replies by block number.
+            Only the blocks which failed or have no reply are requested again.
+
+            :param list block_nums: Block numbers
+            :param max_batch_size: Batch size, int or :class:`morphenepythonapi.batchsize.AdaptiveBatchSize`
+            :param int max_workers: Number of batches which are sent at the same time
+            :param bool only_virtual_ops: Requests the virtual operations of the blocks
+            :param int max_batch_retries: Number of times the failed blocks are requested again
+        """
+        replies = {}
+        pending = list(block_nums)
+        retries = 0
+        while pending:
+            with self.morphene.rpc_priority(BULK):
+                with self.morphene.rpc.batch(max_batch_size=max_batch_size, max_workers=max_workers) as batch:
+                    for blocknum in pending:
+                        if only_virtual_ops:
+                            batch.get_ops_in_block(blocknum, only_virtual_ops)
+                        else:
+                            batch.get_block(blocknum)
+            failed = []
+            error = None
+            for blocknum, future in zip(pending, batch.futures):
+                exception = future.exception()
+                if exception is None:
+                    replies[blocknum] = future.result()
+                else:
+                    failed.append(blocknum)
+                    error = exception
+            if failed:
+                if retries >= max_batch_retries:
+                    raise error
+                retries += 1
+                log.warning("%d of %d blocks were not received (%s), requesting them again" % (
+                    len(failed), len(pending), str(error)))
+            pending = failed
+        return replies
+
     def wait_for_and_get_block(self, block_number, blocks_waiting_for=None, only_ops=False, only_virtual_ops=False, block_number_check_cnt=-1, last_current_block_num=None):
         """ Get the desired block from the chain, if the current head block is smaller (for both head and irreversible)
             then we wait, but a maxmimum of blocks_waiting_for * max_block_wait_repetition time before failure.
@@ -580,6 +751,102 @@ class Blockchain(object):
 
         return block
 
+    def head_blocks(self, start=None, stop=None, poll_interval=None):
+        """ Yields the blocks up to the head block as events, and reports blocks
+            which are orphaned by a fork and the progress of the last irreversible block.
+
+            :param int start: Starting block (default is the head block)
+            :param int stop: Stop, when this block is irreversible (default is None,
+                the stream does not end)
+            :param float poll_interval: Seconds between the requests for new blocks
+                (default is the block interval)
+
+            Every event is a dict, whose ``type`` is one of
+
+            * ``block``: a new block, ``block`` carries the
+              :class:`morphenepython.block.Block`
+            * ``rollback``: the block of an earlier ``block`` event was orphaned by a fork.
+              Rollbacks are reported from the newest block downwards and are followed by
+              the ``block`` events of the blocks which replace them.
+            * ``irreversible``: the last irreversible block advanced to ``block_num``.
+              Blocks up to it are never rolled back.
+
+            .. code-block:: python
+
+                from morphenepython.blockchain import Blockchain
+                for event in Blockchain().head_blocks():
+                    if event["type"] == "block":
+                        apply(event["block"])
+                    elif event["type"] == "rollback":
+                        revert(event["block"])
+                    else:
+                        finalize(event["block_num"])
+
+            Forks are detected from the ``previous`` block id of every new block and
+            from the ``head_block_id``, so that a fork is also reported when the node
+            switches to a fork of the same or a lower height.
+
+        """
+        if poll_interval is None:
+            poll_interval = self.block_interval
+        # Yielded blocks above the last irreversible block, oldest first
+        reversible_blocks = []
+        last_irreversible_block_num = None
+        block_num = start
+        while True:
+            if not self.morphene.is_connected():
+                raise OfflineHasNoRPCException("No RPC available in offline mode!")
+            props = self.morphene.get_dynamic_global_properties(False)
+            head_block_num = int(props["head_block_number"])
+            if block_num is None:
+                block_num = head_block_num
+            if last_irreversible_block_num is None or int(props["last_irreversible_block_num"]) > last_irreversible_block_num:
+                last_irreversible_block_num = int(props["last_irreversible_block_num"])
+                reversible_blocks = [block for block in reversible_blocks if block.block_num > last_irreversible_block_num]
+                yield {"type": "irreversible", "block_num": last_irreversible_block_num}
+            if reversible_blocks and (reversible_blocks[-1].block_num > head_block_num or (
+                    reversible_blocks[-1].block_num == head_block_num and props["head_block_id"] != reversible_blocks[-1]["block_id"])):
+                # The node switched to a fork without a higher head block
+                for block in self._pop_orphaned_blocks(reversible_blocks):
+                    block_num = block.block_num
+                    yield {"type": "rollback", "block_num": block.block_num, "block_id": block["block_id"], "block": block}
+            while block_num <= head_block_num and (not stop or block_num <= stop):
+                try:
+                    block = Block(block_num, morphene_instance=self.morphene)
+                except BlockDoesNotExistsException:
+                    break
+                if reversible_blocks and block["previous"] != reversible_blocks[-1]["block_id"]:
+                    orphaned_blocks = self._pop_orphaned_blocks(reversible_blocks)
+                    for orphan in orphaned_blocks:
+                        block_num = orphan.block_num
+                        yield {"type": "rollback", "block_num": orphan.block_num, "block_id": orphan["block_id"], "block": orphan}
+                    if not orphaned_blocks:
+                        # The node answered from another fork, try again with the next poll
+                        break
+                    continue
+                if block_num > last_irreversible_block_num:
+                    reversible_blocks.append(block)
+                yield {"type": "block", "block_num": block_num, "block_id": block["block_id"], "block": block}
+                block_num += 1
+            if stop and block_num > stop and last_irreversible_block_num >= stop:
+                return
+            time.sleep(poll_interval)
+
+    def _pop_orphaned_blocks(self, reversible_blocks):
+        """ Removes the blocks which are not part of the chain of the node anymore
+            from the end of reversible_blocks and returns them, newest first
+        """
+        orphaned_blocks = []
+        while reversible_blocks:
+            try:
+                block = Block(reversible_blocks[-1].block_num, morphene_instance=self.morphene)
+            except BlockDoesNotExistsException:
+                block = None
+            if block is not None and block["block_id"] == reversible_blocks[-1]["block_id"]:
+                break
+            orphaned_blocks.append(reversible_blocks.pop())
+        return orphaned_blocks
+
     def ops(self, start=None, stop=None, only_virtual_ops=False, **kwargs):
         """ Blockchain.ops() is deprecated. Please use Blockchain.stream() instead.
         """
@@ -631,6 +898,8 @@ class Blockchain(object):
                 Cannot be combined with threading
             :param bool threading: Enables threading. Cannot be combined with batch calls
             :param int thread_num: Defines the number of threads, when `threading` is set.
+            :param int read_ahead: Maximum number of blocks which are fetched ahead of the
+                consumer, when `threading` is set (default is 2 * thread_num)
             :param bool only_ops: Only yield operations (default: False)
                 Cannot be combined with ``only_virtual_ops=True``
             :param bool only_virtual_ops: Only yield virtual operations (default: False)
@@ -657,7 +926,8 @@ class Blockchain(object):
                     'memo': 'get rich',
                     '_id': '6d4c5f2d4d8ef1918acaee4a8dce34f9da384786',
                     'timestamp': datetime.datetime(2019, 6, 1, 16, 20, 0, tzinfo=<UTC>),
-                    'block_num': 420, 'trx_num': 2, 'trx_id': 'cf11b2ac8493c71063ec121b2e8517ab1e0e6bea'
+                    'block_num': 420, 'trx_num': 2, 'op_num': 0,
+                    'trx_id': 'cf11b2ac8493c71063ec121b2e8517ab1e0e6bea'
                 }
 
             output when `raw_ops=True` is set:
@@ -666,6 +936,8 @@ class Blockchain(object):
 
                 {
                     'block_num': 22277588,
+                    'trx_num': 2,
+                    'op_num': 0,
                     'op':
                         [
                             'transfer',
@@ -678,65 +950,81 @@ class Blockchain(object):
                         'timestamp': datetime.datetime(2019, 6, 1, 16, 20, 0, tzinfo=<UTC>)
                 }
 
+            ``trx_num`` and ``op_num`` are the positions of the transaction
+            within the block and of the operation within the transaction
+            (within the block, when ``only_ops`` or ``only_virtual_ops`` is set).
+
         """
         for block in self.blocks(**kwargs):
-            if "transactions" in block:
-                trx = block["transactions"]
-            else:
-                trx = [block]
-            block_num = 0
-            trx_id = ""
-            _id = ""
-            timestamp = ""
-            for trx_nr in range(len(trx)):
-                if "operations" not in trx[trx_nr]:
-                    continue
-                for event in trx[trx_nr]["operations"]:
-                    if isinstance(event, list):
-                        op_type, op = event
-                        # trx_id = block["transaction_ids"][trx_nr]
-                        block_num = block.get("id")
-                        _id = self.hash_op(event)
-                        timestamp = block.get("timestamp")
-                    elif isinstance(event, dict) and "type" in event and "value" in event:
-                        op_type = event["type"]
-                        if len(op_type) > 10 and op_type[len(op_type) - 10:] == "_operation":
-                            op_type = op_type[:-10]
-                        op = event["value"]
-                        # trx_id = block["transaction_ids"][trx_nr]
-                        block_num = block.get("id")
-                        _id = self.hash_op(event)
-                        timestamp = block.get("timestamp")
-                    elif "op" in event and isinstance(event["op"], dict) and "type" in event["op"] and "value" in event["op"]:
-                        op_type = event["op"]["type"]
-                        if len(op_type) > 10 and op_type[len(op_type) - 10:] == "_operation":
-                            op_type = op_type[:-10]
-                        op = event["op"]["value"]
-                        trx_id = event.get("trx_id")
-                        block_num = event.get("block")
-                        _id = self.hash_op(event["op"])
-                        timestamp = event.get("timestamp")
+            for op in self.get_block_ops(block, opNames=opNames, raw_ops=raw_ops):
+                yield op
+
+    def get_block_ops(self, block, opNames=[], raw_ops=False):
+        """ Yields the operations of a block in the format of :func:`stream`
+
+            :param Block block: Block, as yielded by :func:`blocks`
+            :param array opNames: List of operations to filter for
+            :param bool raw_ops: When set to True, the unmodified operations are yielded (default: False)
+        """
+        if "transactions" in block:
+            trx = block["transactions"]
+        else:
+            trx = [block]
+        block_num = 0
+        trx_id = ""
+        _id = ""
+        timestamp = ""
+        for trx_nr in range(len(trx)):
+            if "operations" not in trx[trx_nr]:
+                continue
+            for op_nr, event in enumerate(trx[trx_nr]["operations"]):
+                if isinstance(event, list):
+                    op_type, op = event
+                    # trx_id = block["transaction_ids"][trx_nr]
+                    block_num = block.get("id")
+                    _id = self.hash_op(event)
+                    timestamp = block.get("timestamp")
+                elif isinstance(event, dict) and "type" in event and "value" in event:
+                    op_type = event["type"]
+                    if len(op_type) > 10 and op_type[len(op_type) - 10:] == "_operation":
+                        op_type = op_type[:-10]
+                    op = event["value"]
+                    # trx_id = block["transaction_ids"][trx_nr]
+                    block_num = block.get("id")
+                    _id = self.hash_op(event)
+                    timestamp = block.get("timestamp")
+                elif "op" in event and isinstance(event["op"], dict) and "type" in event["op"] and "value" in event["op"]:
+                    op_type = event["op"]["type"]
+                    if len(op_type) > 10 and op_type[len(op_type) - 10:] == "_operation":
+                        op_type = op_type[:-10]
+                    op = event["op"]["value"]
+                    trx_id = event.get("trx_id")
+                    block_num = event.get("block")
+                    _id = self.hash_op(event["op"])
+                    timestamp = event.get("timestamp")
+                else:
+                    op_type, op = event["op"]
+                    trx_id = event.get("trx_id")
+                    block_num = event.get("block")
+                    _id = self.hash_op(event["op"])
+                    timestamp = event.get("timestamp")
+                if not bool(opNames) or op_type in opNames and block_num > 0:
+                    if raw_ops:
+                        yield {"block_num": block_num,
+                               "trx_num": trx_nr,
+                               "op_num": op_nr,
+                               "op": [op_type, op],
+                               "timestamp": timestamp}
                     else:
-                        op_type, op = event["op"]
-                        trx_id = event.get("trx_id")
-                        block_num = event.get("block")
-                        _id = self.hash_op(event["op"])
-                        timestamp = event.get("timestamp")
-                    if not bool(opNames) or op_type in opNames and block_num > 0:
-                        if raw_ops:
-                            yield {"block_num": block_num,
-                                   "trx_num": trx_nr,
-                                   "op": [op_type, op],
-                                   "timestamp": timestamp}
-                        else:
-                            updated_op = {"type": op_type}
-                            updated_op.update(op.copy())
-                            updated_op.update({"_id": _id,
-                                               "timestamp": timestamp,
-                                               "block_num": block_num,
-                                               "trx_num": trx_nr,
-                                               "trx_id": trx_id})
-                            yield updated_op
+                        updated_op = {"type": op_type}
+                        updated_op.update(op.copy())
+                        updated_op.update({"_id": _id,
+                                           "timestamp": timestamp,
+                                           "block_num": block_num,
+                                           "trx_num": trx_nr,
+                                           "op_num": op_nr,
+                                           "trx_id": trx_id})
+                        yield updated_op
 
     def awaitTxConfirmation(self, transaction, limit=10):
         """ Returns the transaction as seen by the blockchain after being
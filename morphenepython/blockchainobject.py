@@ -7,82 +7,285 @@ from builtins import str
 from future.utils import python_2_unicode_compatible
 from morphenepythongraphenebase.py23 import bytes_types, integer_types, string_types, text_type
 from morphenepython.instance import shared_morphene_instance
-from datetime import datetime, timedelta
+from collections import OrderedDict
+import copy
 import json
+import sys
 import threading
+import time
 
 
-@python_2_unicode_compatible
-class ObjectCache(dict):
+def _approx_size(obj, depth=0):
+    """Returns a rough estimate of the memory used by obj in bytes"""
+    size = sys.getsizeof(obj)
+    if depth > 8:
+        return size
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            size += _approx_size(k, depth + 1) + _approx_size(v, depth + 1)
+    elif isinstance(obj, (list, tuple, set)):
+        for v in obj:
+            size += _approx_size(v, depth + 1)
+    return size
+
 
-    def __init__(self, initial_data={}, default_expiration=10, auto_clean=True):
-        super(ObjectCache, self).__init__(initial_data)
+@python_2_unicode_compatible
+class ObjectCache(object):
+    """ Thread-safe, size-bounded LRU cache with lazy expiration
+
+        :param dict initial_data: Items to fill the cache with
+        :param int default_expiration: Lifetime of an entry in seconds
+            (default is 10)
+        :param bool auto_clean: When True, expired entries at the cold end
+            of the cache are dropped on every insert (default is True)
+        :param int max_entries: Maximum number of stored entries, the least
+            recently used entry is evicted when exceeded (default is 10000)
+        :param int max_bytes: Maximum approximate size of all stored values in
+            bytes, disabled when None (default is None)
+
+        The size of a value is only estimated while ``max_bytes`` is set. When
+        the limit is set later on, the sizes of the stored entries are
+        estimated at that moment and the cache is shrunk to the new bounds.
+
+        Entries are stored per namespace, so that the same key can be used
+        by different object types without colliding. Expired entries are
+        removed lazily when they are looked up.
+
+        .. code-block:: python
+
+            >>> from morphenepython.blockchainobject import ObjectCache
+            >>> cache = ObjectCache(max_entries=2)
+            >>> cache.set(5, "block", namespace="Block")
+            >>> cache.set("5", "account", namespace="Account")
+            >>> cache.get(5, namespace="Block")
+            'block'
+            >>> cache.set(6, "block", namespace="Block")
+            >>> cache.contains("5", namespace="Account")
+            False
+
+    """
+
+    def __init__(self, initial_data={}, default_expiration=10, auto_clean=True,
+                 max_entries=10000, max_bytes=None):
         self.default_expiration = default_expiration
         self.auto_clean = auto_clean
         self.lock = threading.RLock()
-
-    def __setitem__(self, key, value):
-        data = {
-            "expires": datetime.utcnow() + timedelta(
-                seconds=self.default_expiration),
-            "data": value
-        }
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._max_bytes = None
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        for key in initial_data:
+            self.set(key, initial_data[key])
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self, max_bytes):
+        """Sets the size limit, the sizes of the stored entries are estimated when it gets enabled"""
+        with self.lock:
+            if max_bytes is not None and self._max_bytes is None:
+                self._bytes = 0
+                for full_key, entry in self._data.items():
+                    size = _approx_size(entry[0])
+                    self._data[full_key] = (entry[0], entry[1], size)
+                    self._bytes += size
+            self._max_bytes = max_bytes
+            self._evict()
+
+    def set_max_size(self, max_entries=10000, max_bytes=None):
+        """ Sets the bounds and evicts the least recently used entries
+            until they are met
+
+            :param int max_entries: Maximum number of stored entries
+            :param int max_bytes: Maximum approximate size of all stored values
+        """
         with self.lock:
-            if key in self:
-                del self[key]
-            dict.__setitem__(self, key, data)
+            self.max_entries = max_entries
+            self.max_bytes = max_bytes
+
+    def _remove(self, full_key):
+        entry = self._data.pop(full_key)
+        self._bytes -= entry[2]
+        return entry
+
+    def _is_expired(self, entry, now):
+        return entry[1] is not None and now >= entry[1]
+
+    def _expire(self, full_key):
+        """Removes an expired entry, it is kept until the next clean up when auto_clean is False"""
         if self.auto_clean:
-            self.clear_expired_items()
+            self._remove(full_key)
+            self.expirations += 1
+
+    def _evict(self):
+        """Drops least recently used entries until all bounds are met"""
+        while self._data and (
+            (self.max_entries is not None and len(self._data) > self.max_entries) or
+            (self.max_bytes is not None and self._bytes > self.max_bytes)
+        ):
+            full_key, entry = self._data.popitem(last=False)
+            self._bytes -= entry[2]
+            self.evictions += 1
+
+    def _clean_cold_end(self, now):
+        """Drops expired entries from the least recently used end"""
+        while self._data:
+            full_key = next(iter(self._data))
+            if not self._is_expired(self._data[full_key], now):
+                break
+            self._remove(full_key)
+            self.expirations += 1
+
+    def set(self, key, value, namespace=None, expiration=None):
+        """ Stores a value
+
+            :param key: Cache key
+            :param value: Value which should be stored
+            :param str namespace: Namespace of the key (default is None)
+            :param float expiration: Lifetime in seconds, default_expiration is
+                used when None. Negative values store the entry without expiration.
+        """
+        if expiration is None:
+            expiration = self.default_expiration
+        now = time.time()
+        if expiration is not None and expiration >= 0:
+            expires = now + expiration
+        else:
+            expires = None
+        size = _approx_size(value) if self.max_bytes is not None else 0
+        full_key = (namespace, key)
+        with self.lock:
+            if full_key in self._data:
+                self._remove(full_key)
+            self._data[full_key] = (value, expires, size)
+            self._bytes += size
+            if self.auto_clean:
+                self._clean_cold_end(now)
+            self._evict()
+
+    def get(self, key, default=None, namespace=None):
+        """ Returns the stored value or default when the key is unknown
+            or has expired
+
+            :param key: Cache key
+            :param default: Returned when no valid entry exists
+            :param str namespace: Namespace of the key (default is None)
+        """
+        full_key = (namespace, key)
+        with self.lock:
+            entry = self._data.get(full_key)
+            if entry is None:
+                self.misses += 1
+                return default
+            if self._is_expired(entry, time.time()):
+                self._expire(full_key)
+                self.misses += 1
+                return default
+            # Mark as most recently used
+            del self._data[full_key]
+            self._data[full_key] = entry
+            if entry[0] is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return entry[0]
 
-    def __getitem__(self, key):
+    def contains(self, key, namespace=None):
+        """ Returns True when a valid entry for key exists
+
+            :param key: Cache key
+            :param str namespace: Namespace of the key (default is None)
+        """
+        full_key = (namespace, key)
         with self.lock:
-            if key in self:
-                value = dict.__getitem__(self, key)
-                if value is not None:
-                    return value["data"]
+            entry = self._data.get(full_key)
+            if entry is None or entry[0] is None:
+                return False
+            if self._is_expired(entry, time.time()):
+                self._expire(full_key)
+                return False
+            return True
+
+    def delete(self, key, namespace=None):
+        """ Removes an entry, unknown keys are ignored
 
-    def get(self, key, default):
+            :param key: Cache key
+            :param str namespace: Namespace of the key (default is None)
+        """
         with self.lock:
-            if key in self:
-                if self[key] is not None:
-                    return self[key]
-                else:
-                    return default
-            else:
-                return default
+            if (namespace, key) in self._data:
+                self._remove((namespace, key))
+
+    def clear(self):
+        """Removes all entries"""
+        with self.lock:
+            self._data.clear()
+            self._bytes = 0
 
     def clear_expired_items(self):
+        """Removes all expired entries"""
+        with self.lock:
+            now = time.time()
+            del_list = [k for k, v in self._data.items() if self._is_expired(v, now)]
+            for full_key in del_list:
+                self._remove(full_key)
+            self.expirations += len(del_list)
+
+    def stats(self):
+        """ Returns the cache counters as dict
+
+            .. code-block:: js
+
+                {
+                    'entries': 1, 'bytes': 0, 'hits': 3, 'misses': 1,
+                    'evictions': 0, 'expirations': 0
+                }
+
+        """
         with self.lock:
-            del_list = []
-            utc_now = datetime.utcnow()
-            for key in self:
-                value = dict.__getitem__(self, key)
-                if value is None:
-                    del_list.append(key)
-                    continue
-                if utc_now >= value["expires"]:
-                    del_list.append(key)
-            for key in del_list:
-                del self[key]
+            return {"entries": len(self._data),
+                    "bytes": self._bytes,
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "evictions": self.evictions,
+                    "expirations": self.expirations}
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __getitem__(self, key):
+        return self.get(key)
+
+    def __delitem__(self, key):
+        self.delete(key)
 
     def __contains__(self, key):
+        return self.contains(key)
+
+    def __len__(self):
         with self.lock:
-            if dict.__contains__(self, key):
-                value = dict.__getitem__(self, key)
-                if value is None:
-                    return False
-                if datetime.utcnow() < value["expires"]:
-                    return True
-                else:
-                    value["data"] = None
-            return False
+            return len(self._data)
+
+    def __iter__(self):
+        with self.lock:
+            return iter([k[1] if k[0] is None else k for k in self._data])
+
+    def keys(self):
+        return list(self)
 
     def __str__(self):
         if self.auto_clean:
             self.clear_expired_items()
         n = 0
         with self.lock:
-            n = len(list(self.keys()))
+            n = len(self._data)
         return "ObjectCache(n={}, default_expiration={})".format(
             n, self.default_expiration)
 
@@ -94,6 +297,7 @@ class BlockchainObject(dict):
     type_ids = []
 
     _cache = ObjectCache()
+    _immutable_cache = ObjectCache(default_expiration=None, max_entries=10000)
 
     def __init__(
         self,
@@ -159,6 +363,7 @@ class BlockchainObject(dict):
     @staticmethod
     def clear_cache():
         BlockchainObject._cache = ObjectCache()
+        BlockchainObject._immutable_cache = ObjectCache(default_expiration=None, max_entries=10000)
 
     def test_valid_objectid(self, i):
         if isinstance(i, string_types):
@@ -175,10 +380,15 @@ class BlockchainObject(dict):
         if not self.type_ids:
             self.type_ids = [self.type_id]
 
+    @property
+    def cache_namespace(self):
+        """Namespace of this object type within the shared cache"""
+        return self.__class__.__name__
+
     def cache(self):
         # store in cache
         if dict.__contains__(self, self.id_item):
-            BlockchainObject._cache[self.get(self.id_item)] = self
+            BlockchainObject._cache.set(self.get(self.id_item), self, namespace=self.cache_namespace)
 
     def clear_cache_from_expired_items(self):
         BlockchainObject._cache.clear_expired_items()
@@ -195,11 +405,52 @@ class BlockchainObject(dict):
     def get_cache_auto_clean(self):
         return BlockchainObject._cache.auto_clean
 
+    def set_cache_max_size(self, max_entries=10000, max_bytes=None):
+        """ Sets the bounds of the shared object cache
+
+            :param int max_entries: Maximum number of cached objects
+            :param int max_bytes: Maximum approximate size of all cached objects
+        """
+        BlockchainObject._cache.set_max_size(max_entries=max_entries, max_bytes=max_bytes)
+
+    def get_cache_stats(self):
+        """Returns hit, miss, eviction and expiration counters of the shared object cache"""
+        return BlockchainObject._cache.stats()
+
+    def set_immutable_cache_max_size(self, max_entries=10000, max_bytes=None):
+        """ Sets the bounds of the never expiring cache tier for immutable objects
+
+            :param int max_entries: Maximum number of cached objects
+            :param int max_bytes: Maximum approximate size of all cached objects
+        """
+        BlockchainObject._immutable_cache.set_max_size(max_entries=max_entries, max_bytes=max_bytes)
+
+    def get_immutable_cache_stats(self):
+        """Returns hit, miss and eviction counters of the immutable object cache tier"""
+        return BlockchainObject._immutable_cache.stats()
+
+    def cache_immutable(self, key, data):
+        """ Stores data which can never change (e.g. irreversible blocks) without expiration
+
+            :param key: Cache key, e.g. block number and flavour
+            :param dict data: Object data, a copy is stored
+        """
+        BlockchainObject._immutable_cache.set(key, copy.deepcopy(data), namespace=self.cache_namespace)
+
+    def getcache_immutable(self, key):
+        """ Returns a copy of the data from the immutable object cache tier or None,
+            so that changes of the caller do not reach the cache
+        """
+        data = BlockchainObject._immutable_cache.get(key, None, namespace=self.cache_namespace)
+        if data is None:
+            return None
+        return copy.deepcopy(data)
+
     def iscached(self, id):
-        return id in BlockchainObject._cache
+        return BlockchainObject._cache.contains(id, namespace=self.cache_namespace)
 
     def getcache(self, id):
-        return BlockchainObject._cache.get(id, None)
+        return BlockchainObject._cache.get(id, None, namespace=self.cache_namespace)
 
     def __getitem__(self, key):
         if not self.cached:
@@ -5,6 +5,7 @@ from __future__ import print_function
 from __future__ import unicode_literals
 from builtins import str
 from builtins import object
+import atexit
 import json
 import logging
 import re
@@ -12,9 +13,12 @@ import os
 import math
 import ast
 import time
+import weakref
+from contextlib import contextmanager
 from morphenepythongraphenebase.py23 import bytes_types, integer_types, string_types, text_type
 from datetime import datetime, timedelta, date
 from morphenepythonapi.morphenenoderpc import MorpheneNodeRPC
+from morphenepythonapi.graphenerpc import GrapheneRPC
 from morphenepythonapi.exceptions import NoAccessApi, NoApiWithName
 from morphenepythongraphenebase.account import PrivateKey, PublicKey
 from morphenepythonbase import transactions, operations
@@ -28,6 +32,7 @@ from .exceptions import (
     AccountDoesNotExistsException
 )
 from .wallet import Wallet
+from .blockarchive import get_block_archive
 from .transactionbuilder import TransactionBuilder
 from .utils import formatTime, remove_from_dict, addTzInfo, formatToTimeStamp
 from morphenepython.constants import MORPHENE_100_PERCENT, MORPHENE_1_PERCENT, MORPHENE_RC_REGEN_TIME
@@ -35,6 +40,13 @@ from morphenepython.constants import MORPHENE_100_PERCENT, MORPHENE_1_PERCENT, M
 log = logging.getLogger(__name__)
 
 
+def _store_node_stats_at_exit(client_ref):
+    """Stores the node statistics of a client, which is still alive at exit"""
+    client = client_ref()
+    if client is not None:
+        client.store_node_stats()
+
+
 class MorpheneClient(object):
     """ Connect to the Morphene network.
 
@@ -65,6 +77,8 @@ class MorpheneClient(object):
         :param int num_retries_call: Repeat num_retries_call times a rpc call on node error (default is 5)
         :param int timeout: Timeout setting for https nodes (default is 60)
         :param dict custom_chains: custom chain which should be added to the known chains
+        :param str node_policy: Node selection policy, can be ``round_robin`` (default),
+            ``lowest_latency``, ``weighted_random`` or ``power_of_two``
 
         Three wallet operation modes are possible:
 
@@ -149,6 +163,60 @@ class MorpheneClient(object):
                 NumRetriesReached is raised. Disabled for -1. (default is -1)
             :param int num_retries_call: Repeat num_retries_call times a rpc call on node error (default is 5)
                 :param int timeout: Timeout setting for https nodes (default is 60)
+            :param str node_policy: Node selection policy, can be ``round_robin`` (default),
+                ``lowest_latency``, ``weighted_random`` or ``power_of_two``
+            :param bool keep_node_stats: Reads the node statistics of the previous run from the local
+                storage on connect and stores them again at exit, see :func:`store_node_stats`
+                (default is False)
+            :param bool hedge: Sends read calls, which are not answered in time, to a second node
+                (default is False), see :class:`morphenepythonapi.graphenerpc.GrapheneRPC`
+            :param bool rate_limit: Limits the requests per node with an adaptive token bucket, which
+                backs off on 429/503 replies and is shared by all clients of the process (default is False)
+            :param int pool_size: Maximum number of http connections per node of this client. Set it
+                to the number of threads, when the client is shared by a thread pool (default is None,
+                which uses the session shared by all clients)
+            :param dict cache_ttl: Seconds for which the rpc result of a method is reused, by method name,
+                e.g. ``{"get_dynamic_global_properties": 0.5}``. Identical calls of several threads at
+                the same time share a single request for frequently repeated read calls, e.g.
+                ``get_dynamic_global_properties``, unless ``coalesce=False`` is given. A list of
+                method names given as ``coalesce`` replaces these methods.
+            :param RPCMetrics metrics: Collects request counts, latencies, bytes, retries and errors by
+                node and api method, see :class:`morphenepythonapi.metrics.RPCMetrics`. The metrics
+                are returned by ``rpc.metrics()`` (default is a new collector per client).
+            :param str record: Path of a cassette file, to which all rpc requests and replies are
+                written, see :class:`morphenepythonapi.cassette.CassetteRecorder`. The file is
+                complete after ``rpc.stop_recording()``.
+            :param str replay: Path of a cassette file, whose replies answer all rpc requests
+                instead of a node, see :class:`morphenepythonapi.cassette.CassettePlayer`
+            :param bool replay_realtime: Delays the replayed replies by their recorded latency
+                (default is False)
+            :param list critical_nodes: Nodes which are reserved for broadcasts, ``verify_authority``
+                and the reference block of new transactions (default is None)
+            :param int critical_pool_size: Number of http connections per node which are reserved for
+                those critical calls (default is 2)
+            :param float bulk_share: Share of the connections which bulk reads, e.g. of
+                ``Blockchain.blocks()``, may use at the same time, None for no limit (default is 0.5)
+            :param RetryPolicy retry_policy: Exponential backoff with full jitter between retries and
+                a deadline per call, which can be set by method, e.g.
+                ``RetryPolicy(deadline=10, method_deadlines={"get_dynamic_global_properties": 2})``.
+                A call which does not succeed within its deadline raises ``DeadlineExceeded``, also
+                with ``num_retries=-1``, see :class:`morphenepythonapi.retry.RetryPolicy`
+            :param bool autoconnect: When False, the client connects on its first rpc call
+                (default is False)
+            :param handshake_cache: Keeps the ``get_config`` reply of every node in a versioned
+                file, so that the connect of the next run skips the handshake round trip. True
+                for the default file in the user cache directory, a file path or a
+                :class:`morphenepythonapi.handshakecache.HandshakeCache` (default is False,
+                which does the handshake on every connect)
+            :param float handshake_ttl: Seconds for which a cached handshake is used (default is 3600)
+            :param block_archive: Directory of a :class:`morphenepython.blockarchive.BlockArchive` (or the
+                archive itself), from which ``Block`` and ``Blockchain.blocks()`` read full blocks before
+                asking the node. It is filled by ``Blockchain.archive()`` and can also be used offline
+                (default is None)
+
+            The fields of :func:`refresh_data` are requested on their first use and
+            refreshed one by one, when they are older than ``data_refresh_time_seconds``.
+            The wallet is opened on first use as well.
 
         """
 
@@ -165,6 +233,7 @@ class MorpheneClient(object):
 
         # Store config for access through other Classes
         self.config = config
+        self.block_archive = get_block_archive(kwargs.get("block_archive", None))
 
         if not self.offline:
             self.connect(node=node,
@@ -173,14 +242,29 @@ class MorpheneClient(object):
                          **kwargs)
 
         self.data = {'last_refresh': None, 'last_node': None, 'dynamic_global_properties': None,
-                     'hardfork_properties': None, 'network': None, 'witness_schedule': None, 'config': None}
+                     'hardfork_properties': None, 'network': None, 'witness_schedule': None, 'config': None,
+                     'last_irreversible_block_num': None}
+        # Time and node of the last refresh of every field of refresh_data
+        self._data_refreshed = {}
         self.data_refresh_time_seconds = data_refresh_time_seconds
         # self.refresh_data()
 
         # txbuffers/propbuffer are initialized and cleared
         self.clear()
 
-        self.wallet = Wallet(morphene_instance=self, **kwargs)
+        self._wallet = None
+        self._wallet_kwargs = kwargs
+
+    @property
+    def wallet(self):
+        """The :class:`morphenepython.wallet.Wallet` of the client, which is created on first use"""
+        if self._wallet is None:
+            self._wallet = Wallet(morphene_instance=self, **self._wallet_kwargs)
+        return self._wallet
+
+    @wallet.setter
+    def wallet(self, wallet):
+        self._wallet = wallet
 
     # -------------------------------------------------------------------------
     # Basic Calls
@@ -194,7 +278,7 @@ class MorpheneClient(object):
         """
         if not node:
             node = self.get_default_nodes()
-            if not bool(node):
+            if not bool(node) and not kwargs.get("replay", None):
                 raise ValueError("A Morphene node needs to be provided!")
 
         if not rpcuser and "rpcuser" in config:
@@ -203,17 +287,67 @@ class MorpheneClient(object):
         if not rpcpassword and "rpcpassword" in config:
             rpcpassword = config["rpcpassword"]
 
+        if kwargs.get("keep_node_stats", False):
+            if "node_stats" not in kwargs:
+                kwargs["node_stats"] = self.get_stored_node_stats()
+            if not getattr(self, "_node_stats_at_exit", False):
+                atexit.register(_store_node_stats_at_exit, weakref.ref(self))
+                self._node_stats_at_exit = True
+        kwargs.setdefault("autoconnect", False)
         self.rpc = MorpheneNodeRPC(node, rpcuser, rpcpassword, **kwargs)
 
+    def get_stored_node_stats(self):
+        """Returns the node statistics which were stored by :func:`store_node_stats`"""
+        node_stats = config.get("node_stats", None)
+        if not node_stats:
+            return {}
+        try:
+            return json.loads(node_stats)
+        except ValueError:
+            log.warning("Could not read the stored node statistics")
+            return {}
+
+    def store_node_stats(self):
+        """ Stores the latency, error rate and head block lag of all nodes in the
+            local storage, so that the node selection of the next run can start with them.
+            This is done at exit, when the client was created with ``keep_node_stats=True``.
+        """
+        if self.rpc is None:
+            return
+        node_stats = self.get_stored_node_stats()
+        node_stats.update(self.rpc.nodes.export_stats())
+        try:
+            config["node_stats"] = json.dumps(node_stats)
+        except Exception as e:
+            log.warning("Could not store the node statistics: %s" % str(e))
+
     def is_connected(self):
         """Returns if rpc is connected"""
         return self.rpc is not None
 
+    @contextmanager
+    def rpc_priority(self, priority):
+        """ Within the ``with`` block, the rpc calls of the current thread have the given
+            priority (``critical``, ``normal`` or ``bulk``), see :mod:`morphenepythonapi.priority`.
+            It does nothing, when there is no rpc connection.
+
+            .. code-block:: python
+
+                with mph.rpc_priority("bulk"):
+                    blocks = [Block(n, morphene_instance=mph) for n in range(1, 101)]
+
+        """
+        if not isinstance(self.rpc, GrapheneRPC):
+            yield
+            return
+        with self.rpc.priority(priority):
+            yield
+
     def __repr__(self):
         if self.offline:
             return "<%s offline=True>" % (
                 self.__class__.__name__)
-        elif self.rpc is not None and len(self.rpc.url) > 0:
+        elif self.rpc is not None and self.rpc.url:
             return "<%s node=%s, nobroadcast=%s>" % (
                 self.__class__.__name__, str(self.rpc.url), str(self.nobroadcast))
         else:
@@ -222,7 +356,9 @@ class MorpheneClient(object):
 
     def refresh_data(self, force_refresh=False, data_refresh_time_seconds=None):
         """ Read and stores Morphene Blockchain parameters
-            If the last data refresh is older than data_refresh_time_seconds, data will be refreshed
+            Every field, which is older than data_refresh_time_seconds or was received from
+            another node, will be refreshed. The getters of the stored data refresh only
+            their own field, when it is accessed.
 
             :param bool force_refresh: if True, a refresh of the data is enforced
             :param float data_refresh_time_seconds: set a new minimal refresh time in seconds
@@ -232,34 +368,73 @@ class MorpheneClient(object):
             return
         if data_refresh_time_seconds is not None:
             self.data_refresh_time_seconds = data_refresh_time_seconds
-        if self.data['last_refresh'] is not None and not force_refresh and self.data["last_node"] == self.rpc.url:
-            if (datetime.utcnow() - self.data['last_refresh']).total_seconds() < self.data_refresh_time_seconds:
-                return
-        self.data['last_refresh'] = datetime.utcnow()
+        for key in ['dynamic_global_properties', 'hardfork_properties', 'network', 'witness_schedule', 'config']:
+            self._refresh_field(key, force_refresh=force_refresh)
+
+    def _refresh_field(self, key, force_refresh=False):
+        """ Returns a field of the stored data, which is requested again when it is
+            older than data_refresh_time_seconds or was received from another node
+        """
+        if self.offline or self.rpc is None:
+            return self.data[key]
+        refreshed = self._data_refreshed.get(key)
+        if refreshed is not None and not force_refresh and refreshed[1] == self.rpc.url:
+            if (datetime.utcnow() - refreshed[0]).total_seconds() < self.data_refresh_time_seconds:
+                return self.data[key]
+        if key == 'dynamic_global_properties':
+            value = self.get_dynamic_global_properties(False)
+        elif key == 'hardfork_properties':
+            try:
+                value = self.get_hardfork_properties(False)
+            except:
+                value = None
+        elif key == 'network':
+            value = self.get_network(False)
+        elif key == 'witness_schedule':
+            value = self.get_witness_schedule(False)
+        elif key == 'config' and not force_refresh:
+            # The config of the handshake, which may come from the handshake cache
+            self.rpc.set_next_node_on_empty_reply(True)
+            value = self.rpc.get_cached_config()
+        else:
+            value = self.get_config(False)
+        now = datetime.utcnow()
+        self.data[key] = value
+        self._data_refreshed[key] = (now, self.rpc.url)
         self.data["last_node"] = self.rpc.url
-        self.data["dynamic_global_properties"] = self.get_dynamic_global_properties(False)
-        try:
-            self.data['hardfork_properties'] = self.get_hardfork_properties(False)
-        except:
-            self.data['hardfork_properties'] = None
-        self.data['network'] = self.get_network(False)
-        self.data['witness_schedule'] = self.get_witness_schedule(False)
-        self.data['config'] = self.get_config(False)
+        if self.data['last_refresh'] is None or \
+                (now - self.data['last_refresh']).total_seconds() >= self.data_refresh_time_seconds:
+            self.data['last_refresh'] = now
+        return value
 
     def get_dynamic_global_properties(self, use_stored_data=True):
         """ This call returns the *dynamic global properties*
 
             :param bool use_stored_data: if True, stored data will be returned. If stored data are
-                empty or old, refresh_data() is used.
+                empty or old, it is refreshed.
 
         """
         if use_stored_data:
-            self.refresh_data()
-            return self.data['dynamic_global_properties']
+            return self._refresh_field('dynamic_global_properties')
         if self.rpc is None:
             return None
         self.rpc.set_next_node_on_empty_reply(True)
-        return self.rpc.get_dynamic_global_properties(api="database")
+        props = self.rpc.get_dynamic_global_properties(api="database")
+        if props is not None and "head_block_number" in props:
+            self.rpc.nodes.record_head_block(props["head_block_number"])
+        if props is not None and "last_irreversible_block_num" in props:
+            last_irreversible_block_num = int(props["last_irreversible_block_num"])
+            if (self.data['last_irreversible_block_num'] is None or
+                    last_irreversible_block_num > self.data['last_irreversible_block_num']):
+                self.data['last_irreversible_block_num'] = last_irreversible_block_num
+        return props
+
+    def get_last_irreversible_block_num(self):
+        """ Returns the highest last irreversible block number seen so far in the
+            dynamic global properties, without doing an api call. Returns None when
+            no properties were received yet.
+        """
+        return self.data['last_irreversible_block_num']
 
     def get_reserve_ratio(self):
         """ This call returns the *reserve ratio*
@@ -278,11 +453,10 @@ class MorpheneClient(object):
         """ Returns Hardfork and live_time of the hardfork
 
             :param bool use_stored_data: if True, stored data will be returned. If stored data are
-                                         empty or old, refresh_data() is used.
+                                         empty or old, it is refreshed.
         """
         if use_stored_data:
-            self.refresh_data()
-            return self.data['hardfork_properties']
+            return self._refresh_field('hardfork_properties')
         if self.rpc is None:
             return None
         ret = None
@@ -295,14 +469,13 @@ class MorpheneClient(object):
         """ Identify the network
 
             :param bool use_stored_data: if True, stored data will be returned. If stored data are
-                                         empty or old, refresh_data() is used.
+                                         empty or old, it is refreshed.
 
             :returns: Network parameters
             :rtype: dictionary
         """
         if use_stored_data:
-            self.refresh_data()
-            return self.data['network']
+            return self._refresh_field('network')
 
         if self.rpc is None:
             return None
@@ -415,8 +588,7 @@ class MorpheneClient(object):
 
         """
         if use_stored_data:
-            self.refresh_data()
-            return self.data['witness_schedule']['median_props']
+            return self._refresh_field('witness_schedule')['median_props']
         else:
             return self.get_witness_schedule(use_stored_data)['median_props']
 
@@ -425,8 +597,7 @@ class MorpheneClient(object):
 
         """
         if use_stored_data:
-            self.refresh_data()
-            return self.data['witness_schedule']
+            return self._refresh_field('witness_schedule')
 
         if self.rpc is None:
             return None
@@ -439,8 +610,7 @@ class MorpheneClient(object):
             :param bool use_stored_data: If True, the cached value is returned
         """
         if use_stored_data:
-            self.refresh_data()
-            config = self.data['config']
+            config = self._refresh_field('config')
         else:
             if self.rpc is None:
                 return None
@@ -523,7 +693,7 @@ class MorpheneClient(object):
             is equal to the current working node url
         """
         node = self.get_default_nodes()
-        if len(node) < 2:
+        if len(node) < 2 or (not self.offline and self.rpc.url not in node):
             return
         offline = self.offline
         while not offline and node[0] != self.rpc.url and len(node) > 1:
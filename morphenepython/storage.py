@@ -561,6 +561,134 @@ class Configuration(DataDir):
         return len(cursor.fetchall())
 
 
+class Checkpoints(DataDir):
+    """ This is the checkpoint storage of
+        :class:`morphenepython.streamconsumer.StreamConsumer`, which stores the
+        position ``(block_num, trx_num, op_num)`` of the last processed operation
+        of every consumer in the `checkpoints` table of the SQLite3 database.
+
+        :param str path: Path of a separate database file (default is None,
+            which uses the database of the user data directory)
+
+        Unlike the other stores, the checkpoints are never kept in memory only:
+        :class:`morphenepython.exceptions.NoWriteAccess` is raised when the
+        database cannot be opened or written.
+    """
+    __tablename__ = "checkpoints"
+
+    def __init__(self, path=None):
+        super(Checkpoints, self).__init__()
+        if path is not None:
+            directory = os.path.dirname(path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            self.sqlDataBaseFile = path
+        elif self.sqlDataBaseFile == ":memory:":
+            raise NoWriteAccess("Could not create the data directory: %s" % (self.data_dir))
+        if not self.exists_table():
+            self.create_table()
+
+    def exists_table(self):
+        """ Check if the database table exists
+        """
+        query = ("SELECT name FROM sqlite_master "
+                 "WHERE type='table' AND name=?", (self.__tablename__,))
+        try:
+            connection = sqlite3.connect(self.sqlDataBaseFile)
+            cursor = connection.cursor()
+            cursor.execute(*query)
+            return True if cursor.fetchone() else False
+        except sqlite3.OperationalError:
+            log.error("Could not read database: %s" % (self.sqlDataBaseFile))
+            raise NoWriteAccess("Could not read database: %s" % (self.sqlDataBaseFile))
+
+    def create_table(self):
+        """ Create the new table in the SQLite database
+        """
+        query = ("CREATE TABLE IF NOT EXISTS {0} ("
+                 "consumer STRING(256) PRIMARY KEY,"
+                 "block_num INTEGER,"
+                 "trx_num INTEGER,"
+                 "op_num INTEGER,"
+                 "updated REAL)".format(self.__tablename__))
+        connection = sqlite3.connect(self.sqlDataBaseFile)
+        cursor = connection.cursor()
+        try:
+            cursor.execute(query)
+            connection.commit()
+        except sqlite3.OperationalError:
+            log.error("Could not write to database: %s" % (self.__tablename__))
+            raise NoWriteAccess("Could not write to database: %s" % (self.__tablename__))
+
+    def get(self, consumer):
+        """ Returns the checkpoint of a consumer as ``(block_num, trx_num, op_num)``,
+            or None when the consumer has no checkpoint
+
+            :param str consumer: Name of the consumer
+        """
+        query = ("SELECT block_num, trx_num, op_num FROM {0} WHERE consumer=?".format(self.__tablename__),
+                 (consumer,))
+        connection = sqlite3.connect(self.sqlDataBaseFile)
+        cursor = connection.cursor()
+        cursor.execute(*query)
+        result = cursor.fetchone()
+        if result:
+            return tuple(result)
+        else:
+            return None
+
+    def connect(self):
+        """ Returns a new connection to the database, e.g. to store results
+            together with a checkpoint
+        """
+        return sqlite3.connect(self.sqlDataBaseFile)
+
+    def set(self, consumer, position, connection=None):
+        """ Stores the checkpoint of a consumer within one transaction
+
+            :param str consumer: Name of the consumer
+            :param tuple position: ``(block_num, trx_num, op_num)``
+            :param connection: Connection from :func:`connect`, the checkpoint
+                becomes part of its open transaction and is stored when the
+                caller commits it (default is None, which commits at once)
+        """
+        block_num, trx_num, op_num = position
+        query = ("INSERT OR REPLACE INTO {0} (consumer, block_num, trx_num, op_num, updated) "
+                 "VALUES (?, ?, ?, ?, ?)".format(self.__tablename__),
+                 (consumer, block_num, trx_num, op_num, time.time()))
+        if connection is not None:
+            connection.cursor().execute(*query)
+            return
+        connection = self.connect()
+        cursor = connection.cursor()
+        cursor.execute(*query)
+        connection.commit()
+
+    def delete(self, consumer):
+        """ Delete the checkpoint of a consumer
+
+            :param str consumer: Name of the consumer
+        """
+        query = ("DELETE FROM {0} WHERE consumer=?".format(self.__tablename__), (consumer,))
+        connection = sqlite3.connect(self.sqlDataBaseFile)
+        cursor = connection.cursor()
+        cursor.execute(*query)
+        connection.commit()
+
+    def getConsumers(self):
+        """ Returns the names of all consumers with a checkpoint
+        """
+        query = ("SELECT consumer FROM {0} ORDER BY consumer".format(self.__tablename__))
+        connection = sqlite3.connect(self.sqlDataBaseFile)
+        cursor = connection.cursor()
+        try:
+            cursor.execute(query)
+            results = cursor.fetchall()
+            return [x[0] for x in results]
+        except sqlite3.OperationalError:
+            return []
+
+
 class MasterPassword(object):
     """ The keys are encrypted with a Masterpassword that is stored in
         the configurationStore. It has a checksum to verify correctness
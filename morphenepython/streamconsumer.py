@@ -0,0 +1,182 @@
+# This Python file uses the following encoding: utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from builtins import object
+import time
+import logging
+from .blockchain import Blockchain
+from .storage import Checkpoints
+
+log = logging.getLogger(__name__)
+
+#: Number of processed operations after which the checkpoint is committed
+DEFAULT_COMMIT_EVERY = 1000
+
+#: Seconds after which the checkpoint is committed
+DEFAULT_COMMIT_INTERVAL = 5.
+
+
+class StreamConsumer(object):
+    """ Streams operations like :func:`morphenepython.blockchain.Blockchain.stream`
+        and commits the position of the processed operations to a
+        :class:`morphenepython.storage.Checkpoints` storage, so that a restarted
+        consumer continues after the last committed operation.
+
+        :param str name: Name of the consumer, every consumer has its own checkpoint
+        :param int start: First block, when the consumer has no checkpoint
+            (default is the current block)
+        :param array opNames: List of operations to filter for
+        :param bool raw_ops: When set to True, the unmodified operations are yielded (default: False)
+        :param store: :class:`morphenepython.storage.Checkpoints` or the path of a
+            separate database (default is the database in the user data directory)
+        :param int commit_every: Number of processed operations after which the
+            checkpoint is committed (default is 1000)
+        :param float commit_interval: Seconds after which the checkpoint is committed
+            (default is 5)
+        :param Blockchain blockchain: Blockchain instance (default is a new
+            :class:`morphenepython.blockchain.Blockchain` in irreversible mode)
+        :param MorpheneClient morphene_instance: MorpheneClient instance
+
+        All further keyword arguments, e.g. ``stop``, ``max_batch_size`` or
+        ``only_virtual_ops``, are passed to
+        :func:`morphenepython.blockchain.Blockchain.blocks`. They must not change
+        between the runs of a consumer, as the positions depend on them.
+
+        .. code-block:: python
+
+            from morphenepython.streamconsumer import StreamConsumer
+            consumer = StreamConsumer("transfers", start=1000000, opNames=["transfer"])
+            for op in consumer.stream():
+                handle(op)
+
+        An operation counts as processed when the next one is requested, and
+        the checkpoint is committed in batches of ``commit_every`` operations
+        or every ``commit_interval`` seconds, on :func:`commit` and when the
+        stream ends or is closed. A block without matching operations moves the
+        checkpoint as well.
+
+        :func:`stream` delivers the operations at least once: after a crash,
+        the operations which were processed after the last commit are yielded
+        again, and when the loop over :func:`stream` is left with ``break``,
+        the last yielded operation is not committed and is yielded again by the
+        next stream.
+
+        :func:`process` delivers the operations exactly once: the handler
+        writes its results with the connection it gets, and the checkpoint is
+        committed in the same transaction, so that the results and the
+        checkpoint are stored or lost together.
+
+        .. code-block:: python
+
+            def handle(op, connection):
+                connection.execute("INSERT INTO transfers VALUES (?, ?)", (op["from"], op["amount"]))
+
+            consumer.process(handle)
+    """
+    def __init__(self, name, start=None, opNames=[], raw_ops=False, store=None,
+                 commit_every=DEFAULT_COMMIT_EVERY, commit_interval=DEFAULT_COMMIT_INTERVAL,
+                 blockchain=None, morphene_instance=None, **kwargs):
+        self.name = name
+        self.start = start
+        self.opNames = opNames
+        self.raw_ops = raw_ops
+        if not isinstance(store, Checkpoints):
+            store = Checkpoints(store)
+        self.store = store
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self.blockchain = blockchain or Blockchain(morphene_instance=morphene_instance)
+        self.kwargs = kwargs
+        self.committed = self.store.get(name)
+        self.position = self.committed
+        self._uncommitted = 0
+        self._last_commit = time.time()
+        self._connection = None
+
+    def _get_start(self):
+        """Returns the first block and the position within it, after which the stream continues"""
+        if self.position is None:
+            return self.start, None
+        block_num, trx_num, op_num = self.position
+        if trx_num is None:
+            return block_num + 1, None
+        return block_num, (trx_num, op_num)
+
+    def _processed(self, position, count=1):
+        self.position = position
+        self._uncommitted += count
+        if self._uncommitted >= self.commit_every or time.time() - self._last_commit >= self.commit_interval:
+            self.commit()
+
+    def stream(self):
+        """ Yields the operations after the last checkpoint, in the format of
+            :func:`morphenepython.blockchain.Blockchain.stream`, with ``block_num``,
+            ``trx_num`` and ``op_num``
+        """
+        start, skip_until = self._get_start()
+        try:
+            for block in self.blockchain.blocks(start=start, **self.kwargs):
+                block_num = block.block_num
+                for op in self.blockchain.get_block_ops(block, opNames=self.opNames, raw_ops=self.raw_ops):
+                    if block_num == start and skip_until is not None and \
+                            (op["trx_num"], op["op_num"]) <= skip_until:
+                        continue
+                    yield op
+                    self._processed((block_num, op["trx_num"], op["op_num"]))
+                self._processed((block_num, None, None), count=0)
+        finally:
+            self.commit()
+
+    def process(self, handler):
+        """ Passes the operations after the last checkpoint to
+            ``handler(op, connection)`` and stores its results exactly once
+
+            :param handler: Function which handles an operation in the format of
+                :func:`stream`, and which stores its results with ``connection``,
+                an open transaction of the checkpoint database. The handler must
+                not commit or roll back the transaction itself.
+
+            The transaction is committed together with the checkpoint, in
+            batches of ``commit_every`` operations or every ``commit_interval``
+            seconds. When the handler or the stream raises, the uncommitted
+            results are rolled back and the operations are processed again by
+            the next call.
+        """
+        self._connection = self.store.connect()
+        ops = self.stream()
+        try:
+            for op in ops:
+                handler(op, self._connection)
+        except BaseException:
+            self._connection.rollback()
+            self.position = self.committed
+            raise
+        finally:
+            ops.close()
+            self._connection.close()
+            self._connection = None
+
+    def commit(self):
+        """Commits the position of the processed operations"""
+        if self.position is not None and self.position != self.committed:
+            self.store.set(self.name, self.position, connection=self._connection)
+            if self._connection is not None:
+                self._connection.commit()
+            self.committed = self.position
+        self._uncommitted = 0
+        self._last_commit = time.time()
+
+    def reset(self, position=None):
+        """ Sets the checkpoint, or removes it, so that the next stream begins at ``start``
+
+            :param tuple position: ``(block_num, trx_num, op_num)`` of the last
+                processed operation, or None
+        """
+        if position is None:
+            self.store.delete(self.name)
+        else:
+            self.store.set(self.name, tuple(position))
+        self.committed = position
+        self.position = position
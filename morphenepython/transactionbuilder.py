@@ -21,6 +21,7 @@ from .exceptions import (
     OfflineHasNoRPCException
 )
 from morphenepython.instance import shared_morphene_instance
+from morphenepythonapi.priority import CRITICAL
 log = logging.getLogger(__name__)
 
 
@@ -238,8 +239,9 @@ class TransactionBuilder(dict):
             self.expiration or self.morphene.expiration
         )
         if ref_block_num is None or ref_block_prefix is None:
-            ref_block_num, ref_block_prefix = transactions.getBlockParams(
-                self.morphene.rpc)
+            with self.morphene.rpc_priority(CRITICAL):
+                ref_block_num, ref_block_prefix = transactions.getBlockParams(
+                    self.morphene.rpc)
         self.tx = Signed_Transaction(
             ref_block_prefix=ref_block_prefix,
             expiration=expiration,
@@ -298,7 +300,8 @@ class TransactionBuilder(dict):
         try:
             self.morphene.rpc.set_next_node_on_empty_reply(False)
             args = self.json()
-            ret = self.morphene.rpc.verify_authority(args, api="database")
+            with self.morphene.rpc_priority(CRITICAL):
+                ret = self.morphene.rpc.verify_authority(args, api="database")
             if not ret:
                 raise InsufficientAuthorityError
             elif isinstance(ret, dict) and "valid" in ret and not ret["valid"]:
@@ -364,17 +367,18 @@ class TransactionBuilder(dict):
             log.info("Not broadcasting anything!")
             self.clear()
             return ret
-        # Broadcast
+        # Broadcast, on the connections and nodes reserved for critical calls
         try:
             self.morphene.rpc.set_next_node_on_empty_reply(False)
-            if self.morphene.blocking:
-                ret = self.morphene.rpc.broadcast_transaction_synchronous(
-                    args, api=broadcast_api)
-                if "trx" in ret:
-                    ret.update(**ret.get("trx"))
-            else:
-                self.morphene.rpc.broadcast_transaction(
-                    args, api=broadcast_api)
+            with self.morphene.rpc_priority(CRITICAL):
+                if self.morphene.blocking:
+                    ret = self.morphene.rpc.broadcast_transaction_synchronous(
+                        args, api=broadcast_api)
+                    if "trx" in ret:
+                        ret.update(**ret.get("trx"))
+                else:
+                    self.morphene.rpc.broadcast_transaction(
+                        args, api=broadcast_api)
         except Exception as e:
             # log.error("Could Not broadcasting anything!")
             self.clear()
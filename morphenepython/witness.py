@@ -192,7 +192,7 @@ class GetWitnesses(WitnessesObject):
 
         :param list name_list: list of witneses to fetch
         :param int batch_limit: (optional) maximum number of witnesses
-            to fetch per call, defaults to 100
+            to fetch per batch call, defaults to 100
         :param MorpheneClient morphene_instance: MorpheneClient() instance to use when
             accessing a RPCcreator = Witness(creator, morphene_instance=self)
 
@@ -208,10 +208,11 @@ class GetWitnesses(WitnessesObject):
         self.morphene = morphene_instance or shared_morphene_instance()
         if not self.morphene.is_connected():
             return
-        witnesses = []
-        name_cnt = 0
-        for witness in name_list:
-            witnesses.append(self.morphene.rpc.get_witness_by_account(witness))
+        self.morphene.rpc.set_next_node_on_empty_reply(False)
+        with self.morphene.rpc.batch(max_batch_size=batch_limit) as batch:
+            for witness in name_list:
+                batch.get_witness_by_account(witness)
+        witnesses = [future.result() for future in batch.futures]
         self.identifier = ""
         super(GetWitnesses, self).__init__(
             [
@@ -5,6 +5,17 @@ __all__ = [
     "exceptions",
     "websocket",
     "rpcutils",
+    "rpcbatch",
+    "batchsize",
+    "ratelimit",
+    "priority",
+    "retry",
+    "singleflight",
+    "metrics",
+    "jsoncodec",
+    "cassette",
+    "handshakecache",
+    "localnode",
     "graphenerpc",
     "node",
 ]
@@ -0,0 +1,403 @@
+"""asyncio node rpc."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import asyncio
+import time
+import logging
+from .exceptions import (
+    UnauthorizedError, RPCConnection, RPCError, RPCErrorDoRetry, CallRetriesReached, WorkingNodeMissing,
+    DeadlineExceeded
+)
+from .rpcutils import (
+    get_api_name, get_query
+)
+from .node import Nodes
+from .metrics import RPCMetrics, get_metric_method
+from . import jsoncodec
+from .graphenerpc import GrapheneRPC
+from .morphenenoderpc import classify_error_message, RETRY_CALL, SWITCH_NODE
+from . import exceptions
+from morphenepythongraphenebase.version import version as morphenepython_version
+AIOHTTP_MODULE = None
+if not AIOHTTP_MODULE:
+    try:
+        import aiohttp
+        AIOHTTP_MODULE = "aiohttp"
+    except ImportError:
+        AIOHTTP_MODULE = None
+
+log = logging.getLogger(__name__)
+
+
+class AsyncMorpheneNodeRPC(object):
+    """ asyncio counterpart of :class:`morphenepythonapi.morphenenoderpc.MorpheneNodeRPC`.
+        All api methods are mapped to coroutines.
+
+        :param str urls: Either a single Websocket/Http URL, or a list of URLs
+        :param str user: Username for Authentication
+        :param str password: Password for Authentication
+        :param int num_retries: Try x times to num_retries to a node on disconnect, -1 for indefinitely (default is 100)
+        :param int num_retries_call: Repeat num_retries_call times a rpc call on node error (default is 5)
+        :param int timeout: Timeout setting for a single call in seconds (default is 60)
+        :param int max_connections: Maximum number of keep-alive connections to a http node (default is 100)
+        :param str node_policy: Node selection policy, see :class:`morphenepythonapi.node.Nodes` (default is ``round_robin``)
+        :param dict node_stats: Node statistics of a previous run, from ``rpc.nodes.export_stats()``
+        :param RPCMetrics metrics: Collects the metrics of all calls (default is a new
+            :class:`morphenepythonapi.metrics.RPCMetrics`)
+        :param RetryPolicy retry_policy: Delays between retries and deadlines of the calls, by
+            method. A call which takes longer than its deadline is cancelled and raises
+            :class:`morphenepythonapi.exceptions.DeadlineExceeded`
+            (default is a :class:`morphenepythonapi.retry.RetryPolicy` without deadline)
+
+        Calls to http nodes are spread over a pool of keep-alive connections.
+        Calls to websocket nodes share a single connection, replies are
+        matched to their calls by the JSON-RPC id, so any number of calls
+        can be in flight at the same time. The connection is established on
+        the first call. Requires Python 3.5 or newer and the ``aiohttp`` module,
+        which is installed with ``pip install morphenepython[async]``. The module
+        is not part of ``morphenepythonapi.__all__`` and has to be imported explicitly.
+
+        .. code-block:: python
+
+            import asyncio
+            from morphenepythonapi.asyncnoderpc import AsyncMorpheneNodeRPC
+
+            async def main():
+                async with AsyncMorpheneNodeRPC("https://morphene.io/rpc") as rpc:
+                    blocks = await asyncio.gather(*[rpc.get_block(n) for n in range(1, 1001)])
+
+            asyncio.get_event_loop().run_until_complete(main())
+
+    """
+
+    def __init__(self, urls, user=None, password=None, **kwargs):
+        """Init."""
+        if AIOHTTP_MODULE is None:
+            raise ImportError("AsyncMorpheneNodeRPC requires the aiohttp module!")
+        self.timeout = kwargs.get('timeout', 60)
+        num_retries = kwargs.get("num_retries", 100)
+        num_retries_call = kwargs.get("num_retries_call", 5)
+        self.max_connections = kwargs.get("max_connections", 100)
+        self.nodes = Nodes(urls, num_retries, num_retries_call,
+                           policy=kwargs.get("node_policy", "round_robin"),
+                           stats=kwargs.get("node_stats", None),
+                           retry_policy=kwargs.get("retry_policy", None))
+        self.user = user
+        self.password = password
+        self.url = None
+        self.session = None
+        self.ws = None
+        self.headers = {'User-Agent': 'morphenepython v%s' % (morphenepython_version),
+                        'content-type': 'application/json'}
+        self._request_id = 0
+        self._pending = {}
+        self._ws_reader = None
+        self._connect_lock = None
+        self.rpc_metrics = kwargs.get("metrics", None) or RPCMetrics()
+
+    @property
+    def num_retries(self):
+        return self.nodes.num_retries
+
+    @property
+    def num_retries_call(self):
+        return self.nodes.num_retries_call
+
+    @property
+    def is_connected(self):
+        return self.url is not None
+
+    def get_request_id(self, count=1):
+        """Reserves count consecutive request ids and returns the first one"""
+        request_id = self._request_id + 1
+        self._request_id += count
+        return request_id
+
+    async def __aenter__(self):
+        await self.rpcconnect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.rpcclose()
+
+    async def rpcconnect(self, next_url=True, failed_url=None):
+        """ Connect to next url in a loop.
+
+            :param bool next_url: Switch to the next node, otherwise reconnect to the current one
+            :param str failed_url: Only (re)connect when the current node is still failed_url,
+                as concurrent calls may already have switched the node
+        """
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if failed_url is not None and self.url != failed_url:
+                return
+            await self._rpcconnect(next_url=next_url)
+
+    async def _ensure_connected(self):
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self.url is None:
+                await self._rpcconnect()
+
+    async def _rpcconnect(self, next_url=True):
+        if self.nodes.working_nodes_count == 0:
+            raise WorkingNodeMissing
+        while True:
+            await self._close_transport()
+            if next_url:
+                previous_url = self.url
+                self.url = next(self.nodes)
+                if previous_url is not None and previous_url != self.url:
+                    self.rpc_metrics.inc_node_switch(previous_url)
+                self.nodes.reset_error_cnt_call()
+                log.debug("Trying to connect to node %s" % self.url)
+            try:
+                if self.session is None:
+                    connector = aiohttp.TCPConnector(limit_per_host=self.max_connections)
+                    self.session = aiohttp.ClientSession(connector=connector, headers=self.headers)
+                if self.url[:2] == "ws":
+                    self.ws = await asyncio.wait_for(self.session.ws_connect(self.url, max_msg_size=0), self.timeout)
+                    self._ws_reader = asyncio.ensure_future(self._ws_read_loop(self.ws))
+                    if self.user and self.password:
+                        await self._call(get_query(self.get_request_id(), "login_api", "login",
+                                                   [self.user, self.password]))
+                props = await self._call(get_query(self.get_request_id(), "database_api", "get_config", []))
+                if props is None:
+                    raise RPCError("Could not receive answer for get_config")
+                break
+            except KeyboardInterrupt:
+                raise
+            except Exception as e:
+                self.nodes.increase_error_cnt()
+                do_sleep = not next_url or (next_url and self.nodes.working_nodes_count == 1)
+                self.nodes.sleep_and_check_retries(str(e), sleep=False)
+                if do_sleep:
+                    await asyncio.sleep(self.nodes.retry_delay(self.nodes.error_cnt))
+                next_url = True
+
+    async def _close_transport(self):
+        if self.ws is not None:
+            ws = self.ws
+            self.ws = None
+            await ws.close()
+        if self._ws_reader is not None:
+            self._ws_reader.cancel()
+            self._ws_reader = None
+        self._fail_pending(RPCConnection("Connection to %s was closed" % self.url))
+
+    async def rpcclose(self):
+        """Closes all connections"""
+        await self._close_transport()
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        self.url = None
+
+    def _fail_pending(self, exception):
+        pending = self._pending
+        self._pending = {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(exception)
+
+    async def _ws_read_loop(self, ws):
+        """Hands every websocket reply to the call waiting for its id"""
+        try:
+            async for msg in ws:
+                if msg.type != aiohttp.WSMsgType.TEXT:
+                    continue
+                try:
+                    data = jsoncodec.loads(msg.data)
+                except ValueError:
+                    log.warning("Received invalid reply: %s" % msg.data)
+                    continue
+                if isinstance(data, dict):
+                    request_ids = [data.get("id")]
+                else:
+                    request_ids = [r.get("id") for r in data if isinstance(r, dict)]
+                for request_id in request_ids:
+                    future = self._pending.pop(request_id, None)
+                    if future is not None:
+                        if not future.done():
+                            future.set_result(msg.data)
+                        break
+        finally:
+            if self.ws is ws:
+                self._fail_pending(RPCConnection("Connection to %s was closed" % self.url))
+
+    async def _send(self, payload, data):
+        """Sends the encoded payload to the current node and returns the reply text"""
+        if self.ws is not None:
+            if isinstance(payload, list):
+                request_id = payload[0]["id"]
+            else:
+                request_id = payload["id"]
+            future = asyncio.get_event_loop().create_future()
+            self._pending[request_id] = future
+            try:
+                await self.ws.send_str(data.decode('utf8'))
+                return await asyncio.wait_for(future, self.timeout)
+            finally:
+                self._pending.pop(request_id, None)
+        auth = None
+        if self.user is not None and self.password is not None:
+            auth = aiohttp.BasicAuth(self.user, self.password)
+        async with self.session.post(self.url, data=data, auth=auth,
+                                     timeout=aiohttp.ClientTimeout(total=self.timeout)) as response:
+            if response.status == 401:
+                raise UnauthorizedError
+            return await response.text()
+
+    async def _call(self, payload):
+        """Sends the payload and parses the reply without any retry"""
+        url = self.url
+        method = get_metric_method(payload)
+        data = jsoncodec.dumpb(payload)
+        start = time.time()
+        reply = None
+        try:
+            reply = await self._send(payload, data)
+            if not bool(reply):
+                raise RPCErrorDoRetry("Empty Reply")
+            ret = self._parse_reply(reply)
+        except Exception as e:
+            self.rpc_metrics.observe(url, method, time.time() - start, len(data), len(reply or ""), error=e)
+            raise
+        self.rpc_metrics.observe(url, method, time.time() - start, len(data), len(reply))
+        return ret
+
+    def metrics(self):
+        """Returns the metrics of all calls, see :func:`morphenepythonapi.metrics.RPCMetrics.snapshot`"""
+        return self.rpc_metrics.snapshot()
+
+    @staticmethod
+    def _parse_reply(reply):
+        try:
+            ret = jsoncodec.loads(reply)
+        except ValueError:
+            GrapheneRPC._check_for_server_error(reply)
+        if isinstance(ret, dict) and 'error' in ret:
+            if 'detail' in ret['error']:
+                raise RPCError(ret['error']['detail'])
+            else:
+                raise RPCError(ret['error']['message'])
+        elif isinstance(ret, list):
+            ret_list = []
+            for r in ret:
+                if isinstance(r, dict) and 'error' in r:
+                    if 'detail' in r['error']:
+                        raise RPCError(r['error']['detail'])
+                    else:
+                        raise RPCError(r['error']['message'])
+                elif isinstance(r, dict) and "result" in r:
+                    ret_list.append(r["result"])
+                else:
+                    ret_list.append(r)
+            return ret_list
+        elif isinstance(ret, dict) and "result" in ret:
+            return ret["result"]
+        elif isinstance(ret, int):
+            raise RPCError("Client returned invalid format. Expected JSON! Output: %s" % (str(ret)))
+        return ret
+
+    async def _retry_on_next_node(self, url, error_msg):
+        """Switches to the next node, unless another call already did so"""
+        if self.nodes.working_nodes_count < 2:
+            raise CallRetriesReached
+        if self.url != url:
+            return
+        self.nodes.increase_error_cnt()
+        self.nodes.sleep_and_check_retries(error_msg, sleep=False, call_retry=False)
+        await self.rpcconnect(failed_url=url)
+
+    async def rpcexec(self, payload):
+        """ Execute a call by sending the payload.
+
+            :param json payload: Payload data
+            :raises ValueError: if the server does not respond in proper JSON format
+            :raises RPCError: if the server returns an error
+            :raises DeadlineExceeded: if the call takes longer than the deadline of the retry policy
+        """
+        deadline = self.nodes.retry_policy.get_deadline(payload)
+        if deadline is None:
+            return await self._rpcexec(payload)
+        try:
+            return await asyncio.wait_for(self._rpcexec(payload), deadline)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("Deadline of %.1f s exceeded" % deadline)
+
+    async def _rpcexec(self, payload):
+        if self.url is None:
+            await self._ensure_connected()
+        cnt = 0
+        while True:
+            url = self.url
+            node = self.nodes.node
+            cnt += 1
+            if cnt > 1:
+                self.rpc_metrics.inc_retry(url, get_metric_method(payload))
+            start = time.time()
+            try:
+                ret = await self._call(payload)
+                self.nodes.record_call(latency=time.time() - start, node=node)
+                return ret
+            except KeyboardInterrupt:
+                raise
+            except RPCErrorDoRetry as e:
+                self.nodes.record_call(error=True, node=node)
+                msg = exceptions.decodeRPCErrorMsg(e).strip()
+                action = RETRY_CALL
+            except RPCError as e:
+                msg = exceptions.decodeRPCErrorMsg(e).strip()
+                action = classify_error_message(e)
+            except UnauthorizedError:
+                raise
+            except Exception as e:
+                # Connection errors and timeouts
+                self.nodes.record_call(error=True, node=node)
+                log.warning("Error: {}".format(str(e)))
+                if self.nodes.working_nodes_count > 1:
+                    await self._retry_on_next_node(url, str(e))
+                else:
+                    self.nodes.increase_error_cnt()
+                    self.nodes.sleep_and_check_retries(str(e), sleep=False, call_retry=False)
+                    await self.rpcconnect(next_url=False, failed_url=url)
+                continue
+            if action == SWITCH_NODE:
+                if self.nodes.working_nodes_count == 1:
+                    raise exceptions.UnhandledRPCError(msg)
+                await self._retry_on_next_node(url, msg)
+                cnt = 0
+            elif self.nodes.num_retries_call >= 0 and cnt > self.nodes.num_retries_call:
+                log.warning("Error: {}".format(msg))
+                await self._retry_on_next_node(url, msg)
+                cnt = 0
+            else:
+                log.warning("Retry RPC Call on node: %s (%d/%d) \n" % (url, cnt, self.nodes.num_retries_call))
+                await asyncio.sleep(self.nodes.retry_delay(cnt))
+
+    def __getattr__(self, name):
+        """Map all methods to RPC calls and pass through the arguments."""
+        if name.startswith("__"):
+            raise AttributeError(name)
+
+        async def method(*args, **kwargs):
+            api_name = get_api_name(*args, **kwargs)
+            count = 1
+            if len(args) > 0 and isinstance(args[0], list):
+                count = max(1, len(args[0]))
+            query = get_query(self.get_request_id(count), api_name, name, args)
+            return await self.rpcexec(query)
+        return method
+
+    async def get_account(self, name, **kwargs):
+        """ Get full account details from account name
+
+            :param str name: Account name
+        """
+        if isinstance(name, str):
+            return await self.get_accounts([name], **kwargs)
@@ -0,0 +1,96 @@
+"""Adaptive size of JSON-RPC batches."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from builtins import object
+import threading
+
+#: Response size in bytes which a batch should not exceed
+DEFAULT_MAX_RESPONSE_BYTES = 4 * 1024 * 1024
+
+
+class AdaptiveBatchSize(object):
+    """ Grows and shrinks the number of requests per batch from the observed
+        latency, response size and errors of the sent batches.
+
+        The latency and the response size per request are averaged over the last
+        batches. The next batch gets as many requests as fit into ``target_latency``
+        and ``max_response_bytes``, but at most ``growth`` times the current size.
+        A failed batch halves the size.
+
+        :param int max_size: Largest batch size
+        :param int min_size: Smallest batch size (default is 1)
+        :param int initial_size: Size of the first batch (default is
+            ``min(max_size, 50)``)
+        :param float target_latency: Time in seconds which a batch should take
+            (default is 1)
+        :param int max_response_bytes: Size in bytes which the reply to a batch
+            should not exceed, None for no limit (default is 4 MiB)
+        :param float growth: Maximum growth of the size after a batch (default is 2)
+        :param float alpha: Weight of the latest batch in the averages (default is 0.5)
+
+        .. code-block:: python
+
+            from morphenepythonapi.batchsize import AdaptiveBatchSize
+            batch_size = AdaptiveBatchSize(1000, target_latency=0.5)
+            with rpc.batch(max_batch_size=batch_size) as batch:
+                futures = [batch.get_block(n) for n in range(1, 10001)]
+
+        An instance can be shared by several threads.
+    """
+    def __init__(self, max_size, min_size=1, initial_size=None, target_latency=1.,
+                 max_response_bytes=DEFAULT_MAX_RESPONSE_BYTES, growth=2., alpha=0.5):
+        if max_size < 1 or min_size < 1 or min_size > max_size:
+            raise ValueError("The batch sizes must fulfil 1 <= min_size <= max_size")
+        self.max_size = max_size
+        self.min_size = min_size
+        self.target_latency = target_latency
+        self.max_response_bytes = max_response_bytes
+        self.growth = growth
+        self.alpha = alpha
+        if initial_size is None:
+            initial_size = min(max_size, 50)
+        self._size = self._clamp(initial_size)
+        self.latency_per_request = None
+        self.bytes_per_request = None
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def _clamp(self, size):
+        return int(max(self.min_size, min(self.max_size, size)))
+
+    @property
+    def size(self):
+        """Number of requests of the next batch"""
+        return self._size
+
+    def _average(self, average, value):
+        if average is None:
+            return value
+        return self.alpha * value + (1 - self.alpha) * average
+
+    def observe(self, count, latency, response_bytes=None, error=False):
+        """ Adapts the size to a sent batch
+
+            :param int count: Number of requests in the batch
+            :param float latency: Time in seconds until the reply was received
+            :param int response_bytes: Size of the reply in bytes, when known
+            :param bool error: True when the batch failed or requests are missing in its reply
+        """
+        if count < 1:
+            return
+        with self.lock:
+            if error:
+                self.errors += 1
+                self._size = self._clamp(min(self._size, count) // 2)
+                return
+            self.latency_per_request = self._average(self.latency_per_request, latency / count)
+            size = self._size * self.growth
+            if self.latency_per_request > 0:
+                size = min(size, self.target_latency / self.latency_per_request)
+            if response_bytes:
+                self.bytes_per_request = self._average(self.bytes_per_request, response_bytes / count)
+            if self.max_response_bytes is not None and self.bytes_per_request:
+                size = min(size, self.max_response_bytes / self.bytes_per_request)
+            self._size = self._clamp(size)
@@ -0,0 +1,225 @@
+"""Recording and replay of rpc traffic."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from builtins import object
+from collections import deque
+import gzip
+import threading
+import time
+import logging
+from . import jsoncodec
+from .version import version as morphenepythonapi_version
+
+log = logging.getLogger(__name__)
+
+#: Version of the cassette file format
+CASSETTE_VERSION = 1
+
+
+def get_request_key(payload):
+    """ Returns the key under which the reply to payload is stored on a cassette.
+        The request ids are not part of the key, so that a replayed workload finds
+        its replies even when it numbers its requests differently.
+
+        :param payload: A json-rpc query or a batch (list) of queries
+    """
+    if isinstance(payload, list):
+        return jsoncodec.dumps([[q.get("method"), q.get("params")] for q in payload], sort_keys=True)
+    return jsoncodec.dumps([payload.get("method"), payload.get("params")], sort_keys=True)
+
+
+def _get_ids(payload):
+    if isinstance(payload, list):
+        return [q.get("id") for q in payload]
+    return [payload.get("id")]
+
+
+def read_cassette(path):
+    """ Returns the header and a list of the recorded interactions of a cassette file.
+        A cassette whose recorder was not closed is read up to its last complete entry.
+
+        :param str path: Path of the cassette file
+    """
+    header = {}
+    interactions = []
+    with gzip.open(path, "rb") as f:
+        try:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                entry = jsoncodec.loads(line)
+                if "cassette" in entry:
+                    header = entry
+                else:
+                    interactions.append(entry)
+        except (EOFError, IOError, ValueError) as e:
+            log.warning("Cassette %s is truncated: %s" % (path, str(e)))
+    return header, interactions
+
+
+class CassetteRecorder(object):
+    """ Writes every request, its reply and the latency of the request to a gzip
+        compressed cassette file, one JSON object per line. It is thread safe.
+
+        :param str path: Path of the cassette file, an existing file is overwritten
+        :param int compresslevel: gzip compression level (default is 6)
+
+        .. code-block:: python
+
+            from morphenepythonapi.cassette import CassetteRecorder
+            from morphenepythonapi.morphenenoderpc import MorpheneNodeRPC
+            recorder = CassetteRecorder("history.cassette.gz")
+            rpc = MorpheneNodeRPC("https://morphene.io/rpc", record=recorder)
+            rpc.get_account_history("morphene", -1, 1000)
+            recorder.close()
+
+    """
+    def __init__(self, path, compresslevel=6):
+        self.path = path
+        self.count = 0
+        self._lock = threading.Lock()
+        self._start = time.time()
+        self._file = gzip.open(path, "wb", compresslevel=compresslevel)
+        self._write({"cassette": CASSETTE_VERSION, "morphenepythonapi": morphenepythonapi_version,
+                     "created": self._start})
+
+    def _write(self, entry):
+        self._file.write(jsoncodec.dumpb(entry) + b"\n")
+
+    def record(self, payload, reply, latency, url=None):
+        """ Appends an interaction to the cassette
+
+            :param payload: Decoded json-rpc query or batch
+            :param str reply: Reply text of the node
+            :param float latency: Duration of the request in seconds
+            :param str url: Node url
+        """
+        if isinstance(reply, bytes):
+            reply = reply.decode('utf8')
+        entry = {"request": payload, "reply": reply, "latency": latency, "url": url}
+        with self._lock:
+            if self._file is None:
+                return
+            entry["time"] = time.time() - self._start
+            self._write(entry)
+            self.count += 1
+
+    def close(self):
+        """Writes the remaining data and closes the file"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class CassettePlayer(object):
+    """ Answers requests with the replies of a cassette, instead of a node.
+
+        A request is matched by its method and parameters, its id is ignored and
+        the ids of the reply are set to the ids of the request. Identical requests
+        get their recorded replies in the recorded order, after that the last one
+        is repeated. A request which is not on the cassette is answered with a
+        json-rpc error. It is thread safe.
+
+        :param cassette: Path of a cassette file, or a list of interactions as
+            returned by :func:`read_cassette`
+        :param bool realtime: When True, each reply is delayed by the latency of the
+            recorded request, otherwise it is returned at once (default is False)
+
+        .. code-block:: python
+
+            from morphenepythonapi.morphenenoderpc import MorpheneNodeRPC
+            rpc = MorpheneNodeRPC("https://morphene.io/rpc", replay="history.cassette.gz")
+            rpc.get_account_history("morphene", -1, 1000)
+
+    """
+    def __init__(self, cassette, realtime=False):
+        if isinstance(cassette, list):
+            self.header, interactions = {}, cassette
+        else:
+            self.header, interactions = read_cassette(cassette)
+        self.realtime = realtime
+        self.played = 0
+        self.misses = 0
+        self.urls = []
+        self._replies = {}
+        self._last = {}
+        self._lock = threading.Lock()
+        for interaction in interactions:
+            key = get_request_key(interaction["request"])
+            self._replies.setdefault(key, deque()).append(interaction)
+            url = interaction.get("url")
+            if url and url not in self.urls:
+                self.urls.append(url)
+
+    def __len__(self):
+        """Returns the number of interactions which were not replayed yet"""
+        with self._lock:
+            return sum(len(replies) for replies in self._replies.values())
+
+    def send(self, data, url=None):
+        """ Returns the recorded reply text for an encoded request
+
+            :param bytes data: json-rpc query or batch, as sent to a node
+            :param str url: Node url, it is ignored
+        """
+        payload = jsoncodec.loads(data)
+        key = get_request_key(payload)
+        with self._lock:
+            replies = self._replies.get(key)
+            if replies:
+                interaction = replies.popleft()
+                self._last[key] = interaction
+            else:
+                interaction = self._last.get(key)
+            if interaction is None:
+                self.misses += 1
+            else:
+                self.played += 1
+        if interaction is None:
+            log.warning("Request not found on cassette: %s" % key)
+            return jsoncodec.dumps({"jsonrpc": "2.0", "id": _get_ids(payload)[0], "error": {
+                "code": -32603, "message": "Request not found on cassette: %s" % key}})
+        if self.realtime and interaction.get("latency"):
+            time.sleep(interaction["latency"])
+        return self._set_ids(interaction, payload)
+
+    @staticmethod
+    def _set_ids(interaction, payload):
+        """Returns the reply with the request ids of payload"""
+        reply = interaction["reply"]
+        ids = _get_ids(payload)
+        recorded_ids = _get_ids(interaction["request"])
+        if ids == recorded_ids:
+            return reply
+        try:
+            ret = jsoncodec.loads(reply)
+        except ValueError:
+            return reply
+        id_map = dict(zip(recorded_ids, ids))
+        for r in (ret if isinstance(ret, list) else [ret]):
+            if isinstance(r, dict) and r.get("id") in id_map:
+                r["id"] = id_map[r["id"]]
+        return jsoncodec.dumps(ret)
+
+
+def get_player(replay, realtime=False):
+    """Returns a CassettePlayer for a cassette path, or replay when it is a player already"""
+    if replay is None or isinstance(replay, CassettePlayer):
+        return replay
+    return CassettePlayer(replay, realtime=realtime)
+
+
+def get_recorder(record):
+    """Returns a CassetteRecorder for a cassette path, or record when it is a recorder already"""
+    if record is None or isinstance(record, CassetteRecorder):
+        return record
+    return CassetteRecorder(record)
@@ -60,6 +60,12 @@ class CallRetriesReached(Exception):
     pass
 
 
+class DeadlineExceeded(Exception):
+    """DeadlineExceeded Exception. The deadline of the retry policy was reached"""
+
+    pass
+
+
 class MissingRequiredActiveAuthority(RPCError):
     pass
 
@@ -7,29 +7,41 @@ from builtins import next
 from builtins import str
 from builtins import object
 from itertools import cycle
+import math
 import threading
 import sys
-import json
 import signal
 import logging
 import ssl
 import re
+import socket
 import time
 import warnings
 import six
 from .exceptions import (
-    UnauthorizedError, RPCConnection, RPCError, RPCErrorDoRetry, NumRetriesReached, CallRetriesReached, WorkingNodeMissing, TimeoutException
+    UnauthorizedError, RPCConnection, RPCError, RPCErrorDoRetry, NumRetriesReached, CallRetriesReached, WorkingNodeMissing, TimeoutException,
+    DeadlineExceeded
 )
 from .rpcutils import (
-    get_api_name, get_query
+    get_api_name, get_query, get_method_name
 )
 from .node import Nodes
+from .rpcbatch import RPCBatch
+from .ratelimit import get_rate_limiter, parse_retry_after
+from .singleflight import SingleFlight
+from .metrics import RPCMetrics, get_metric_method, start_metrics_server
+from .cassette import get_player, get_recorder
+from .handshakecache import get_handshake_cache, DEFAULT_TTL
+from .priority import PriorityLanes, CRITICAL, DEFAULT_CAPACITY, DEFAULT_BULK_SHARE
+from . import jsoncodec
 from morphenepythongraphenebase.version import version as morphenepython_version
 from morphenepythongraphenebase.chains import known_chains
 if sys.version_info[0] < 3:
     from thread import interrupt_main
+    from Queue import Queue, Empty
 else:
     from _thread import interrupt_main
+    from queue import Queue, Empty
 WEBSOCKET_MODULE = None
 if not WEBSOCKET_MODULE:
     try:
@@ -45,12 +57,28 @@ if not REQUEST_MODULE:
         from requests.adapters import HTTPAdapter
         from requests.packages.urllib3.util.retry import Retry
         from requests.exceptions import ConnectionError
+        from requests.packages.urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
         REQUEST_MODULE = "requests"
     except ImportError:
         REQUEST_MODULE = None
 
 log = logging.getLogger(__name__)
 
+#: Read-only calls which may be sent to a second node by hedging
+HEDGE_METHODS = [
+    "get_config", "get_dynamic_global_properties", "get_hardfork_properties",
+    "get_chain_properties", "get_witness_schedule", "get_block", "get_block_header",
+    "get_ops_in_block", "get_accounts", "get_account_history", "get_witness_by_account",
+    "get_active_witnesses", "get_witness_count", "get_transaction", "get_version",
+]
+
+#: Frequently repeated read calls, which are coalesced by default
+COALESCE_METHODS = [
+    "get_config", "get_dynamic_global_properties", "get_chain_properties", "get_hardfork_properties",
+    "get_witness_schedule", "get_next_scheduled_hardfork", "get_feed_history",
+    "get_current_median_history_price", "get_reserve_ratio", "get_version",
+]
+
 
 class SessionInstance(object):
     """Singelton for the Session Instance"""
@@ -71,6 +99,91 @@ def shared_session_instance():
     return SessionInstance.instance
 
 
+def create_session_instance(pool_size, pool_connections=10):
+    """ Returns a new session, which keeps up to pool_size connections to each node.
+        When all connections to a node are in use, further requests wait for a free one.
+
+        :param int pool_size: Maximum number of connections per node
+        :param int pool_connections: Number of nodes for which connections are kept
+    """
+    if REQUEST_MODULE is None:
+        raise Exception()
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_size, pool_block=True)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+if REQUEST_MODULE is not None:
+    class CancellableHTTPAdapter(HTTPAdapter):
+        """ HTTP adapter, whose requests in flight can be aborted from another thread.
+            A request is tracked by the token, which its thread has set with :func:`bind`.
+            :func:`cancel` shuts down the socket of its connection, so that the request
+            fails at once and the connection is not reused.
+        """
+        def __init__(self, *args, **kwargs):
+            self._state = threading.local()
+            self._in_flight = {}
+            self._in_flight_lock = threading.Lock()
+            super(CancellableHTTPAdapter, self).__init__(*args, **kwargs)
+
+        def init_poolmanager(self, *args, **kwargs):
+            super(CancellableHTTPAdapter, self).init_poolmanager(*args, **kwargs)
+            self.poolmanager.pool_classes_by_scheme = {
+                "http": self._get_pool_class(HTTPConnectionPool),
+                "https": self._get_pool_class(HTTPSConnectionPool)}
+
+        def _get_pool_class(self, base):
+            adapter = self
+
+            class TrackedConnectionPool(base):
+                def _get_conn(self, timeout=None):
+                    conn = base._get_conn(self, timeout=timeout)
+                    token = getattr(adapter._state, "token", None)
+                    if token is not None:
+                        with adapter._in_flight_lock:
+                            adapter._in_flight[token] = conn
+                    return conn
+
+                def _put_conn(self, conn):
+                    # The request is complete, a later cancel must not reach the next user of conn
+                    with adapter._in_flight_lock:
+                        for token in [t for t, c in adapter._in_flight.items() if c is conn]:
+                            del adapter._in_flight[token]
+                    base._put_conn(self, conn)
+            return TrackedConnectionPool
+
+        def bind(self, token=None):
+            """ Tracks the following requests of the current thread under token,
+                None ends the tracking
+
+                :param token: Hashable token, e.g. ``object()``
+            """
+            previous = getattr(self._state, "token", None)
+            if previous is not None:
+                with self._in_flight_lock:
+                    self._in_flight.pop(previous, None)
+            self._state.token = token
+
+        def cancel(self, token):
+            """ Aborts the request in flight, which is tracked under token. Nothing
+            happens, when its connection was already returned to the pool.
+
+                :param token: Token of the request, see :func:`bind`
+            """
+            # The lock keeps the connection from going back to the pool before it is shut down
+            with self._in_flight_lock:
+                conn = self._in_flight.pop(token, None)
+                sock = getattr(conn, "sock", None)
+                if sock is None:
+                    return
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except (OSError, socket.error):
+                    pass
+
+
 def create_ws_instance(use_ssl=True, enable_multithread=True):
     """Get websocket instance"""
     if WEBSOCKET_MODULE is None:
@@ -83,6 +196,150 @@ def create_ws_instance(use_ssl=True, enable_multithread=True):
         return websocket.WebSocket(enable_multithread=enable_multithread)
 
 
+class _PendingReply(object):
+    """Reply slot of a single websocket request"""
+    def __init__(self):
+        self.event = threading.Event()
+        self.reply = None
+        self.data = None
+        self.error = None
+
+
+class MultiplexedWebsocket(object):
+    """ Shares one connected websocket between many threads
+
+        :param websocket.WebSocket ws: Connected websocket
+        :param int timeout: Time in seconds to wait for a reply (default is 60)
+
+        A reader thread receives all replies and hands each one to the
+        request with the same JSON-RPC id, so any number of requests can
+        be in flight on the same connection at the same time. When the
+        connection breaks, all waiting requests raise
+        ``WebSocketConnectionClosedException``. A reply which is no valid JSON
+        or has no id can not be matched, all waiting requests raise ``RPCError``
+        and the connection stays open.
+    """
+    def __init__(self, ws, timeout=60):
+        self.ws = ws
+        self.timeout = timeout
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.closed = False
+        # The reader waits for replies without a timeout, calls time out on their own
+        self.ws.settimeout(None)
+        self.reader = threading.Thread(target=self._read_loop, name="ws-reader")
+        self.reader.daemon = True
+        self.reader.start()
+
+    @staticmethod
+    def _get_request_ids(data):
+        if isinstance(data, dict):
+            return [data.get("id")]
+        elif isinstance(data, list):
+            return [r.get("id") for r in data if isinstance(r, dict)]
+        return []
+
+    def _read_loop(self):
+        while True:
+            try:
+                reply = self.ws.recv()
+            except Exception as e:
+                self._fail_pending(e)
+                return
+            if not reply:
+                if not self.ws.connected:
+                    self._fail_pending(WebSocketConnectionClosedException("Connection is already closed."))
+                    return
+                continue
+            try:
+                data = jsoncodec.loads(reply)
+            except ValueError:
+                data = None
+            request_ids = [i for i in self._get_request_ids(data) if i is not None]
+            if not request_ids:
+                # The reply can not be matched to its request, so none of the waiting requests
+                # gets an answer
+                if data is None:
+                    error = RPCError("Received an invalid reply: %s" % reply[:100])
+                else:
+                    error = RPCError("Received a reply without id: %s" % reply[:100])
+                self._fail_pending(error, close=False)
+                continue
+            with self.lock:
+                for request_id in request_ids:
+                    pending = self.pending.pop(request_id, None)
+                    if pending is not None:
+                        pending.reply = reply
+                        pending.data = data
+                        pending.event.set()
+                        break
+                else:
+                    log.warning("Received a reply without waiting request: %s" % reply[:100])
+
+    def _fail_pending(self, error, close=True):
+        """ Hands the error to all waiting requests
+
+            :param Exception error: Error which the requests raise
+            :param bool close: When True, the connection is marked as closed and the
+                error is raised as ``WebSocketConnectionClosedException`` (default is True)
+        """
+        if close and not isinstance(error, WebSocketConnectionClosedException):
+            error = WebSocketConnectionClosedException(str(error))
+        with self.lock:
+            if close:
+                self.closed = True
+            pending_list = list(self.pending.values())
+            self.pending = {}
+        for pending in pending_list:
+            pending.error = error
+            pending.event.set()
+
+    def send(self, payload, request_id, parsed=False, timeout=None):
+        """ Sends the payload and waits for the reply with the same id
+
+            :param bytes payload: Encoded JSON-RPC request
+            :param int request_id: id of the request (of the first request for batches)
+            :param bool parsed: When True, the reply is returned together with its
+                decoded JSON, as the reader has decoded it already (default is False)
+            :param float timeout: Seconds to wait for the reply (default is the timeout of the connection)
+        """
+        if timeout is None:
+            timeout = self.timeout
+        pending = _PendingReply()
+        with self.lock:
+            if self.closed:
+                raise WebSocketConnectionClosedException("Connection is already closed.")
+            self.pending[request_id] = pending
+        try:
+            self.ws.send(payload)
+        except Exception:
+            with self.lock:
+                self.pending.pop(request_id, None)
+            raise
+        if not pending.event.wait(timeout):
+            with self.lock:
+                self.pending.pop(request_id, None)
+            raise WebSocketTimeoutException("No reply received within %.1f s" % timeout)
+        if pending.error is not None:
+            raise pending.error
+        if parsed:
+            return pending.reply, pending.data
+        return pending.reply
+
+    def close(self):
+        """Closes the websocket and waits for the reader thread to stop"""
+        with self.lock:
+            self.closed = True
+        try:
+            self.ws.abort()
+            self.ws.close()
+        except Exception as e:
+            log.debug(str(e))
+        if self.reader is not threading.current_thread():
+            self.reader.join(self.timeout)
+        self._fail_pending(WebSocketConnectionClosedException("Connection is already closed."))
+
+
 class GrapheneRPC(object):
     """
     This class allows to call API methods synchronously, without callbacks.
@@ -96,7 +353,60 @@ class GrapheneRPC(object):
     :param int num_retries_call: Repeat num_retries_call times a rpc call on node error (default is 5)
     :param int timeout: Timeout setting for https nodes (default is 60)
     :param bool autoconnect: When set to false, connection is performed on the first rpc call (default is True)
+    :param handshake_cache: Persists the ``get_config`` reply of every node, so that the connect
+        of a new client skips the handshake round trip. True for the default file in the user
+        cache directory, a file path or a :class:`morphenepythonapi.handshakecache.HandshakeCache`
+        (default is None, which does the handshake on every connect)
+    :param float handshake_ttl: Seconds for which a cached handshake is used (default is 3600)
     :param dict custom_chains: custom chain which should be added to the known chains
+    :param str node_policy: Node selection policy, can be ``round_robin`` (default),
+        ``lowest_latency``, ``weighted_random`` or ``power_of_two``, see :class:`morphenepythonapi.node.Nodes`
+    :param dict node_stats: Node statistics of a previous run, from ``rpc.nodes.export_stats()``
+    :param bool hedge: When True, calls of ``hedge_methods`` to a http node, which are not answered
+        within ``hedge_delay``, are sent to a second node as well. The first answer is used (default is False)
+    :param list hedge_methods: Names of the methods which may be hedged, only idempotent calls
+        should be added (default is ``HEDGE_METHODS``)
+    :param float hedge_delay: Delay in seconds before the call is sent to the second node. When None,
+        the 95th latency percentile of the current node is used (default is None)
+    :param coalesce: Identical calls from several threads at the same time share a single request,
+        for the methods of ``COALESCE_METHODS`` when True, for the given method names when a list,
+        or for no method when False. Only calls with the same ``num_retries_call`` and priority, and
+        which are not made within another call, share a request. Broadcasts are never coalesced
+        (default is True)
+    :param dict cache_ttl: Seconds for which the result of a method is reused, by method name,
+        e.g. ``{"get_dynamic_global_properties": 0.5}``. These methods are coalesced as well
+        (default is no caching)
+    :param bool rate_limit: When True, the requests to every node are limited by a token bucket,
+        which is shared by all clients of the process. Its rate is lowered on 429 and 503 replies
+        and raised on success, see :class:`morphenepythonapi.ratelimit.AdaptiveRateLimiter`
+        (default is False)
+    :param int pool_size: When set, the client uses its own pool of up to pool_size keep-alive
+        connections per http node, further requests wait for a free connection. Otherwise the
+        session of :func:`shared_session_instance` is used (default is None)
+    :param RPCMetrics metrics: Collects the metrics of all calls, can be shared by several
+        clients (default is a new :class:`morphenepythonapi.metrics.RPCMetrics`)
+    :param list critical_nodes: Urls of nodes which are reserved for critical calls
+        (broadcasts and ``verify_authority``, or calls within ``with rpc.priority("critical")``).
+        They are sent by a second client with its own connections (default is None,
+        which sends them to the current node)
+    :param int critical_pool_size: Number of http connections per node which are reserved
+        for critical calls, None to use the connections of all calls (default is 2)
+    :param float bulk_share: Share of ``pool_size`` (or of the 10 connections of the shared
+        session, without pool_size) which bulk calls may use at the same time, None for no limit.
+        The limit grows with the pool, see :func:`ensure_bulk_requests` (default is 0.5)
+    :param RetryPolicy retry_policy: Exponential backoff with jitter between retries and the
+        deadline of a call, by method. A call raises :class:`morphenepythonapi.exceptions.DeadlineExceeded`
+        when its retries, node switches and reconnects take longer than the deadline, and no
+        request waits longer than the remaining time (default is a
+        :class:`morphenepythonapi.retry.RetryPolicy` without deadline)
+    :param record: Path of a cassette file or a :class:`morphenepythonapi.cassette.CassetteRecorder`,
+        to which every request is written together with its reply and latency. The file is
+        complete after :func:`stop_recording` (default is None)
+    :param replay: Path of a cassette file or a :class:`morphenepythonapi.cassette.CassettePlayer`.
+        When set, all requests are answered from the cassette and no node is contacted.
+        When no urls are given, the recorded ones are used (default is None)
+    :param bool replay_realtime: When True, replayed replies are delayed by their recorded
+        latency, otherwise they are returned at once (default is False)
 
     Available APIs:
 
@@ -119,10 +429,24 @@ class GrapheneRPC(object):
               websocket. If you want to use the notification
               subsystem, please use ``GrapheneWebsocket`` instead.
 
+    .. note:: Calls belong to one of three priority classes, see :mod:`morphenepythonapi.priority`.
+              ``critical`` calls use reserved connections and, with ``critical_nodes``,
+              reserved nodes. ``bulk`` calls, e.g. of ``Blockchain.blocks()``, only use
+              a share of the connections, so that other calls do not queue behind them.
+              The priority of the calls of a thread is set by :func:`priority`.
+
+    .. note:: A single instance can be shared by many threads. The state of a call
+              (retry counts, the ``num_retries_call`` override) is kept per thread,
+              request ids are reserved atomically, calls to a websocket node share
+              one multiplexed connection, and only one thread at a time switches
+              to another node. Use ``pool_size`` to bound the number of http
+              connections per node.
+
     """
 
     def __init__(self, urls, user=None, password=None, **kwargs):
         """Init."""
+        self._call_state = threading.local()
         self.rpc_methods = {'offline': -1, 'ws': 0, 'jsonrpc': 1}
         self.current_rpc = self.rpc_methods["ws"]
         self._request_id = 0
@@ -137,19 +461,71 @@ class GrapheneRPC(object):
                 if c not in self.known_chains:
                     self.known_chains[c] = custom_chain[c]
 
-        self.nodes = Nodes(urls, num_retries, num_retries_call)
+        self.cassette_recorder = get_recorder(kwargs.get("record", None))
+        self.cassette_player = get_player(kwargs.get("replay", None), realtime=kwargs.get("replay_realtime", False))
+        if self.cassette_player is not None and not urls:
+            urls = self.cassette_player.urls
+        self.handshake_cache = None
+        if self.cassette_player is None:
+            self.handshake_cache = get_handshake_cache(kwargs.get("handshake_cache", None),
+                                                       ttl=kwargs.get("handshake_ttl", DEFAULT_TTL))
+        self._handshakes = {}
+
+        self.nodes = Nodes(urls, num_retries, num_retries_call,
+                           policy=kwargs.get("node_policy", "round_robin"),
+                           stats=kwargs.get("node_stats", None),
+                           retry_policy=kwargs.get("retry_policy", None))
         if self.nodes.working_nodes_count == 0:
             self.current_rpc = self.rpc_methods["offline"]
+        self.nodes.probe = self.probe_node
+
+        self.hedge = kwargs.get("hedge", False)
+        self.hedge_methods = set(kwargs.get("hedge_methods", HEDGE_METHODS))
+        self.hedge_delay = kwargs.get("hedge_delay", None)
+        self.rate_limit = kwargs.get("rate_limit", False)
+        self.single_flight = SingleFlight(cache_ttl=kwargs.get("cache_ttl", None))
+        self.coalesce = kwargs.get("coalesce", True)
+        self.rpc_metrics = kwargs.get("metrics", None) or RPCMetrics()
 
         self.user = user
         self.password = password
         self.ws = None
+        self.ws_transport = None
         self.url = None
         self.session = None
-        self.rpc_queue = []
+        self.pool_size = kwargs.get("pool_size", None)
+        self._pool_session = None
+        self.critical_nodes = kwargs.get("critical_nodes", None)
+        self.critical_pool_size = kwargs.get("critical_pool_size", 2)
+        self._critical_session = None
+        self._hedge_session = None
+        self._hedge_adapter = None
+        self._critical_rpc = None
+        self._critical_kwargs = {
+            "num_retries": num_retries, "num_retries_call": num_retries_call, "timeout": self.timeout,
+            "custom_chains": custom_chain, "disable_chain_detection": self.disable_chain_detection,
+            "retry_policy": self.nodes.retry_policy, "metrics": self.rpc_metrics,
+            "handshake_cache": self.handshake_cache,
+            "pool_size": self.critical_pool_size, "critical_pool_size": None, "bulk_share": None,
+            "coalesce": False}
+        self.bulk_share = kwargs.get("bulk_share", DEFAULT_BULK_SHARE)
+        self.lanes = PriorityLanes(max_bulk_requests=self._get_max_bulk_requests())
+        self._request_id_lock = threading.Lock()
+        self._connect_lock = threading.RLock()
         if kwargs.get("autoconnect", True):
             self.rpcconnect()
 
+    @property
+    def coalesce(self):
+        """Names of the methods, whose identical calls at the same time share a request"""
+        return self.coalesce_methods
+
+    @coalesce.setter
+    def coalesce(self, coalesce):
+        if coalesce is True:
+            coalesce = COALESCE_METHODS
+        self.coalesce_methods = set(coalesce or []) | set(self.single_flight.cache_ttl)
+
     @property
     def num_retries(self):
         return self.nodes.num_retries
@@ -166,30 +542,160 @@ class GrapheneRPC(object):
     def error_cnt(self):
         return self.nodes.error_cnt
 
-    def get_request_id(self):
-        """Get request id."""
-        self._request_id += 1
-        return self._request_id
+    @property
+    def last_reply_bytes(self):
+        """Size in bytes of the last reply which the current thread received, or None"""
+        return getattr(self._call_state, "reply_bytes", None)
 
-    def next(self):
-        """Switches to the next node url"""
-        if self.ws:
-            try:
-                self.rpcclose()
-            except Exception as e:
-                log.warning(str(e))
-        self.rpcconnect()
+    def _get_max_bulk_requests(self):
+        """Returns the number of bulk requests in flight, which bulk_share allows for the pool"""
+        if self.bulk_share is None:
+            return None
+        return max(1, int(self.bulk_share * (self.pool_size or DEFAULT_CAPACITY)))
+
+    def get_request_id(self, count=1):
+        """Reserves count consecutive request ids and returns the first one."""
+        with self._request_id_lock:
+            request_id = self._request_id + 1
+            self._request_id += count
+        return request_id
+
+    def get_session(self, priority=None):
+        """ Returns the http session, see ``pool_size``
+
+            :param str priority: Critical calls get the session with the reserved
+                connections, see ``critical_pool_size``
+        """
+        if priority == CRITICAL and self.critical_pool_size:
+            with self._connect_lock:
+                if self._critical_session is None:
+                    self._critical_session = create_session_instance(self.critical_pool_size,
+                                                                     pool_connections=max(10, len(self.nodes)))
+                return self._critical_session
+        if self.pool_size is None:
+            return shared_session_instance()
+        with self._connect_lock:
+            if self._pool_session is None:
+                self._pool_session = create_session_instance(self.pool_size,
+                                                             pool_connections=max(10, len(self.nodes)))
+            return self._pool_session
+
+    def ensure_pool_size(self, pool_size):
+        """ Makes sure that the client has its own pool of at least pool_size
+            http connections per node, e.g. before it is shared by pool_size threads.
+            A smaller pool is replaced, requests in flight finish on the old one.
+
+            :param int pool_size: Minimum number of connections per node
+        """
+        with self._connect_lock:
+            if self.pool_size is not None and self.pool_size >= pool_size:
+                return
+            self.pool_size = pool_size
+            self._pool_session = None
+            if self.session is not None:
+                # request_send uses self.session, which is otherwise only replaced on reconnect
+                self.session = self.get_session()
+            self.lanes.set_max_bulk_requests(self._get_max_bulk_requests())
+
+    def ensure_bulk_requests(self, bulk_requests):
+        """ Enlarges the pool, so that bulk_requests bulk calls can be in flight at the
+            same time within ``bulk_share``, e.g. before the client is shared by
+            bulk_requests threads which scan blocks
+
+            :param int bulk_requests: Number of bulk calls at the same time
+        """
+        pool_size = bulk_requests
+        if self.bulk_share is not None:
+            pool_size = int(math.ceil(bulk_requests / self.bulk_share))
+        self.ensure_pool_size(pool_size)
+
+    def priority(self, priority):
+        """ Returns a context manager, within which the calls of the current
+            thread have the given priority
 
-    def rpcconnect(self, next_url=True):
-        """Connect to next url in a loop."""
+            :param str priority: ``critical``, ``normal`` or ``bulk``
+
+            .. code-block:: python
+
+                with rpc.priority("bulk"):
+                    blocks = [rpc.get_block(n) for n in range(1, 1001)]
+
+        """
+        return self.lanes.use(priority)
+
+    def get_critical_rpc(self):
+        """Returns the client which sends the critical calls to ``critical_nodes``"""
+        with self._connect_lock:
+            if self._critical_rpc is None:
+                self._critical_rpc = self.__class__(self.critical_nodes, self.user, self.password,
+                                                    **self._critical_kwargs)
+            return self._critical_rpc
+
+    def next(self, failed_url=None):
+        """ Switches to the next node url
+
+            :param str failed_url: Only switch when the current node is still failed_url,
+                as another thread may have switched the node already
+        """
+        with self._connect_lock:
+            if failed_url is not None and self.url != failed_url:
+                return
+            if self.ws:
+                try:
+                    self.rpcclose()
+                except Exception as e:
+                    log.warning(str(e))
+            self.rpcconnect()
+
+    def rpcconnect(self, next_url=True, failed_url=None):
+        """ Connect to next url in a loop.
+
+            :param bool next_url: Switch to the next node, otherwise reconnect to the current one
+            :param str failed_url: Only (re)connect when the current node is still failed_url,
+                as another thread may have switched the node already
+        """
         if self.nodes.working_nodes_count == 0:
             return
+        with self._connect_lock:
+            if failed_url is not None and self.url != failed_url:
+                return
+            self._rpcconnect(next_url=next_url)
+
+    def _ensure_connected(self):
+        """Connects to the first node, when the client was created with ``autoconnect=False``"""
+        if self.url is not None:
+            return
+        if self.nodes.working_nodes_count > 0:
+            with self._connect_lock:
+                if self.url is None:
+                    self._rpcconnect()
+        if self.url is None:
+            raise RPCConnection("RPC is not connected!")
+
+    def _get_handshake(self, url, key="config"):
+        """Returns the config (or other property) of the last handshake with the node, or None"""
+        value = self._handshakes.get(url, {}).get(key)
+        if value is None and self.handshake_cache is not None:
+            value = self.handshake_cache.get(url, key=key)
+            if value is not None:
+                self._handshakes.setdefault(url, {})[key] = value
+        return value
+
+    def _set_handshake(self, url, value, key="config"):
+        self._handshakes.setdefault(url, {})[key] = value
+        if self.handshake_cache is not None:
+            self.handshake_cache.set(url, value, key=key)
+
+    def _rpcconnect(self, next_url=True):
         while True:
             if next_url:
-                self.url = next(self.nodes)
+                self._switch_url(next(self.nodes))
                 self.nodes.reset_error_cnt_call()
                 log.debug("Trying to connect to node %s" % self.url)
-                if self.url[:3] == "wss":
+                if self.cassette_player is not None:
+                    self.ws = None
+                    self.current_rpc = self.rpc_methods["jsonrpc"]
+                elif self.url[:3] == "wss":
                     self.ws = create_ws_instance(use_ssl=True)
                     self.ws.settimeout(self.timeout)
                     self.current_rpc = self.rpc_methods["ws"]
@@ -199,30 +705,74 @@ class GrapheneRPC(object):
                     self.current_rpc = self.rpc_methods["ws"]
                 else:
                     self.ws = None
-                    self.session = shared_session_instance()
+                    self.session = self.get_session()
                     self.current_rpc = self.rpc_methods["jsonrpc"]
                     self.headers = {'User-Agent': 'morphenepython v%s' % (morphenepython_version),
                                     'content-type': 'application/json'}
             try:
                 if self.ws:
+                    if self.ws_transport is not None:
+                        self.ws_transport.close()
+                        self.ws_transport = None
                     self.ws.connect(self.url)
+                    self.ws_transport = MultiplexedWebsocket(self.ws, timeout=self.timeout)
                     self.rpclogin(self.user, self.password)
+                cached_props = None
+                if self.handshake_cache is not None:
+                    cached_props = self.handshake_cache.get(self.url)
+                if cached_props is not None:
+                    # The node answered get_config within the ttl, the first call checks it
+                    self._handshakes.setdefault(self.url, {})["config"] = cached_props
+                    break
                 try:
                     props = None
-                    props = self.get_config(api="database")
+                    # Not coalesced with the calls of other threads, which may wait for this connect
+                    props = self.rpcexec(get_query(self.get_request_id(), "database_api", "get_config", []))
+                except DeadlineExceeded:
+                    raise
                 except Exception as e:
                     print(e)
                 if props is None:
                     raise RPCError("Could not receive answer for get_config")
+                self._set_handshake(self.url, props)
                 break
-            except KeyboardInterrupt:
+            except (KeyboardInterrupt, DeadlineExceeded):
                 raise
             except Exception as e:
+                self.nodes.record_call(error=True)
                 self.nodes.increase_error_cnt()
                 do_sleep = not next_url or (next_url and self.nodes.working_nodes_count == 1)
                 self.nodes.sleep_and_check_retries(str(e), sleep=do_sleep)
                 next_url = True
 
+    def probe_node(self, url):
+        """ Sends a get_config call to the node, without retries. Returns True
+            when the node answers. It is used by the node circuit breaker to find out,
+            if a failing node works again.
+
+            :param str url: Node url
+        """
+        query = get_query(self.get_request_id(), "database_api", "get_config", [])
+        payload = jsoncodec.dumpb(query)
+        if self.cassette_player is not None:
+            reply = self.cassette_player.send(payload, url=url)
+        elif url[:2] == "ws":
+            ws = create_ws_instance(use_ssl=url[:3] == "wss")
+            ws.settimeout(self.timeout)
+            try:
+                ws.connect(url)
+                ws.send(payload)
+                reply = ws.recv()
+            finally:
+                ws.close()
+        else:
+            headers = {'User-Agent': 'morphenepython v%s' % (morphenepython_version),
+                       'content-type': 'application/json'}
+            response = shared_session_instance().post(url, data=payload, headers=headers, timeout=self.timeout)
+            reply = response.text
+        ret = jsoncodec.loads(reply)
+        return isinstance(ret, dict) and ret.get("result") is not None
+
     def rpclogin(self, user, password):
         """Login into Websocket"""
         if self.ws and self.current_rpc == self.rpc_methods['ws'] and user and password:
@@ -232,42 +782,256 @@ class GrapheneRPC(object):
         """Close Websocket"""
         if self.ws is None:
             return
+        if self.ws_transport is not None:
+            self.ws_transport.close()
+            self.ws_transport = None
+            return
         # if self.ws.connected:
         self.ws.close()
 
-    def request_send(self, payload):
+    def get_rate_limit(self, url=None):
+        """Returns the allowed requests per second to the node (default is the current one), or None without rate limit"""
+        if not self.rate_limit:
+            return None
+        return get_rate_limiter(url or self.url).rate
+
+    def metrics(self):
+        """ Returns the request counts, latency histograms, transferred bytes, retries,
+            node switches and errors by node url and api method,
+            see :func:`morphenepythonapi.metrics.RPCMetrics.snapshot`
+        """
+        return self.rpc_metrics.snapshot()
+
+    def metrics_prometheus(self):
+        """Returns the metrics in the Prometheus text exposition format"""
+        return self.rpc_metrics.to_prometheus()
+
+    def start_metrics_server(self, port=9100, host="127.0.0.1"):
+        """ Serves the metrics for Prometheus on ``http://host:port/metrics`` from a
+            background thread and returns the server, which is stopped by ``shutdown()``.
+        """
+        return start_metrics_server(self.rpc_metrics, port=port, host=host)
+
+    def stop_recording(self):
+        """Closes the cassette file of ``record``, later requests are not recorded"""
+        if self.cassette_recorder is not None:
+            self.cassette_recorder.close()
+            self.cassette_recorder = None
+
+    def request_send(self, payload, url=None):
+        if url is None:
+            url = self.url
+        if self.cassette_player is not None:
+            return self.cassette_player.send(payload, url=url)
+        session = self.session
+        if self.lanes.priority == CRITICAL:
+            session = self.get_session(CRITICAL)
+        if getattr(self._call_state, "hedged", False):
+            # Created by hedged_request_send, before its threads start
+            session = self._hedge_session
+        limiter = None
+        if self.rate_limit:
+            limiter = get_rate_limiter(url)
+            limiter.acquire()
         if self.user is not None and self.password is not None:
-            response = self.session.post(self.url,
-                                         data=payload,
-                                         headers=self.headers,
-                                         timeout=self.timeout,
-                                         auth=(self.user, self.password))
+            response = session.post(url,
+                                    data=payload,
+                                    headers=self.headers,
+                                    timeout=self.nodes.get_timeout(self.timeout),
+                                    auth=(self.user, self.password))
         else:
-            response = self.session.post(self.url,
-                                         data=payload,
-                                         headers=self.headers,
-                                         timeout=self.timeout)
+            response = session.post(url,
+                                    data=payload,
+                                    headers=self.headers,
+                                    timeout=self.nodes.get_timeout(self.timeout))
         if response.status_code == 401:
             raise UnauthorizedError
+        if limiter is not None:
+            if response.status_code in [429, 503]:
+                limiter.decrease(parse_retry_after(response.headers.get("Retry-After")))
+            elif response.status_code < 400:
+                limiter.increase()
         return response.text
 
-    def ws_send(self, payload):
+    def _is_hedged(self, payload):
+        """Returns True when the payload may be sent to a second node"""
+        if not self.hedge or self.current_rpc != self.rpc_methods['jsonrpc'] or self.cassette_player is not None:
+            return False
+        if self.nodes.freeze_current_node or self.nodes.working_nodes_count < 2:
+            return False
+        queries = payload if isinstance(payload, list) else [payload]
+        return all(get_method_name(query) in self.hedge_methods for query in queries)
+
+    def get_hedge_delay(self):
+        """Returns the time in seconds after which a hedged call is sent to a second node"""
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        delay = self.nodes.latency_percentile(95)
+        if delay is None:
+            return 1.
+        return delay
+
+    def get_hedge_session(self):
+        """ Returns the http session of hedged calls, whose requests can be cancelled,
+            see :class:`CancellableHTTPAdapter`
+        """
+        with self._connect_lock:
+            if self._hedge_session is None:
+                self._hedge_adapter = CancellableHTTPAdapter(pool_connections=max(10, len(self.nodes)),
+                                                             pool_maxsize=self.pool_size or 10,
+                                                             pool_block=self.pool_size is not None)
+                self._hedge_session = requests.Session()
+                self._hedge_session.mount("http://", self._hedge_adapter)
+                self._hedge_session.mount("https://", self._hedge_adapter)
+            return self._hedge_session
+
+    def hedged_request_send(self, payload):
+        """ Sends the payload to the current node and, when there is no answer after
+            :func:`get_hedge_delay`, also to a second node. The first valid answer is
+            returned and the slower request is cancelled, which closes its connection.
+            Both requests keep the deadline and the priority of the calling thread.
+        """
+        replies = Queue()
+        self._call_state.hedge_winner = None
+        deadline = self.nodes.deadline
+        priority = self.lanes.priority
+        tokens = {}
+        self.get_hedge_session()
+
+        def send(url, node, token):
+            self.nodes.join_call(deadline)
+            self._call_state.hedged = True
+            self._hedge_adapter.bind(token)
+            start = time.time()
+            try:
+                with self.lanes.use(priority):
+                    reply = self.request_send(payload, url=url)
+                replies.put((node, reply, None, time.time() - start))
+            except Exception as e:
+                replies.put((node, None, e, time.time() - start))
+            finally:
+                self._hedge_adapter.bind(None)
+                self._call_state.hedged = False
+                self.nodes.end_call()
+
+        def start_request(node):
+            tokens[node.url] = object()
+            thread = threading.Thread(target=send, args=(node.url, node, tokens[node.url]), name="rpc-hedge")
+            thread.daemon = True
+            thread.start()
+
+        def cancel_other(winner):
+            for url, token in tokens.items():
+                if url != winner.url:
+                    self._hedge_adapter.cancel(token)
+
+        start_request(self.nodes.node)
+        try:
+            node, reply, error, latency = replies.get(timeout=self.get_hedge_delay())
+        except Empty:
+            node = None
+        if node is not None:
+            if error is not None:
+                raise error
+            self._call_state.hedge_winner = (node, latency)
+            return reply
+        second_node = self.nodes.alternative()
+        if second_node is None:
+            node, reply, error, latency = replies.get()
+            if error is not None:
+                raise error
+            self._call_state.hedge_winner = (node, latency)
+            return reply
+        log.debug("Hedging call to %s" % second_node.url)
+        start_request(second_node)
+        errors = []
+        for i in range(2):
+            node, reply, error, latency = replies.get()
+            if error is None and bool(reply):
+                if i == 0:
+                    cancel_other(node)
+                # rpcexec records the latency for the node which answered
+                self._call_state.hedge_winner = (node, latency)
+                return reply
+            if node is second_node:
+                self.nodes.record_call(error=True, node=second_node)
+            errors.append(error)
+        if errors[0] is not None:
+            raise errors[0]
+        return ""
+
+    def ws_send(self, payload, request_id=None, parsed=False):
         if self.ws is None:
             raise RPCConnection("No websocket available!")
-        self.ws.send(payload)
-        reply = self.ws.recv()
-        return reply
+        ws_transport = self.ws_transport
+        if ws_transport is None:
+            raise WebSocketConnectionClosedException("Connection is already closed.")
+        timeout = self.nodes.get_timeout(self.timeout)
+        if not self.rate_limit:
+            return ws_transport.send(payload, request_id, parsed=parsed, timeout=timeout)
+        limiter = get_rate_limiter(self.url)
+        limiter.acquire()
+        ret = ws_transport.send(payload, request_id, parsed=parsed, timeout=timeout)
+        reply = ret[0] if parsed else ret
+        if re.search("Too Many Requests", reply[:200]):
+            limiter.decrease()
+        else:
+            limiter.increase()
+        return ret
 
     def version_string_to_int(self, network_version):
         version_list = network_version.split('.')
         return int(int(version_list[0]) * 1e8 + int(version_list[1]) * 1e4 + int(version_list[2]))
 
+    def get_cached_config(self):
+        """ Returns the ``get_config`` reply of the current node from its handshake,
+            which may come from the handshake cache. The config is only requested,
+            when there was no handshake yet.
+        """
+        self._ensure_connected()
+        url = self.url
+        config = self._get_handshake(url)
+        if config is None:
+            config = self.get_config(api="database")
+            if config is not None:
+                self._set_handshake(url, config)
+        return config
+
+    def get_supported_methods(self):
+        """ Returns the set of api methods of the current node, e.g.
+            ``block_api.get_block_range``, from ``jsonrpc.get_methods``. They are
+            requested once per node and kept with the handshake. An empty set is
+            returned, when the node does not list its methods.
+        """
+        self._ensure_connected()
+        url = self.url
+        methods = self._get_handshake(url, key="methods")
+        if methods is None:
+            try:
+                methods = self.get_methods(api="jsonrpc")
+            except RPCError as e:
+                log.debug("Node %s does not list its methods: %s" % (url, str(e)))
+                methods = None
+            methods = list(methods or [])
+            self._set_handshake(url, methods, key="methods")
+        return set(methods)
+
+    def supports_method(self, method):
+        """ Returns True, when the current node lists the method
+
+            :param str method: api and method name, e.g. ``block_api.get_block_range``
+        """
+        return method in self.get_supported_methods()
+
     def get_network(self, props=None):
         """ Identify the connected network. This call returns a
             dictionary with keys chain_id, core_symbol and prefix
+
+            :param dict props: Reply of ``get_config``, when None, the config of the
+                handshake is used, see :func:`get_cached_config`
         """
         if props is None:
-            props = self.get_config(api="database")
+            props = self.get_cached_config()
         chain_id = None
         network_version = None
         for key in props:
@@ -288,7 +1052,8 @@ class GrapheneRPC(object):
         else:
             return highest_version_chain
 
-    def _check_for_server_error(self, reply):
+    @staticmethod
+    def _check_for_server_error(reply):
         """Checks for server error message in reply"""
         if re.search("Internal Server Error", reply) or re.search("500", reply):
             raise RPCErrorDoRetry("Internal Server Error")
@@ -319,66 +1084,178 @@ class GrapheneRPC(object):
         else:
             raise RPCError("Client returned invalid format. Expected JSON!")
 
-    def rpcexec(self, payload):
+    def batch(self, max_batch_size=100, max_payload_bytes=None, max_workers=4):
+        """ Returns a :class:`morphenepythonapi.rpcbatch.RPCBatch`, which
+            collects calls and sends them as JSON-RPC batches
+
+            :param max_batch_size: Maximum number of requests in a single batch (default is 100), or a
+                :class:`morphenepythonapi.batchsize.AdaptiveBatchSize`
+            :param int max_payload_bytes: Maximum size of a batch in bytes, no limit when None (default is None)
+            :param int max_workers: Maximum number of batches which are sent at the same time (default is 4)
+
+            .. code-block:: python
+
+                with rpc.batch() as batch:
+                    f1 = batch.get_block(1)
+                    f2 = batch.get_block(2)
+                print(f1.result(), f2.result())
+
+        """
+        return RPCBatch(self, max_batch_size=max_batch_size, max_payload_bytes=max_payload_bytes,
+                        max_workers=max_workers)
+
+    @staticmethod
+    def _get_error_message(error):
+        if 'detail' in error:
+            return error['detail']
+        return error['message']
+
+    def _get_batch_error(self, error):
+        """Returns the exception for the error of a single request in a batch"""
+        return RPCError(self._get_error_message(error))
+
+    def rpcexec(self, payload, collect_errors=False):
         """
         Execute a call by sending the payload.
 
         :param json payload: Payload data
+        :param bool collect_errors: When True, the replies of a batch are returned
+            as dict by their request id and errors of single requests are not raised
         :raises ValueError: if the server does not respond in proper JSON format
         :raises RPCError: if the server returns an error
         """
-        log.debug(json.dumps(payload))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug(jsoncodec.dumps(payload))
         if self.nodes.working_nodes_count == 0:
             raise WorkingNodeMissing
-        if self.url is None:
-            raise RPCConnection("RPC is not connected!")
-        reply = {}
-        while True:
-            self.nodes.increase_error_cnt_call()
-            try:
-                if self.current_rpc == self.rpc_methods['ws']:
-                    reply = self.ws_send(json.dumps(payload, ensure_ascii=False).encode('utf8'))
-                else:
-                    reply = self.request_send(json.dumps(payload, ensure_ascii=False).encode('utf8'))
-                if not bool(reply):
-                    try:
-                        self.nodes.sleep_and_check_retries("Empty Reply", call_retry=True)
-                    except CallRetriesReached:
+        self._ensure_connected()
+        started = self.nodes.start_call(payload)
+        previous_priority = self.lanes.set_priority(self.lanes.get_priority(payload))
+        try:
+            if self.current_rpc == self.rpc_methods['jsonrpc'] and self.nodes.needs_reselect:
+                # Steer the following calls to the node with the best statistics
+                self._switch_url(self.nodes.select())
+            method = get_metric_method(payload)
+            data = jsoncodec.dumpb(payload)
+            reply = {}
+            parsed = None
+            attempt = 0
+            while True:
+                self.nodes.increase_error_cnt_call()
+                if attempt > 0:
+                    self.rpc_metrics.inc_retry(self.url, method)
+                attempt += 1
+                url = self.url
+                start = time.time()
+                try:
+                    with self.lanes.slot():
+                        if self.current_rpc == self.rpc_methods['ws']:
+                            request_id = payload[0]["id"] if isinstance(payload, list) else payload["id"]
+                            reply, parsed = self.ws_send(data, request_id, parsed=True)
+                        elif self._is_hedged(payload):
+                            reply = self.hedged_request_send(data)
+                        else:
+                            reply = self.request_send(data)
+                    if not bool(reply):
+                        self._record_failure(url, method, start, len(data), "EmptyReply")
+                        try:
+                            self.nodes.sleep_and_check_retries("Empty Reply", call_retry=True)
+                        except CallRetriesReached:
+                            self.nodes.increase_error_cnt()
+                            self.nodes.sleep_and_check_retries("Empty Reply", sleep=False, call_retry=False)
+                            self.rpcconnect(failed_url=url)
+                    else:
+                        latency = time.time() - start
+                        break
+                except (KeyboardInterrupt, DeadlineExceeded):
+                    raise
+                except WebSocketConnectionClosedException as e:
+                    self._record_failure(url, method, start, len(data), e)
+                    if self.nodes.num_retries_call_reached:
                         self.nodes.increase_error_cnt()
-                        self.nodes.sleep_and_check_retries("Empty Reply", sleep=False, call_retry=False)
-                        self.rpcconnect()
-                else:
-                    break
-            except KeyboardInterrupt:
-                raise
-            except WebSocketConnectionClosedException as e:
-                if self.nodes.num_retries_call_reached:
+                        self.nodes.sleep_and_check_retries(str(e), sleep=False, call_retry=False)
+                        self.rpcconnect(failed_url=url)
+                    else:
+                        # self.nodes.sleep_and_check_retries(str(e), sleep=True, call_retry=True)
+                        self.rpcconnect(next_url=False, failed_url=url)
+                except ConnectionError as e:
+                    self._record_failure(url, method, start, len(data), e)
                     self.nodes.increase_error_cnt()
                     self.nodes.sleep_and_check_retries(str(e), sleep=False, call_retry=False)
-                    self.rpcconnect()
-                else:
-                    # self.nodes.sleep_and_check_retries(str(e), sleep=True, call_retry=True)
-                    self.rpcconnect(next_url=False)
-            except ConnectionError as e:
-                self.nodes.increase_error_cnt()
-                self.nodes.sleep_and_check_retries(str(e), sleep=False, call_retry=False)
-                self.rpcconnect()
-            except WebSocketTimeoutException as e:
-                self.nodes.increase_error_cnt()
-                self.nodes.sleep_and_check_retries(str(e), sleep=False, call_retry=False)
-                self.rpcconnect()
+                    self.rpcconnect(failed_url=url)
+                except WebSocketTimeoutException as e:
+                    self._record_failure(url, method, start, len(data), e)
+                    self.nodes.increase_error_cnt()
+                    self.nodes.sleep_and_check_retries(str(e), sleep=False, call_retry=False)
+                    self.rpcconnect(failed_url=url)
+                except Exception as e:
+                    self._record_failure(url, method, start, len(data), e)
+                    self.nodes.increase_error_cnt()
+                    self.nodes.sleep_and_check_retries(str(e), sleep=False, call_retry=False)
+                    self.rpcconnect(failed_url=url)
+
+            node = None
+            hedge_winner = getattr(self._call_state, "hedge_winner", None)
+            if hedge_winner is not None:
+                # Only the node which answered a hedged call gets its latency
+                node, latency = hedge_winner
+                url = node.url
+                self._call_state.hedge_winner = None
+            cassette_recorder = self.cassette_recorder
+            if cassette_recorder is not None:
+                cassette_recorder.record(payload, reply, latency, url=url)
+            try:
+                ret = self._parse_reply(reply, latency, collect_errors, parsed=parsed, node=node)
             except Exception as e:
-                self.nodes.increase_error_cnt()
-                self.nodes.sleep_and_check_retries(str(e), sleep=False, call_retry=False)
-                self.rpcconnect()
+                self.rpc_metrics.observe(url, method, latency, len(data), len(reply), error=e)
+                raise
+            self.rpc_metrics.observe(url, method, latency, len(data), len(reply))
+            self._call_state.reply_bytes = len(reply)
+            return ret
+        finally:
+            self.lanes.set_priority(previous_priority)
+            if started:
+                self.nodes.end_call()
+
+    def _record_failure(self, url, method, start, request_bytes, error):
+        """Records a failed request in the node statistics and the metrics"""
+        self.nodes.record_call(error=True)
+        self.rpc_metrics.observe(url, method, time.time() - start, request_bytes, 0, error=error)
+
+    def _switch_url(self, url):
+        """Sets the node url and counts the switch in the metrics"""
+        if self.url is not None and url != self.url:
+            self.rpc_metrics.inc_node_switch(self.url)
+        self.url = url
 
+    def _parse_reply(self, reply, latency, collect_errors=False, parsed=None, node=None):
+        """ Parses a reply and returns its result, see :func:`rpcexec`
+
+            :param parsed: Decoded reply, when it was decoded already
+            :param Node node: Node which answered, the current node when None
+        """
         ret = {}
-        try:
-            ret = json.loads(reply, strict=False)
-        except ValueError:
-            self._check_for_server_error(reply)
+        if parsed is not None:
+            ret = parsed
+        else:
+            try:
+                ret = jsoncodec.loads(reply)
+            except ValueError:
+                self.nodes.record_call(error=True, node=node)
+                self._check_for_server_error(reply)
+        self.nodes.record_call(latency=latency, node=node)
 
-        log.debug(json.dumps(reply))
+        log.debug(reply)
+
+        if collect_errors:
+            if isinstance(ret, dict) and 'error' in ret and ret.get('id') is None:
+                raise RPCError(self._get_error_message(ret['error']))
+            elif isinstance(ret, dict):
+                ret = [ret]
+            elif not isinstance(ret, list):
+                raise RPCError("Client returned invalid format. Expected JSON! Output: %s" % (str(ret)))
+            self.nodes.reset_error_cnt_call()
+            return dict((r.get("id"), r) for r in ret if isinstance(r, dict))
 
         if isinstance(ret, dict) and 'error' in ret:
             if 'detail' in ret['error']:
@@ -415,23 +1292,31 @@ class GrapheneRPC(object):
     def __getattr__(self, name):
         """Map all methods to RPC calls and pass through the arguments."""
         def method(*args, **kwargs):
+            if "add_to_queue" in kwargs:
+                raise TypeError("add_to_queue was removed, use rpc.batch() to send several calls in one request")
 
             api_name = get_api_name(*args, **kwargs)
 
-            # let's be able to define the num_retries per query
-            stored_num_retries_call = self.nodes.num_retries_call
-            self.nodes.num_retries_call = kwargs.get("num_retries_call", stored_num_retries_call)
-            add_to_queue = kwargs.get("add_to_queue", False)
-            query = get_query(self.get_request_id(), api_name, name, args)
-            if add_to_queue:
-                self.rpc_queue.append(query)
-                self.nodes.num_retries_call = stored_num_retries_call
-                return None
-            elif len(self.rpc_queue) > 0:
-                self.rpc_queue.append(query)
-                query = self.rpc_queue
-                self.rpc_queue = []
-            r = self.rpcexec(query)
-            self.nodes.num_retries_call = stored_num_retries_call
-            return r
+            # let's be able to define the num_retries per query, only for the current thread
+            stored_num_retries_call = self.nodes.set_num_retries_call(kwargs.get("num_retries_call", None))
+
+            def call():
+                count = 1
+                if len(args) > 0 and isinstance(args[0], list):
+                    count = max(1, len(args[0]))
+                query = get_query(self.get_request_id(count), api_name, name, args)
+                return self.rpcexec(query)
+
+            try:
+                if self.critical_nodes and self.lanes.get_priority(name) == CRITICAL:
+                    # Sent to the reserved nodes, within the priority of this thread
+                    return getattr(self.get_critical_rpc(), name)(*args, **kwargs)
+                if name in self.coalesce_methods and not name.startswith("broadcast") and not self.nodes.in_call:
+                    # Calls with other retries or priority (and so deadline) do not share a request
+                    key = (api_name, name, jsoncodec.dumps(args, sort_keys=True),
+                           self.nodes.num_retries_call, self.lanes.get_priority(name))
+                    return self.single_flight.do(key, name, call)
+                return call()
+            finally:
+                self.nodes.set_num_retries_call(stored_num_retries_call)
         return method
@@ -0,0 +1,149 @@
+"""Persisted cache of the node handshake."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from builtins import object
+import io
+import os
+import threading
+import time
+import logging
+from appdirs import user_cache_dir
+from . import jsoncodec
+
+log = logging.getLogger(__name__)
+
+#: Version of the cache file format, files of other versions are ignored
+HANDSHAKE_CACHE_VERSION = 2
+
+#: Seconds for which a cached handshake is used
+DEFAULT_TTL = 3600
+
+
+def get_default_path():
+    """Returns the path of the handshake cache in the user cache directory"""
+    return os.path.join(user_cache_dir("morphene", "morphene"), "handshake.json")
+
+
+class HandshakeCache(object):
+    """ Stores the ``get_config`` reply of every node url in a json file, so that
+        a new client can skip the handshake round trip of its connect. The chain
+        parameters of ``get_network`` are derived from the cached config as well.
+        Further node properties, e.g. the api methods of the node, are stored
+        under their own key.
+
+        :param str path: Path of the cache file (default is ``handshake.json``
+            in the user cache directory)
+        :param float ttl: Seconds for which an entry is used (default is 3600)
+
+        .. code-block:: python
+
+            from morphenepythonapi.handshakecache import HandshakeCache
+            cache = HandshakeCache(ttl=600)
+            config = cache.get("https://morphene.io/rpc")
+            if config is None:
+                config = rpc.get_config()
+                cache.set("https://morphene.io/rpc", config)
+
+        The file is read once and written on every change. A file which cannot
+        be read or written only disables the cache.
+    """
+    def __init__(self, path=None, ttl=DEFAULT_TTL):
+        self.path = path or get_default_path()
+        self.ttl = ttl
+        self._entries = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._entries is not None:
+            return self._entries
+        self._entries = {}
+        if not os.path.isfile(self.path):
+            return self._entries
+        try:
+            with io.open(self.path, "rb") as f:
+                data = jsoncodec.loads(f.read())
+        except (IOError, OSError, ValueError) as e:
+            log.warning("Could not read the handshake cache %s: %s" % (self.path, str(e)))
+            return self._entries
+        if not isinstance(data, dict) or data.get("version") != HANDSHAKE_CACHE_VERSION:
+            log.debug("Ignoring handshake cache %s of another version" % self.path)
+            return self._entries
+        self._entries = data.get("nodes", {})
+        return self._entries
+
+    def _save(self):
+        now = time.time()
+        nodes = {}
+        for url, entry in self._entries.items():
+            entry = dict((key, value) for key, value in entry.items() if now - value["time"] < self.ttl)
+            if entry:
+                nodes[url] = entry
+        tmp_path = "%s.%d.tmp" % (self.path, os.getpid())
+        try:
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            with io.open(tmp_path, "wb") as f:
+                f.write(jsoncodec.dumpb({"version": HANDSHAKE_CACHE_VERSION, "nodes": nodes}))
+            if os.path.exists(self.path) and os.name == "nt":
+                os.remove(self.path)
+            os.rename(tmp_path, self.path)
+        except (IOError, OSError) as e:
+            log.warning("Could not write the handshake cache %s: %s" % (self.path, str(e)))
+
+    def get(self, url, key="config"):
+        """ Returns the cached config (or other property) of the node, or None when
+            there is no entry or it is older than ttl
+
+            :param str url: Node url
+            :param str key: Property, e.g. ``config`` or ``methods`` (default is ``config``)
+        """
+        with self._lock:
+            entry = self._load().get(url, {}).get(key)
+        if entry is None or time.time() - entry["time"] >= self.ttl:
+            return None
+        return entry["value"]
+
+    def set(self, url, value, key="config"):
+        """ Stores the config (or other property) of a node
+
+            :param str url: Node url
+            :param value: Reply of ``get_config``, or the value of the property
+            :param str key: Property, e.g. ``config`` or ``methods`` (default is ``config``)
+        """
+        if not url or value is None:
+            return
+        with self._lock:
+            self._load().setdefault(url, {})[key] = {"time": time.time(), "value": value}
+            self._save()
+
+    def invalidate(self, url=None):
+        """ Removes the entry of a node, or all entries when url is None
+
+            :param str url: Node url
+        """
+        with self._lock:
+            entries = self._load()
+            if url is None:
+                entries.clear()
+            elif entries.pop(url, None) is None:
+                return
+            self._save()
+
+
+def get_handshake_cache(handshake_cache, ttl=DEFAULT_TTL):
+    """ Returns a :class:`HandshakeCache` for the ``handshake_cache`` argument of the rpc clients
+
+        :param handshake_cache: True for the default path, a file path, a
+            :class:`HandshakeCache` or None/False to disable the cache
+        :param float ttl: Seconds for which an entry is used
+    """
+    if not handshake_cache:
+        return None
+    if isinstance(handshake_cache, HandshakeCache):
+        return handshake_cache
+    if handshake_cache is True:
+        return HandshakeCache(ttl=ttl)
+    return HandshakeCache(handshake_cache, ttl=ttl)
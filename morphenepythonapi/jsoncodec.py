@@ -0,0 +1,89 @@
+"""JSON encoding and decoding of rpc payloads."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import json
+ORJSON_MODULE = None
+if not ORJSON_MODULE:
+    try:
+        import orjson
+        ORJSON_MODULE = "orjson"
+    except ImportError:
+        ORJSON_MODULE = None
+UJSON_MODULE = None
+if not UJSON_MODULE:
+    try:
+        import ujson
+        UJSON_MODULE = "ujson"
+    except ImportError:
+        UJSON_MODULE = None
+
+#: Names of the available codecs
+CODECS = [c for c in [ORJSON_MODULE, UJSON_MODULE] if c] + ["json"]
+
+_codec = CODECS[0]
+
+
+def set_codec(name=None):
+    """ Selects the codec used by all clients of the process
+
+        :param str name: ``orjson``, ``ujson`` or ``json`` (the standard library).
+            When None, the fastest available codec is used.
+    """
+    global _codec
+    if name is None:
+        name = CODECS[0]
+    if name not in CODECS:
+        raise ValueError("JSON codec %s is not available, use one of %s" % (name, str(CODECS)))
+    _codec = name
+
+
+def get_codec():
+    """Returns the name of the codec in use"""
+    return _codec
+
+
+def dumpb(obj):
+    """ Returns obj as utf8 encoded JSON. Values which the fast codecs
+        cannot encode (e.g. integers above 64 bit) fall back to the standard library.
+    """
+    try:
+        if _codec == "orjson":
+            return orjson.dumps(obj)
+        elif _codec == "ujson":
+            return ujson.dumps(obj, ensure_ascii=False).encode('utf8')
+    except (TypeError, OverflowError):
+        pass
+    return json.dumps(obj, ensure_ascii=False).encode('utf8')
+
+
+def dumps(obj, sort_keys=False):
+    """Returns obj as JSON string"""
+    try:
+        if _codec == "orjson":
+            return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS if sort_keys else 0).decode('utf8')
+        elif _codec == "ujson":
+            return ujson.dumps(obj, ensure_ascii=False, sort_keys=sort_keys)
+    except (TypeError, OverflowError):
+        pass
+    return json.dumps(obj, ensure_ascii=False, sort_keys=sort_keys)
+
+
+def loads(data):
+    """ Decodes a JSON string or utf8 encoded bytes. Like ``json.loads(data, strict=False)``,
+        control characters inside strings are accepted.
+
+        :raises ValueError: if data is not valid JSON
+    """
+    try:
+        if _codec == "orjson":
+            return orjson.loads(data)
+        elif _codec == "ujson":
+            return ujson.loads(data)
+    except ValueError:
+        # Fast codecs reject control characters within strings, which some nodes send
+        pass
+    if isinstance(data, bytes):
+        data = data.decode('utf8')
+    return json.loads(data, strict=False)
@@ -0,0 +1,699 @@
+"""Local JSON-RPC stand-in node for tests and benchmarks."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from builtins import object, range, str
+import base64
+import hashlib
+import io
+import random
+import socket
+import struct
+import threading
+import time
+import logging
+from datetime import datetime, timedelta
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+from . import jsoncodec
+from morphenepythongraphenebase.chains import known_chains
+
+log = logging.getLogger(__name__)
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+#: Api of the methods which are not served by the database_api, for ``get_methods``
+METHOD_APIS = {
+    "get_block": "block_api", "get_block_header": "block_api", "get_block_range": "block_api",
+    "get_ops_in_block": "account_history_api", "get_account_history": "account_history_api",
+    "broadcast_transaction": "network_broadcast_api", "broadcast_transaction_synchronous": "network_broadcast_api",
+    "login": "login_api", "get_methods": "jsonrpc",
+}
+#: Public key of all synthetic accounts
+DEFAULT_PUBLIC_KEY = "MPH6LLegbAgLAy28EHrffBVuANFWcFgmqRMW13wBmTExqFE9SCkg4"
+#: Operation fields which contain account names
+ACCOUNT_FIELDS = ["from", "to", "account", "owner", "producer", "creator", "new_account_name",
+                  "voter", "author", "delegator", "delegatee", "witness"]
+
+
+def _format_time(t):
+    return t.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+class SyntheticChain(object):
+    """ Deterministic chain with transfers between a few accounts. Every block,
+        account and history entry is computed from the block number and the seed,
+        so two chains with the same parameters are identical.
+
+        :param int head_block_num: Head block number at start (default is 1000)
+        :param list accounts: Account names (default is ``test0`` ... ``test9``)
+        :param int tx_per_block: Number of transfers per block (default is 2)
+        :param int irreversible_lag: Number of blocks between the head block and the
+            last irreversible block (default is 20)
+        :param float block_interval: When set, a new head block is produced every
+            block_interval seconds, otherwise the chain does not grow (default is None)
+        :param int seed: Seed of the generated content (default is 0)
+    """
+    genesis = datetime(2019, 6, 1)
+
+    def __init__(self, head_block_num=1000, accounts=None, tx_per_block=2, irreversible_lag=20,
+                 block_interval=None, seed=0):
+        self.initial_head_block_num = head_block_num
+        self.accounts = list(accounts or ["test%d" % i for i in range(10)])
+        self.tx_per_block = tx_per_block
+        self.irreversible_lag = irreversible_lag
+        self.block_interval = block_interval
+        self.seed = seed
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self._history = dict((name, []) for name in self.accounts)
+        self._indexed_block_num = 0
+
+    @property
+    def head_block_num(self):
+        if not self.block_interval:
+            return self.initial_head_block_num
+        return self.initial_head_block_num + int((time.time() - self.started) / self.block_interval)
+
+    @property
+    def last_irreversible_block_num(self):
+        return max(0, self.head_block_num - self.irreversible_lag)
+
+    def _hash(self, *args):
+        return hashlib.sha1(":".join([str(self.seed)] + [str(a) for a in args]).encode('utf8')).hexdigest()
+
+    def block_id(self, block_num):
+        return "%08x" % block_num + self._hash("block", block_num)[:32]
+
+    def timestamp(self, block_num):
+        return _format_time(self.genesis + timedelta(seconds=3 * block_num))
+
+    def witness(self, block_num):
+        return "witness%d" % (block_num % 21)
+
+    def _transactions(self, block_num):
+        rng = random.Random(self._hash("transactions", block_num))
+        transactions = []
+        for i in range(self.tx_per_block):
+            sender, receiver = rng.sample(self.accounts, 2)
+            transactions.append({
+                "ref_block_num": (block_num - 1) & 0xffff,
+                "ref_block_prefix": int(self._hash("prefix", block_num)[:8], 16),
+                "expiration": _format_time(self.genesis + timedelta(seconds=3 * block_num + 60)),
+                "operations": [["transfer", {"from": sender, "to": receiver,
+                                             "amount": "%.3f MORPH" % (rng.randint(1, 100000) / 1000.),
+                                             "memo": ""}]],
+                "extensions": [],
+                "signatures": ["1f" + (self._hash("signature", block_num, i) * 4)[:128]],
+            })
+        return transactions
+
+    def get_block(self, block_num):
+        """Returns the block, or None when it does not exist (yet)"""
+        if block_num < 1 or block_num > self.head_block_num:
+            return None
+        transactions = self._transactions(block_num)
+        return {
+            "previous": self.block_id(block_num - 1) if block_num > 1 else "0" * 40,
+            "timestamp": self.timestamp(block_num),
+            "witness": self.witness(block_num),
+            "transaction_merkle_root": self._hash("merkle", block_num),
+            "extensions": [],
+            "witness_signature": "20" + (self._hash("witness_signature", block_num) * 4)[:128],
+            "transactions": transactions,
+            "block_id": self.block_id(block_num),
+            "signing_key": DEFAULT_PUBLIC_KEY,
+            "transaction_ids": [self._hash("trx", block_num, i) for i in range(len(transactions))],
+        }
+
+    def get_block_header(self, block_num):
+        block = self.get_block(block_num)
+        if block is None:
+            return None
+        return dict((k, block[k]) for k in ["previous", "timestamp", "witness", "transaction_merkle_root", "extensions"])
+
+    def get_ops_in_block(self, block_num, only_virtual=False):
+        block = self.get_block(block_num)
+        if block is None:
+            return []
+        ops = []
+        if not only_virtual:
+            for trx_in_block, trx in enumerate(block["transactions"]):
+                for op_in_trx, op in enumerate(trx["operations"]):
+                    ops.append({"trx_id": block["transaction_ids"][trx_in_block], "block": block_num,
+                                "trx_in_block": trx_in_block, "op_in_trx": op_in_trx, "virtual_op": 0,
+                                "timestamp": block["timestamp"], "op": op})
+        ops.append({"trx_id": "0" * 40, "block": block_num, "trx_in_block": len(block["transactions"]),
+                    "op_in_trx": 0, "virtual_op": 1, "timestamp": block["timestamp"],
+                    "op": ["producer_reward", {"producer": block["witness"], "vesting_shares": "1.000000 VESTS"}]})
+        return ops
+
+    def _index_history(self):
+        """Adds the operations of new blocks to the account histories"""
+        with self.lock:
+            head_block_num = self.head_block_num
+            for block_num in range(self._indexed_block_num + 1, head_block_num + 1):
+                for op in self.get_ops_in_block(block_num):
+                    names = set(op["op"][1].get(field) for field in ACCOUNT_FIELDS)
+                    for name in names:
+                        if name in self._history:
+                            self._history[name].append(op)
+            self._indexed_block_num = max(self._indexed_block_num, head_block_num)
+
+    def get_account_history(self, name, start=-1, limit=100):
+        """ Returns up to limit + 1 entries of the account history, up to the index start
+            (-1 is the newest entry), as ``[[index, op], ...]``
+        """
+        self._index_history()
+        history = self._history.get(name, [])
+        if start < 0 or start >= len(history):
+            start = len(history) - 1
+        return [[i, history[i]] for i in range(max(0, start - limit), start + 1)]
+
+    def get_account(self, name):
+        """Returns the account, or None when it does not exist"""
+        if name not in self.accounts:
+            return None
+        authority = {"weight_threshold": 1, "account_auths": [], "key_auths": [[DEFAULT_PUBLIC_KEY, 1]]}
+        created = _format_time(self.genesis)
+        return {
+            "id": self.accounts.index(name), "name": name,
+            "owner": authority, "active": authority, "posting": authority,
+            "memo_key": DEFAULT_PUBLIC_KEY, "json_metadata": "", "proxy": "",
+            "last_owner_update": created, "last_account_update": created, "created": created,
+            "recovery_account": "initminer", "last_account_recovery": created,
+            "balance": "%.3f MORPH" % (1000 + self.accounts.index(name)),
+            "vesting_shares": "1000.000000 VESTS", "delegated_vesting_shares": "0.000000 VESTS",
+            "received_vesting_shares": "0.000000 VESTS", "vesting_withdraw_rate": "0.000000 VESTS",
+            "next_vesting_withdrawal": "1969-12-31T23:59:59", "withdrawn": 0, "to_withdraw": 0,
+            "withdraw_routes": 0, "proxied_vsf_votes": [0, 0, 0, 0], "witnesses_voted_for": 0,
+            "witness_votes": [], "voting_manabar": {"current_mana": 0, "last_update_time": 0},
+        }
+
+    def get_dynamic_global_properties(self):
+        head_block_num = self.head_block_num
+        return {
+            "id": 0, "head_block_number": head_block_num, "head_block_id": self.block_id(head_block_num),
+            "time": self.timestamp(head_block_num), "current_witness": self.witness(head_block_num),
+            "current_supply": "1000000.000 MORPH", "virtual_supply": "1000000.000 MORPH",
+            "total_vesting_fund_morph": "500000.000 MORPH", "total_vesting_shares": "1000000000.000000 VESTS",
+            "maximum_block_size": 65536, "current_aslot": head_block_num,
+            "recent_slots_filled": "340282366920938463463374607431768211455", "participation_count": 128,
+            "last_irreversible_block_num": self.last_irreversible_block_num,
+            "average_block_size": 0, "current_reserve_ratio": 1, "max_virtual_bandwidth": "0",
+        }
+
+    def get_config(self):
+        chain = known_chains["MORPHENE"]
+        return {
+            "MORPHENE_CHAIN_ID": chain["chain_id"], "MORPHENE_BLOCKCHAIN_VERSION": chain["min_version"],
+            "MORPHENE_ADDRESS_PREFIX": chain["prefix"], "MORPHENE_BLOCK_INTERVAL": self.block_interval or 3,
+            "MORPHENE_100_PERCENT": 10000, "MORPHENE_1_PERCENT": 100,
+            "MORPHENE_VOTING_MANA_REGENERATION_SECONDS": 432000, "MORPHENE_RC_REGEN_TIME": 432000,
+        }
+
+    def get_witness_schedule(self):
+        return {"id": 0, "current_virtual_time": "0", "next_shuffle_block_num": self.head_block_num + 21,
+                "current_shuffled_witnesses": [self.witness(i) for i in range(21)], "num_scheduled_witnesses": 21,
+                "median_props": {"account_creation_fee": "0.100 MORPH", "maximum_block_size": 65536}}
+
+    def get_next_scheduled_hardfork(self):
+        return {"hf_version": known_chains["MORPHENE"]["min_version"], "live_time": _format_time(self.genesis)}
+
+
+class RecordedChain(SyntheticChain):
+    """ Serves recorded blocks, e.g. the results of ``get_block`` calls to a real node
+
+        :param list blocks: Blocks as dict, with ``block_id``
+        :param list accounts: Account names, by default all names found in the operations
+        :param int irreversible_lag: Number of blocks between the head block and the
+            last irreversible block (default is 20)
+    """
+    def __init__(self, blocks, accounts=None, irreversible_lag=20):
+        self.blocks = {}
+        for block in blocks:
+            self.blocks[int(block["block_id"][:8], 16)] = block
+        if accounts is None:
+            accounts = set()
+            for block in self.blocks.values():
+                for trx in block.get("transactions", []):
+                    for op in trx.get("operations", []):
+                        for field in ACCOUNT_FIELDS:
+                            if isinstance(op[1].get(field), str):
+                                accounts.add(op[1][field])
+            accounts = sorted(accounts)
+        super(RecordedChain, self).__init__(head_block_num=max(self.blocks) if self.blocks else 0,
+                                            accounts=accounts, irreversible_lag=irreversible_lag)
+
+    @classmethod
+    def from_file(cls, filename, **kwargs):
+        """Reads the blocks from a file with one JSON block per line"""
+        with io.open(filename, encoding="utf8") as f:
+            blocks = [jsoncodec.loads(line) for line in f if line.strip()]
+        return cls(blocks, **kwargs)
+
+    def get_block(self, block_num):
+        if block_num > self.head_block_num:
+            return None
+        return self.blocks.get(block_num)
+
+    def get_ops_in_block(self, block_num, only_virtual=False):
+        if only_virtual:
+            return []
+        ops = super(RecordedChain, self).get_ops_in_block(block_num)
+        return [op for op in ops if not op["virtual_op"]]
+
+    def timestamp(self, block_num):
+        block = self.blocks.get(block_num)
+        if block is None:
+            return super(RecordedChain, self).timestamp(block_num)
+        return block["timestamp"]
+
+    def block_id(self, block_num):
+        block = self.blocks.get(block_num)
+        if block is None:
+            return super(RecordedChain, self).block_id(block_num)
+        return block["block_id"]
+
+
+class _RPCError(Exception):
+    def __init__(self, message, code=-32000):
+        super(_RPCError, self).__init__(message)
+        self.code = code
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def _ws_accept_key(key):
+    return base64.b64encode(hashlib.sha1((key + WS_GUID).encode('utf8')).digest()).decode('utf8')
+
+
+def _ws_frame(opcode, data):
+    header = bytearray([0x80 | opcode])
+    if len(data) < 126:
+        header.append(len(data))
+    elif len(data) < 65536:
+        header.append(126)
+        header += struct.pack(">H", len(data))
+    else:
+        header.append(127)
+        header += struct.pack(">Q", len(data))
+    return bytes(header) + data
+
+
+def _ws_read_frame(rfile):
+    """Returns opcode, fin and the unmasked payload of the next frame, or None on close"""
+    header = rfile.read(2)
+    if len(header) < 2:
+        return None
+    b1, b2 = bytearray(header)
+    length = b2 & 0x7f
+    if length == 126:
+        length = struct.unpack(">H", rfile.read(2))[0]
+    elif length == 127:
+        length = struct.unpack(">Q", rfile.read(8))[0]
+    mask = bytearray(rfile.read(4)) if b2 & 0x80 else None
+    data = bytearray(rfile.read(length))
+    if mask is not None:
+        for i in range(len(data)):
+            data[i] ^= mask[i % 4]
+    return b1 & 0x0f, bool(b1 & 0x80), bytes(data)
+
+
+class LocalNode(object):
+    """ Lightweight JSON-RPC node for tests and benchmarks. It serves the
+        ``database_api``, ``block_api`` and ``account_history_api`` calls used by this
+        library from a :class:`SyntheticChain` or :class:`RecordedChain`, over http
+        and websocket on the same port, without any network access. Broadcast
+        transactions are accepted and collected in ``broadcasts``, without validation.
+
+        :param chain: Chain to serve (default is a new :class:`SyntheticChain`)
+        :param str host: Address to listen on (default is 127.0.0.1)
+        :param int port: Port, 0 for any free port (default is 0)
+        :param float latency: Delay of every reply in seconds (default is 0)
+        :param float jitter: Random additional delay of up to jitter seconds (default is 0)
+        :param float error_rate: Fraction of requests which are answered with an
+            ``Internal Error`` (default is 0)
+        :param float rate_limit: Requests per second, further requests are answered with
+            ``429 Too Many Requests`` (default is no limit)
+        :param float retry_after: ``Retry-After`` header of throttled replies in seconds (default is 1)
+        :param int seed: Seed of the injected delays and errors (default is 0)
+
+        .. code-block:: python
+
+            from morphenepython import MorpheneClient
+            from morphenepythonapi.localnode import LocalNode, SyntheticChain
+
+            with LocalNode(SyntheticChain(head_block_num=100000), latency=0.02, jitter=0.01) as node:
+                mph = MorpheneClient(node=[node.url, node.ws_url])
+                print(mph.get_dynamic_global_properties()["head_block_number"])
+
+        It can also be started from the command line:
+        ``python -m morphenepythonapi.localnode --port 8090 --latency 0.05``
+
+    """
+    def __init__(self, chain=None, host="127.0.0.1", port=0, latency=0., jitter=0., error_rate=0.,
+                 rate_limit=None, retry_after=1., seed=0):
+        self.chain = chain or SyntheticChain()
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "calls": 0, "errors": 0, "throttled": 0}
+        self.tokens = rate_limit or 0.
+        self.last_refill = time.time()
+        self.server = None
+        self.thread = None
+        self.connections = set()
+        self.broadcasts = []
+        self.methods = {
+            "get_config": lambda args: self.chain.get_config(),
+            "get_dynamic_global_properties": lambda args: self.chain.get_dynamic_global_properties(),
+            "get_witness_schedule": lambda args: self.chain.get_witness_schedule(),
+            "get_next_scheduled_hardfork": lambda args: self.chain.get_next_scheduled_hardfork(),
+            "get_block": self._get_block,
+            "get_block_header": self._get_block_header,
+            "get_block_range": self._get_block_range,
+            "get_ops_in_block": self._get_ops_in_block,
+            "get_accounts": self._get_accounts,
+            "lookup_account_names": self._get_accounts,
+            "find_accounts": self._get_accounts,
+            "get_account_count": lambda args: len(self.chain.accounts),
+            "get_account_history": self._get_account_history,
+            "verify_authority": lambda args: True,
+            "broadcast_transaction": self._broadcast_transaction,
+            "broadcast_transaction_synchronous": self._broadcast_transaction,
+            "login": lambda args: True,
+            "get_methods": lambda args: sorted("%s.%s" % (METHOD_APIS.get(name, "database_api"), name)
+                                               for name in self.methods),
+        }
+
+    @property
+    def url(self):
+        return "http://%s:%d" % (self.host, self.port)
+
+    @property
+    def ws_url(self):
+        return "ws://%s:%d" % (self.host, self.port)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        """Starts serving from a background thread. A stopped node can be started again on the same port."""
+        node = self
+
+        class Handler(_Handler):
+            local_node = node
+        self.server = _Server((self.host, self.port), Handler)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, name="local-node")
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stops the server and closes all open connections"""
+        if self.server is None:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        with self.lock:
+            connections = list(self.connections)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except Exception:
+                pass
+        self.server = None
+
+    def _count(self, key, n=1):
+        with self.lock:
+            self.stats[key] += n
+
+    def _throttle(self):
+        """Returns True, when the request exceeds the rate limit"""
+        if not self.rate_limit:
+            return False
+        with self.lock:
+            now = time.time()
+            self.tokens = min(max(1., self.rate_limit), self.tokens + (now - self.last_refill) * self.rate_limit)
+            self.last_refill = now
+            if self.tokens < 1:
+                self.stats["throttled"] += 1
+                return True
+            self.tokens -= 1
+        return False
+
+    def _delay(self):
+        delay = self.latency
+        if self.jitter:
+            delay += self.random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def handle(self, data):
+        """ Answers an encoded JSON-RPC request or batch. Returns the http status and the reply.
+
+            :param bytes data: Request
+        """
+        self._count("requests")
+        self._delay()
+        if self._throttle():
+            return 429, "429 Too Many Requests"
+        try:
+            payload = jsoncodec.loads(data)
+        except ValueError:
+            return 200, jsoncodec.dumps({"jsonrpc": "2.0", "id": None,
+                                         "error": {"code": -32700, "message": "Parse Error"}})
+        fail = self.error_rate > 0 and self.random.random() < self.error_rate
+        if isinstance(payload, list):
+            self._count("calls", len(payload))
+            return 200, jsoncodec.dumps([self._answer(query, fail) for query in payload])
+        self._count("calls")
+        return 200, jsoncodec.dumps(self._answer(payload, fail))
+
+    def throttled_reply(self, data):
+        """Returns the websocket reply to a throttled request, with its request id"""
+        try:
+            payload = jsoncodec.loads(data)
+            request_id = payload[0]["id"] if isinstance(payload, list) else payload["id"]
+        except Exception:
+            request_id = None
+        return jsoncodec.dumps({"jsonrpc": "2.0", "id": request_id,
+                                "error": {"code": 429, "message": "Too Many Requests"}})
+
+    def _answer(self, query, fail=False):
+        request_id = query.get("id") if isinstance(query, dict) else None
+        try:
+            if fail:
+                self._count("errors")
+                raise _RPCError("Internal Error")
+            result = self._call(query.get("method", ""), query.get("params", []))
+            return {"jsonrpc": "2.0", "id": request_id, "result": result}
+        except _RPCError as e:
+            return {"jsonrpc": "2.0", "id": request_id, "error": {"code": e.code, "message": str(e)}}
+
+    def _call(self, method, params):
+        if method == "call":
+            if len(params) < 2:
+                raise _RPCError("Invalid call parameters", code=-32602)
+            api, name = params[0], params[1]
+            args = params[2] if len(params) > 2 else []
+        elif "." in method:
+            api, name = method.split(".", 1)
+            args = params
+        else:
+            api, name, args = "database_api", method, params
+        if name not in self.methods:
+            raise _RPCError("Could not find method %s.%s" % (api, name), code=-32601)
+        try:
+            return self.methods[name](args)
+        except (IndexError, KeyError, TypeError, ValueError) as e:
+            raise _RPCError("Invalid parameters: %s" % str(e), code=-32602)
+
+    def _get_block(self, args):
+        if isinstance(args, dict):
+            block = self.chain.get_block(int(args["block_num"]))
+            return {"block": block} if block is not None else {}
+        return self.chain.get_block(int(args[0]))
+
+    def _get_block_header(self, args):
+        if isinstance(args, dict):
+            header = self.chain.get_block_header(int(args["block_num"]))
+            return {"header": header} if header is not None else {}
+        return self.chain.get_block_header(int(args[0]))
+
+    def _get_block_range(self, args):
+        start = int(args["starting_block_num"])
+        count = int(args["count"])
+        if count > 1000:
+            raise _RPCError("count <= 1000: You can only ask for 1000 blocks at a time", code=-32602)
+        blocks = []
+        for block_num in range(start, start + count):
+            block = self.chain.get_block(block_num)
+            if block is None:
+                break
+            blocks.append(block)
+        return {"blocks": blocks}
+
+    def _get_ops_in_block(self, args):
+        if isinstance(args, dict):
+            return {"ops": self.chain.get_ops_in_block(int(args["block_num"]), bool(args.get("only_virtual", False)))}
+        return self.chain.get_ops_in_block(int(args[0]), bool(args[1]) if len(args) > 1 else False)
+
+    def _get_accounts(self, args):
+        if isinstance(args, dict):
+            return {"accounts": [a for a in [self.chain.get_account(name) for name in args["accounts"]] if a]}
+        return [a for a in [self.chain.get_account(name) for name in args[0]] if a]
+
+    def _broadcast_transaction(self, args):
+        trx = args.get("trx") if isinstance(args, dict) else args[0]
+        with self.lock:
+            self.broadcasts.append(trx)
+            trx_num = len(self.broadcasts)
+        return {"id": "%040x" % trx_num, "block_num": self.chain.head_block_num + 1,
+                "trx_num": trx_num, "expired": False}
+
+    def _get_account_history(self, args):
+        if isinstance(args, dict):
+            return {"history": self.chain.get_account_history(args["account"], int(args.get("start", -1)),
+                                                              int(args.get("limit", 100)))}
+        return self.chain.get_account_history(args[0], int(args[1]), int(args[2]))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    local_node = None
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        with self.local_node.lock:
+            self.local_node.connections.add(self.connection)
+
+    def finish(self):
+        with self.local_node.lock:
+            self.local_node.connections.discard(self.connection)
+        try:
+            BaseHTTPRequestHandler.finish(self)
+        except Exception:
+            pass
+
+    def log_message(self, format, *args):
+        log.debug(format % args)
+
+    def do_POST(self):
+        data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        status, reply = self.local_node.handle(data)
+        body = reply.encode('utf8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json" if status == 200 else "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        if status == 429:
+            self.send_header("Retry-After", "%g" % self.local_node.retry_after)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.headers.get("Upgrade", "").lower() != "websocket":
+            self.send_error(405)
+            return
+        self.send_response(101, "Switching Protocols")
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", _ws_accept_key(self.headers.get("Sec-WebSocket-Key", "")))
+        self.end_headers()
+        self.wfile.flush()
+        self.close_connection = True
+        send_lock = threading.Lock()
+
+        def send(opcode, data):
+            with send_lock:
+                self.wfile.write(_ws_frame(opcode, data))
+                self.wfile.flush()
+
+        def answer(data):
+            # Replies are sent as soon as they are ready, not in the order of the requests
+            try:
+                status, reply = self.local_node.handle(data)
+                if status == 429:
+                    reply = self.local_node.throttled_reply(data)
+                send(0x1, reply.encode('utf8'))
+            except Exception as e:
+                log.debug(str(e))
+
+        message = b""
+        while True:
+            try:
+                frame = _ws_read_frame(self.rfile)
+            except Exception:
+                return
+            if frame is None:
+                return
+            opcode, fin, data = frame
+            if opcode == 0x8:
+                try:
+                    send(0x8, data[:2])
+                except Exception:
+                    pass
+                return
+            elif opcode == 0x9:
+                send(0xA, data)
+                continue
+            elif opcode in [0x0, 0x1, 0x2]:
+                message += data
+                if not fin:
+                    continue
+                thread = threading.Thread(target=answer, args=(message, ), name="local-node-ws")
+                thread.daemon = True
+                thread.start()
+                message = b""
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Local JSON-RPC stand-in node")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--head-block-num", type=int, default=1000)
+    parser.add_argument("--block-interval", type=float, default=None)
+    parser.add_argument("--blocks", help="File with one recorded JSON block per line")
+    parser.add_argument("--latency", type=float, default=0.)
+    parser.add_argument("--jitter", type=float, default=0.)
+    parser.add_argument("--error-rate", type=float, default=0.)
+    parser.add_argument("--rate-limit", type=float, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.blocks:
+        chain = RecordedChain.from_file(args.blocks)
+    else:
+        chain = SyntheticChain(head_block_num=args.head_block_num, block_interval=args.block_interval, seed=args.seed)
+    node = LocalNode(chain, host=args.host, port=args.port, latency=args.latency, jitter=args.jitter,
+                     error_rate=args.error_rate, rate_limit=args.rate_limit, seed=args.seed).start()
+    print("Serving on %s and %s" % (node.url, node.ws_url))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        node.stop()
+
+
+if __name__ == "__main__":
+    main()
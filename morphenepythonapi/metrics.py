@@ -0,0 +1,225 @@
+"""Rpc metrics."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from builtins import object, str
+import threading
+import logging
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+log = logging.getLogger(__name__)
+
+#: Upper bounds of the latency histogram buckets in seconds
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1., 2.5, 5., 10., 30., 60.]
+
+
+def get_metric_method(payload):
+    """ Returns the method label of a payload, e.g. ``database_api.get_config``.
+        Batches are labeled with their method, when all requests have the same one,
+        otherwise with ``batch``.
+    """
+    if isinstance(payload, list):
+        methods = set(get_metric_method(query) for query in payload)
+        if len(methods) == 1:
+            return methods.pop()
+        return "batch"
+    if payload.get("method") == "call" and len(payload.get("params", [])) > 1:
+        return "%s.%s" % (payload["params"][0], payload["params"][1])
+    return payload.get("method", "unknown")
+
+
+class _MethodMetrics(object):
+    def __init__(self):
+        self.requests = 0
+        self.retries = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.latency_sum = 0.
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.errors = {}
+
+
+class RPCMetrics(object):
+    """ Collects request counts, latencies, transferred bytes, retries, node
+        switches and errors of rpc calls, by node url and api method. It can be
+        shared by several rpc instances.
+
+        .. code-block:: python
+
+            from morphenepythonapi.metrics import RPCMetrics
+            metrics = RPCMetrics()
+            metrics.observe("https://morphene.io/rpc", "database_api.get_config", 0.12, 80, 2400)
+            print(metrics.to_prometheus())
+
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.methods = {}
+        self.node_switches = {}
+
+    def _get(self, node, method):
+        key = (node, method)
+        if key not in self.methods:
+            self.methods[key] = _MethodMetrics()
+        return self.methods[key]
+
+    def observe(self, node, method, latency, request_bytes=0, response_bytes=0, error=None):
+        """ Adds a single request
+
+            :param str node: Node url
+            :param str method: Api method, see :func:`get_metric_method`
+            :param float latency: Duration of the request in seconds
+            :param int request_bytes: Size of the request
+            :param int response_bytes: Size of the response
+            :param error: Exception or error class name, when the request failed
+        """
+        index = len(LATENCY_BUCKETS)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                index = i
+                break
+        if error is not None and not isinstance(error, str):
+            error = error.__class__.__name__
+        with self.lock:
+            m = self._get(node, method)
+            m.requests += 1
+            m.request_bytes += request_bytes
+            m.response_bytes += response_bytes
+            m.latency_sum += latency
+            m.latency_buckets[index] += 1
+            if error is not None:
+                m.errors[error] = m.errors.get(error, 0) + 1
+
+    def inc_retry(self, node, method):
+        """Counts a repeated request"""
+        with self.lock:
+            self._get(node, method).retries += 1
+
+    def inc_node_switch(self, node):
+        """Counts a switch away from the node"""
+        with self.lock:
+            self.node_switches[node] = self.node_switches.get(node, 0) + 1
+
+    def reset(self):
+        with self.lock:
+            self.methods = {}
+            self.node_switches = {}
+
+    def snapshot(self):
+        """ Returns all metrics as dict by node url:
+
+            .. code-block:: python
+
+                {"https://morphene.io/rpc": {
+                    "node_switches": 0,
+                    "methods": {"database_api.get_config": {
+                        "requests": 1, "retries": 0, "request_bytes": 80, "response_bytes": 2400,
+                        "errors": {}, "latency": {"sum": 0.12, "count": 1, "buckets": {"0.25": 1, ...}}}}}}
+
+            The bucket counts are cumulative, the last bucket is ``"+Inf"``.
+        """
+        with self.lock:
+            nodes = {}
+            for (node, method), m in self.methods.items():
+                if node not in nodes:
+                    nodes[node] = {"node_switches": self.node_switches.get(node, 0), "methods": {}}
+                buckets = {}
+                cumulative = 0
+                for bound, count in zip([str(b) for b in LATENCY_BUCKETS] + ["+Inf"], m.latency_buckets):
+                    cumulative += count
+                    buckets[bound] = cumulative
+                nodes[node]["methods"][method] = {
+                    "requests": m.requests, "retries": m.retries,
+                    "request_bytes": m.request_bytes, "response_bytes": m.response_bytes,
+                    "errors": dict(m.errors),
+                    "latency": {"sum": m.latency_sum, "count": sum(m.latency_buckets), "buckets": buckets}}
+            for node, switches in self.node_switches.items():
+                if node not in nodes:
+                    nodes[node] = {"node_switches": switches, "methods": {}}
+            return nodes
+
+    def to_prometheus(self, prefix="morphene_rpc"):
+        """Returns all metrics in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = []
+
+        def header(name, kind, text):
+            lines.append("# HELP %s_%s %s" % (prefix, name, text))
+            lines.append("# TYPE %s_%s %s" % (prefix, name, kind))
+
+        def sample(name, labels, value):
+            label_str = ",".join('%s="%s"' % (k, _escape(v)) for k, v in labels)
+            lines.append("%s_%s{%s} %s" % (prefix, name, label_str, _format_value(value)))
+
+        counters = [("requests_total", "requests", "Number of rpc requests"),
+                    ("retries_total", "retries", "Number of repeated rpc requests"),
+                    ("request_bytes_total", "request_bytes", "Size of all rpc requests"),
+                    ("response_bytes_total", "response_bytes", "Size of all rpc responses")]
+        for name, key, text in counters:
+            header(name, "counter", text)
+            for node in sorted(snapshot):
+                for method in sorted(snapshot[node]["methods"]):
+                    sample(name, [("node", node), ("method", method)], snapshot[node]["methods"][method][key])
+        header("errors_total", "counter", "Number of failed rpc requests by error class")
+        for node in sorted(snapshot):
+            for method in sorted(snapshot[node]["methods"]):
+                errors = snapshot[node]["methods"][method]["errors"]
+                for error in sorted(errors):
+                    sample("errors_total", [("node", node), ("method", method), ("error", error)], errors[error])
+        header("node_switches_total", "counter", "Number of switches away from a node")
+        for node in sorted(snapshot):
+            sample("node_switches_total", [("node", node)], snapshot[node]["node_switches"])
+        header("request_duration_seconds", "histogram", "Duration of rpc requests")
+        for node in sorted(snapshot):
+            for method in sorted(snapshot[node]["methods"]):
+                latency = snapshot[node]["methods"][method]["latency"]
+                labels = [("node", node), ("method", method)]
+                for bound in [str(b) for b in LATENCY_BUCKETS] + ["+Inf"]:
+                    sample("request_duration_seconds_bucket", labels + [("le", bound)], latency["buckets"][bound])
+                sample("request_duration_seconds_sum", labels, latency["sum"])
+                sample("request_duration_seconds_count", labels, latency["count"])
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def start_metrics_server(metrics, port=9100, host="127.0.0.1"):
+    """ Serves the metrics in the Prometheus text format on ``http://host:port/metrics``
+        from a background thread. Returns the server, which is stopped by ``shutdown()``.
+
+        :param RPCMetrics metrics: Metrics to serve
+        :param int port: Port, 0 for any free port (default is 9100)
+        :param str host: Address to listen on (default is 127.0.0.1)
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ["/", "/metrics"]:
+                self.send_error(404)
+                return
+            body = metrics.to_prometheus().encode('utf8')
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            log.debug(format % args)
+
+    server = HTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server")
+    thread.daemon = True
+    thread.start()
+    return server
@@ -6,10 +6,78 @@ from builtins import bytes, int, str
 import re
 import sys
 from .graphenerpc import GrapheneRPC
+from .metrics import get_metric_method
 from . import exceptions
 import logging
 log = logging.getLogger(__name__)
 
+#: The call can be repeated on the same node
+RETRY_CALL = "retry_call"
+#: The call should be repeated on the next node
+SWITCH_NODE = "switch_node"
+
+
+def check_api_name(msg):
+    """Returns True when msg reports a missing, but known api"""
+    error_start = "Could not find API"
+    known_apis = ['account_history_api', 'tags_api',
+                  'database_api', 'block_api', 'account_by_key_api',
+                  'chain_api', 'debug_node_api', 'witness_api',
+                  'test_api', 'network_broadcast_api']
+    for api in known_apis:
+        if re.search(error_start + " " + api, msg):
+            return True
+    if msg[-18:] == error_start:
+        return True
+    return False
+
+
+def classify_error_message(e):
+    """ Classifies a RPCError returned by a node. Returns ``RETRY_CALL``
+        or ``SWITCH_NODE`` for recoverable errors and raises a matching
+        exception for all others.
+
+        :param RPCError e: Error returned by the node
+    """
+    msg = exceptions.decodeRPCErrorMsg(e).strip()
+    if re.search("missing required active authority", msg):
+        raise exceptions.MissingRequiredActiveAuthority
+    elif re.search("missing required active authority", msg):
+        raise exceptions.MissingRequiredActiveAuthority
+    elif re.match("^no method with name.*", msg):
+        raise exceptions.NoMethodWithName(msg)
+    elif re.search("Could not find method", msg):
+        raise exceptions.NoMethodWithName(msg)
+    elif re.search("Could not find API", msg):
+        if check_api_name(msg):
+            raise exceptions.ApiNotSupported(msg)
+        else:
+            raise exceptions.NoApiWithName(msg)
+    elif re.search("irrelevant signature included", msg):
+        raise exceptions.UnnecessarySignatureDetected(msg)
+    elif re.search("WinError", msg):
+        raise exceptions.RPCError(msg)
+    elif re.search("Unable to acquire database lock", msg):
+        return RETRY_CALL
+    elif re.search("Request Timeout", msg):
+        return RETRY_CALL
+    elif re.search("Bad or missing upstream response", msg):
+        return RETRY_CALL
+    elif re.search("Too Many Requests", msg):
+        return RETRY_CALL
+    elif re.search("Internal Error", msg) or re.search("Unknown exception", msg):
+        return RETRY_CALL
+    elif re.search("!check_max_block_age", str(e)):
+        return SWITCH_NODE
+    elif re.search("Can only vote once every 3 seconds", msg):
+        raise exceptions.VotedBeforeWaitTimeReached(msg)
+    elif re.search("out_of_rangeEEEE: unknown key", msg) or re.search("unknown key:unknown key", msg):
+        raise exceptions.UnkownKey(msg)
+    elif msg:
+        raise exceptions.UnhandledRPCError(msg)
+    else:
+        raise e
+
 
 class MorpheneNodeRPC(GrapheneRPC):
     """ This class allows to call API methods exposed by the witness node via
@@ -36,119 +104,110 @@ class MorpheneNodeRPC(GrapheneRPC):
 
         """
         super(MorpheneNodeRPC, self).__init__(*args, **kwargs)
-        self.next_node_on_empty_reply = False
+
+    @property
+    def next_node_on_empty_reply(self):
+        return getattr(self._call_state, "next_node_on_empty_reply", False)
+
+    @next_node_on_empty_reply.setter
+    def next_node_on_empty_reply(self, next_node_on_empty_reply):
+        # Kept per thread, as the instance may be shared
+        self._call_state.next_node_on_empty_reply = next_node_on_empty_reply
 
     def set_next_node_on_empty_reply(self, next_node_on_empty_reply=True):
         """Switch to next node on empty reply for the next rpc call"""
         self.next_node_on_empty_reply = next_node_on_empty_reply
 
-    def rpcexec(self, payload):
+    def rpcexec(self, payload, collect_errors=False):
         """ Execute a call by sending the payload.
             It makes use of the GrapheneRPC library.
             In here, we mostly deal with Morphene specific error handling
 
             :param json payload: Payload data
+            :param bool collect_errors: When True, the replies of a batch are returned
+                as dict by their request id and errors of single requests are not raised
             :raises ValueError: if the server does not respond in proper JSON format
             :raises RPCError: if the server returns an error
         """
-        if self.url is None:
-            raise exceptions.RPCConnection("RPC is not connected!")
-        doRetry = True
-        maxRetryCountReached = False
-        while doRetry and not maxRetryCountReached:
-            doRetry = False
-            try:
-                # Forward call to GrapheneWebsocketRPC and catch+evaluate errors
-                reply = super(MorpheneNodeRPC, self).rpcexec(payload)
-                if self.next_node_on_empty_reply and not bool(reply) and self.nodes.working_nodes_count > 1:
-                    self._retry_on_next_node("Empty Reply")
-                    doRetry = True
-                    self.next_node_on_empty_reply = True
-                else:
-                    self.next_node_on_empty_reply = False
-                    return reply
-            except exceptions.RPCErrorDoRetry as e:
-                msg = exceptions.decodeRPCErrorMsg(e).strip()
+        self._ensure_connected()
+        started = self.nodes.start_call(payload)
+        try:
+            doRetry = True
+            maxRetryCountReached = False
+            attempt = 0
+            while doRetry and not maxRetryCountReached:
+                doRetry = False
+                url = self.url
+                if attempt > 0:
+                    self.rpc_metrics.inc_retry(url, get_metric_method(payload))
+                attempt += 1
                 try:
-                    self.nodes.sleep_and_check_retries(str(msg), call_retry=True)
-                    doRetry = True
-                except exceptions.CallRetriesReached:
-                    if self.nodes.working_nodes_count > 1:
-                        self._retry_on_next_node(msg)
+                    # Forward call to GrapheneWebsocketRPC and catch+evaluate errors
+                    reply = super(MorpheneNodeRPC, self).rpcexec(payload, collect_errors=collect_errors)
+                    if self.next_node_on_empty_reply and not bool(reply) and self.nodes.working_nodes_count > 1:
+                        self._retry_on_next_node("Empty Reply", failed_url=url)
                         doRetry = True
+                        self.next_node_on_empty_reply = True
                     else:
                         self.next_node_on_empty_reply = False
-                        raise exceptions.CallRetriesReached
-            except exceptions.RPCError as e:
-                try:
-                    doRetry = self._check_error_message(e, self.error_cnt_call)
-                except exceptions.CallRetriesReached:
+                        return reply
+                except exceptions.RPCErrorDoRetry as e:
                     msg = exceptions.decodeRPCErrorMsg(e).strip()
-                    if self.nodes.working_nodes_count > 1:
-                        self._retry_on_next_node(msg)
+                    try:
+                        self.nodes.sleep_and_check_retries(str(msg), call_retry=True)
                         doRetry = True
-                    else:
-                        self.next_node_on_empty_reply = False
-                        raise exceptions.CallRetriesReached
-            except Exception as e:
-                self.next_node_on_empty_reply = False
-                raise e
-            maxRetryCountReached = self.nodes.num_retries_call_reached
-        self.next_node_on_empty_reply = False
-
-    def _retry_on_next_node(self, error_msg):
+                    except exceptions.CallRetriesReached:
+                        if self.nodes.working_nodes_count > 1:
+                            self._retry_on_next_node(msg, failed_url=url)
+                            doRetry = True
+                        else:
+                            self.next_node_on_empty_reply = False
+                            raise exceptions.CallRetriesReached
+                except exceptions.RPCError as e:
+                    try:
+                        doRetry = self._check_error_message(e, self.error_cnt_call)
+                    except exceptions.CallRetriesReached:
+                        msg = exceptions.decodeRPCErrorMsg(e).strip()
+                        if self.nodes.working_nodes_count > 1:
+                            self._retry_on_next_node(msg, failed_url=url)
+                            doRetry = True
+                        else:
+                            self.next_node_on_empty_reply = False
+                            raise exceptions.CallRetriesReached
+                except Exception as e:
+                    self.next_node_on_empty_reply = False
+                    raise e
+                maxRetryCountReached = self.nodes.num_retries_call_reached
+            self.next_node_on_empty_reply = False
+        finally:
+            if started:
+                self.nodes.end_call()
+
+    def _get_batch_error(self, error):
+        """Returns the classified exception for the error of a single request in a batch"""
+        e = exceptions.RPCError(self._get_error_message(error))
+        try:
+            classify_error_message(e)
+        except Exception as classified:
+            return classified
+        return exceptions.RPCErrorDoRetry(self._get_error_message(error))
+
+    def _retry_on_next_node(self, error_msg, failed_url=None):
         self.nodes.increase_error_cnt()
         self.nodes.sleep_and_check_retries(error_msg, sleep=False, call_retry=False)
-        self.next()
+        self.next(failed_url=failed_url)
 
     def _check_error_message(self, e, cnt):
         """Check error message and decide what to do"""
         doRetry = False
         msg = exceptions.decodeRPCErrorMsg(e).strip()
-        if re.search("missing required active authority", msg):
-            raise exceptions.MissingRequiredActiveAuthority
-        elif re.search("missing required active authority", msg):
-            raise exceptions.MissingRequiredActiveAuthority
-        elif re.match("^no method with name.*", msg):
-            raise exceptions.NoMethodWithName(msg)
-        elif re.search("Could not find method", msg):
-            raise exceptions.NoMethodWithName(msg)
-        elif re.search("Could not find API", msg):
-            if self._check_api_name(msg):
-                # self._switch_to_next_node(msg, "ApiNotSupported")
-                raise exceptions.ApiNotSupported(msg)
-            else:
-                raise exceptions.NoApiWithName(msg)
-        elif re.search("irrelevant signature included", msg):
-            raise exceptions.UnnecessarySignatureDetected(msg)
-        elif re.search("WinError", msg):
-            raise exceptions.RPCError(msg)
-        elif re.search("Unable to acquire database lock", msg):
-            self.nodes.sleep_and_check_retries(str(msg), call_retry=True)
-            doRetry = True
-        elif re.search("Request Timeout", msg):
+        action = classify_error_message(e)
+        if action == RETRY_CALL:
             self.nodes.sleep_and_check_retries(str(msg), call_retry=True)
             doRetry = True
-        elif re.search("Bad or missing upstream response", msg):
-            self.nodes.sleep_and_check_retries(str(msg), call_retry=True)
-            doRetry = True
-        elif re.search("Internal Error", msg) or re.search("Unknown exception", msg):
-            self.nodes.sleep_and_check_retries(str(msg), call_retry=True)
-            doRetry = True
-        elif re.search("!check_max_block_age", str(e)):
+        elif action == SWITCH_NODE:
             self._switch_to_next_node(str(e))
             doRetry = True
-        elif re.search("Can only vote once every 3 seconds", msg):
-            raise exceptions.VotedBeforeWaitTimeReached(msg)
-        elif re.search("out_of_rangeEEEE: unknown key", msg) or re.search("unknown key:unknown key", msg):
-            raise exceptions.UnkownKey(msg)
-        # elif re.search("Client returned invalid format. Expected JSON!", msg):
-        #     self._switch_to_next_node(msg)
-        #    doRetry = True
-        elif msg:
-            raise exceptions.UnhandledRPCError(msg)
-        else:
-            raise e
         return doRetry
 
     def _switch_to_next_node(self, msg, error_type="UnhandledRPCError"):
@@ -162,17 +221,7 @@ class MorpheneNodeRPC(GrapheneRPC):
         self.next()
 
     def _check_api_name(self, msg):
-        error_start = "Could not find API"
-        known_apis = ['account_history_api', 'tags_api',
-                      'database_api', 'block_api', 'account_by_key_api',
-                      'chain_api', 'debug_node_api', 'witness_api',
-                      'test_api', 'network_broadcast_api']
-        for api in known_apis:
-            if re.search(error_start + " " + api, msg):
-                return True
-        if msg[-18:] == error_start:
-            return True
-        return False
+        return check_api_name(msg)
 
     def get_account(self, name, **kwargs):
         """ Get full account details from account name
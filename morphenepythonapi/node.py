@@ -7,12 +7,31 @@ from builtins import str
 import json
 import re
 import time
+import random
+import threading
 import logging
+from collections import deque
 from .exceptions import (
-    UnauthorizedError, RPCConnection, RPCError, NumRetriesReached, CallRetriesReached
+    UnauthorizedError, RPCConnection, RPCError, NumRetriesReached, CallRetriesReached, DeadlineExceeded
 )
+from .retry import RetryPolicy
 log = logging.getLogger(__name__)
 
+#: Cycles through the nodes in the given order
+ROUND_ROBIN = "round_robin"
+#: Picks the node with the lowest score
+LOWEST_LATENCY = "lowest_latency"
+#: Picks a random node, the probability is inversely proportional to its score
+WEIGHTED_RANDOM = "weighted_random"
+#: Picks the node with the lower score out of two random nodes
+POWER_OF_TWO = "power_of_two"
+NODE_POLICIES = [ROUND_ROBIN, LOWEST_LATENCY, WEIGHTED_RANDOM, POWER_OF_TWO]
+
+#: Circuit breaker states of a node
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
 
 class Node(object):
     def __init__(
@@ -21,15 +40,69 @@ class Node(object):
     ):
         self.url = url
         self.error_cnt = 0
-        self.error_cnt_call = 0
+        # Exponentially weighted moving averages
+        self.latency = None
+        self.error_rate = 0.
+        self.head_lag = 0.
+        self.head_block_num = None
+        self.calls = 0
+        # Latencies of the most recent calls, for percentiles
+        self.latencies = deque(maxlen=200)
+        # Circuit breaker
+        self.state = CLOSED
+        self.opened_at = None
+        self.open_cnt = 0
+        self.consecutive_errors = 0
 
     def __repr__(self):
         return self.url
 
 
 class Nodes(list):
-    """Stores Node URLs and error counts"""
-    def __init__(self, urls, num_retries, num_retries_call):
+    """ Stores Node URLs, error counts and node statistics
+
+        :param str urls: Either a single Websocket/Http URL, or a list of URLs
+        :param int num_retries: Try x times to num_retries to a node on disconnect, -1 for indefinitely
+        :param int num_retries_call: Repeat num_retries_call times a rpc call on node error
+        :param str policy: Node selection policy, can be ``round_robin`` (default),
+            ``lowest_latency``, ``weighted_random`` or ``power_of_two``
+        :param dict stats: Node statistics from :func:`export_stats` of a previous run
+        :param float ewma_alpha: Weight of a new sample in the moving averages (default is 0.3)
+        :param RetryPolicy retry_policy: Delays between retries and deadlines of the calls
+            (default is a :class:`morphenepythonapi.retry.RetryPolicy` without deadline)
+
+        For every node, the moving averages of the call latency, the error rate
+        and the head block lag behind the other nodes are kept. They are
+        combined to a score (the expected call time in seconds), which is used by
+        all policies except ``round_robin``. Nodes without any sample are tried first.
+
+        Every node has a circuit breaker. After ``breaker_errors`` failed calls in a
+        row, or when the error rate exceeds ``breaker_error_rate``, the breaker opens
+        and the node is skipped by all policies. When a ``probe`` function is set,
+        open nodes are probed from a background thread after ``breaker_timeout``
+        seconds (half-open state) and closed again when the probe succeeds.
+        Without a probe function, the node is tried again by the next call
+        after ``breaker_timeout`` seconds.
+
+        The error count of the current call, its deadline and the ``num_retries_call``
+        override of :func:`set_num_retries_call` are kept per thread, so that threads
+        sharing the nodes do not count each other's retries.
+    """
+    #: Added to the score of a node which fails every call, in multiples of its latency
+    error_penalty = 10.
+    #: Added to the score in seconds per block the node is behind the other nodes
+    head_lag_penalty = 0.1
+    #: Number of calls after which the node is selected again
+    reselect_calls = 100
+    #: Number of failed calls in a row which open the circuit breaker
+    breaker_errors = 3
+    #: Error rate which opens the circuit breaker, after at least 10 calls
+    breaker_error_rate = 0.5
+    #: Seconds before an open node is probed, doubles on every failed probe up to 32 times
+    breaker_timeout = 10.
+
+    def __init__(self, urls, num_retries, num_retries_call, policy=ROUND_ROBIN, stats=None, ewma_alpha=0.3,
+                 retry_policy=None):
         if isinstance(urls, str):
             url_list = re.split(r",|;", urls)
             if url_list is None:
@@ -43,29 +116,270 @@ class Nodes(list):
         else:
             url_list = []
         super(Nodes, self).__init__([Node(x) for x in url_list])
+        if policy not in NODE_POLICIES:
+            raise ValueError("Unknown node policy %s, valid policies are %s" % (policy, str(NODE_POLICIES)))
         self.num_retries = num_retries
-        self.num_retries_call = num_retries_call
+        self._num_retries_call = num_retries_call
+        self._call_state = threading.local()
         self.current_node_index = -1
         self.freeze_current_node = False
+        self.policy = policy
+        self.ewma_alpha = ewma_alpha
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.calls_since_select = 0
+        #: Function which gets a node url and returns True when the node works
+        self.probe = None
+        self._breaker_lock = threading.Lock()
+        self._prober = None
+        if isinstance(urls, Nodes):
+            self.import_stats(urls.export_stats())
+        if stats:
+            self.import_stats(stats)
 
     def __iter__(self):
         return self
 
     def __next__(self):
-        next_node_count = 0
         if self.freeze_current_node:
             return self.url
-        while next_node_count == 0 and (self.num_retries < 0 or self.node.error_cnt < self.num_retries):
-            self.current_node_index += 1
-            if self.current_node_index >= self.working_nodes_count:
-                self.current_node_index = 0
-            next_node_count += 1
-            if next_node_count > self.working_nodes_count + 1:
-                raise StopIteration
+        if len(self) == 0:
+            raise StopIteration
+        if self.policy != ROUND_ROBIN and len(self) > 1:
+            return self._select(exclude_current=self.current_node_index >= 0)
+        index = self.current_node_index
+        for i in range(len(self)):
+            index = (index + 1) % len(self)
+            if self._is_available(self[index]):
+                break
+        else:
+            # All nodes failed, continue with the next one
+            index = (self.current_node_index + 1) % len(self)
+        self.current_node_index = index
         return self.url
 
     next = __next__  # Python 2
 
+    def score(self, node):
+        """Returns the expected call time of the node in seconds, or None without samples"""
+        if node.latency is None:
+            return None
+        return node.latency * (1 + self.error_penalty * node.error_rate) + self.head_lag_penalty * node.head_lag
+
+    def _is_working(self, node):
+        return self.num_retries < 0 or node.error_cnt < self.num_retries
+
+    def _is_available(self, node):
+        if node.state != CLOSED and (self.probe is not None or self.breaker_wait_time(node) > 0):
+            return False
+        return self._is_working(node)
+
+    @property
+    def available_nodes_count(self):
+        """Number of working nodes with a closed circuit breaker"""
+        return len([n for n in self[:] if self._is_available(n)])
+
+    def _select(self, exclude_current=False):
+        candidates = [i for i in range(len(self)) if self._is_available(self[i])]
+        if len(candidates) == 0:
+            candidates = [i for i in range(len(self)) if self._is_working(self[i])]
+        if len(candidates) == 0:
+            candidates = list(range(len(self)))
+        if exclude_current and len(candidates) > 1 and self.current_node_index in candidates:
+            candidates.remove(self.current_node_index)
+        scores = dict((i, self.score(self[i])) for i in candidates)
+        if self.policy == LOWEST_LATENCY:
+            unmeasured = [i for i in candidates if scores[i] is None]
+            if len(unmeasured) > 0:
+                index = unmeasured[0]
+            else:
+                index = min(candidates, key=lambda i: scores[i])
+        elif self.policy == WEIGHTED_RANDOM:
+            weights = dict((i, 1. / max(scores[i], 1e-3)) for i in candidates if scores[i] is not None)
+            max_weight = max(list(weights.values()) or [1.])
+            total = sum(weights.get(i, max_weight) for i in candidates)
+            r = random.random() * total
+            index = candidates[-1]
+            for i in candidates:
+                r -= weights.get(i, max_weight)
+                if r < 0:
+                    index = i
+                    break
+        else:
+            pair = random.sample(candidates, min(2, len(candidates)))
+            index = min(pair, key=lambda i: scores[i] or 0.)
+        self.current_node_index = index
+        self.calls_since_select = 0
+        return self.url
+
+    def select(self):
+        """Selects a node with the current policy, the current node may be kept"""
+        if self.policy == ROUND_ROBIN or self.freeze_current_node or len(self) < 2:
+            self.calls_since_select = 0
+            return self.url
+        return self._select()
+
+    @property
+    def needs_reselect(self):
+        """True when reselect_calls calls were done since the last selection"""
+        return (self.policy != ROUND_ROBIN and not self.freeze_current_node and len(self) > 1 and
+                self.calls_since_select >= self.reselect_calls)
+
+    def record_call(self, latency=None, error=False, node=None):
+        """ Adds a call to the moving averages of a node
+
+            :param float latency: Duration of the call in seconds
+            :param bool error: True when the call failed
+            :param Node node: Node which answered, the current node when None
+        """
+        if node is None:
+            node = self.node
+        if node is None:
+            return
+        alpha = self.ewma_alpha
+        node.calls += 1
+        self.calls_since_select += 1
+        node.error_rate = alpha * (1. if error else 0.) + (1 - alpha) * node.error_rate
+        if latency is not None and not error:
+            node.latencies.append(latency)
+            if node.latency is None:
+                node.latency = latency
+            else:
+                node.latency = alpha * latency + (1 - alpha) * node.latency
+        if error:
+            node.consecutive_errors += 1
+            if node.state == CLOSED and (node.consecutive_errors >= self.breaker_errors or
+                                         (node.calls >= 10 and node.error_rate > self.breaker_error_rate)):
+                self.open_breaker(node)
+        else:
+            node.consecutive_errors = 0
+            if node.state != CLOSED:
+                self.close_breaker(node)
+
+    def latency_percentile(self, percentile=95, node=None, min_samples=10):
+        """ Returns the latency percentile of the recent calls of a node in seconds,
+            or None when less than min_samples calls were recorded
+
+            :param float percentile: Percentile between 0 and 100 (default is 95)
+            :param Node node: Node, the current node when None
+        """
+        if node is None:
+            node = self.node
+        if node is None or len(node.latencies) < max(1, min_samples):
+            return None
+        latencies = sorted(node.latencies)
+        index = int(round((len(latencies) - 1) * percentile / 100.))
+        return latencies[index]
+
+    def alternative(self):
+        """Returns the working node with the best score other than the current one, or None"""
+        current = self.node
+        candidates = [n for n in self[:] if n is not current and self._is_available(n)]
+        if len(candidates) == 0:
+            return None
+        unmeasured = [n for n in candidates if n.latency is None]
+        if len(unmeasured) > 0:
+            return unmeasured[0]
+        return min(candidates, key=self.score)
+
+    def open_breaker(self, node):
+        """Opens the circuit breaker of the node and starts probing it in the background"""
+        with self._breaker_lock:
+            if node.state != OPEN:
+                node.open_cnt += 1
+            node.state = OPEN
+            node.opened_at = time.time()
+        log.warning("Node %s is skipped for now, as its calls are failing" % node.url)
+        self._start_prober()
+
+    def close_breaker(self, node):
+        """Closes the circuit breaker of the node and resets its error counts"""
+        with self._breaker_lock:
+            node.state = CLOSED
+            node.opened_at = None
+            node.open_cnt = 0
+            node.consecutive_errors = 0
+            node.error_cnt = 0
+            node.error_rate = 0.
+
+    def breaker_wait_time(self, node):
+        """Returns the seconds until the open node is probed the next time"""
+        if node.state != OPEN:
+            return 0
+        timeout = self.breaker_timeout * 2 ** min(node.open_cnt - 1, 5)
+        return max(0, node.opened_at + timeout - time.time())
+
+    def probe_open_nodes(self):
+        """ Probes all open nodes which waited long enough, using the probe function.
+            Returns the number of nodes which are still open.
+        """
+        for node in self[:]:
+            if node.state != OPEN or self.breaker_wait_time(node) > 0:
+                continue
+            with self._breaker_lock:
+                node.state = HALF_OPEN
+            try:
+                ok = bool(self.probe(node.url))
+            except Exception as e:
+                log.debug("Probe of %s failed: %s" % (node.url, str(e)))
+                ok = False
+            if ok:
+                log.info("Node %s works again" % node.url)
+                self.close_breaker(node)
+            else:
+                self.open_breaker(node)
+        return len([n for n in self[:] if n.state != CLOSED])
+
+    def _start_prober(self):
+        if self.probe is None:
+            return
+        with self._breaker_lock:
+            if self._prober is not None and self._prober.is_alive():
+                return
+            self._prober = threading.Thread(target=self._probe_loop, name="node-prober")
+            self._prober.daemon = True
+            self._prober.start()
+
+    def _probe_loop(self):
+        while self.probe is not None:
+            if self.probe_open_nodes() == 0:
+                return
+            wait_times = [self.breaker_wait_time(n) for n in self[:] if n.state == OPEN]
+            time.sleep(min(wait_times + [self.breaker_timeout]) + 0.01)
+
+    def record_head_block(self, head_block_num, node=None):
+        """ Adds the head block number reported by a node to its head block lag
+
+            :param int head_block_num: Head block number of the node
+            :param Node node: Node which answered, the current node when None
+        """
+        if node is None:
+            node = self.node
+        if node is None:
+            return
+        node.head_block_num = int(head_block_num)
+        best_head_block_num = max(n.head_block_num for n in self[:] if n.head_block_num is not None)
+        lag = best_head_block_num - node.head_block_num
+        node.head_lag = self.ewma_alpha * lag + (1 - self.ewma_alpha) * node.head_lag
+
+    def export_stats(self):
+        """Returns the node statistics as dict by url, which can be stored as json"""
+        stats = {}
+        for node in self[:]:
+            stats[node.url] = {"latency": node.latency, "error_rate": node.error_rate,
+                               "head_lag": node.head_lag, "calls": node.calls}
+        return stats
+
+    def import_stats(self, stats):
+        """Restores node statistics from :func:`export_stats`, unknown urls are ignored"""
+        for node in self[:]:
+            if node.url not in stats:
+                continue
+            s = stats[node.url]
+            node.latency = s.get("latency")
+            node.error_rate = s.get("error_rate", 0.)
+            node.head_lag = s.get("head_lag", 0.)
+            node.calls = s.get("calls", 0)
+
     def export_working_nodes(self):
         nodes_list = []
         for i in range(len(self)):
@@ -112,9 +426,28 @@ class Nodes(list):
 
     @property
     def error_cnt_call(self):
-        if self.node is None:
-            return 0
-        return self.node.error_cnt_call
+        return getattr(self._call_state, "error_cnt_call", 0)
+
+    @property
+    def num_retries_call(self):
+        return getattr(self._call_state, "num_retries_call", self._num_retries_call)
+
+    @num_retries_call.setter
+    def num_retries_call(self, num_retries_call):
+        self._num_retries_call = num_retries_call
+
+    def set_num_retries_call(self, num_retries_call=None):
+        """ Overrides num_retries_call for the calls of the current thread and
+            returns the previous override
+
+            :param int num_retries_call: Number of retries, None removes the override
+        """
+        previous = getattr(self._call_state, "num_retries_call", None)
+        if num_retries_call is None:
+            self._call_state.__dict__.pop("num_retries_call", None)
+        else:
+            self._call_state.num_retries_call = num_retries_call
+        return previous
 
     @property
     def num_retries_call_reached(self):
@@ -126,28 +459,99 @@ class Nodes(list):
             self.node.error_cnt += 1
 
     def increase_error_cnt_call(self):
-        """Increase call error count for current node"""
-        if self.node is not None:
-            self.node.error_cnt_call += 1
+        """Increase call error count of the current thread"""
+        self._call_state.error_cnt_call = self.error_cnt_call + 1
 
     def reset_error_cnt_call(self):
-        """Set call error count for current node to zero"""
-        if self.node is not None:
-            self.node.error_cnt_call = 0
+        """Set call error count of the current thread to zero"""
+        self._call_state.error_cnt_call = 0
 
     def reset_error_cnt(self):
         """Set node error count for current node to zero"""
         if self.node is not None:
             self.node.error_cnt = 0
 
+    def retry_delay(self, cnt):
+        """Returns the time in seconds to wait before the cnt-th retry, see :class:`RetryPolicy`"""
+        return self.retry_policy.delay(cnt)
+
+    @property
+    def in_call(self):
+        """True, when the current thread is within a call, see :func:`start_call`"""
+        return getattr(self._call_state, "in_call", False)
+
+    def start_call(self, payload=None):
+        """ Starts the deadline of a call of the current thread. Returns False, without
+            changing the deadline, when the thread is within a call already.
+
+            :param payload: Query or batch of the call, selects the deadline of its method
+        """
+        if getattr(self._call_state, "in_call", False):
+            return False
+        self._call_state.in_call = True
+        deadline = self.retry_policy.get_deadline(payload)
+        self._call_state.deadline = time.time() + deadline if deadline is not None else None
+        return True
+
+    @property
+    def deadline(self):
+        """Time of the deadline of the current call of this thread, or None"""
+        return getattr(self._call_state, "deadline", None)
+
+    def join_call(self, deadline):
+        """ Starts a call of the current thread with the deadline of a call of another
+            thread, e.g. for a request which a helper thread sends on its behalf.
+            The call is ended by :func:`end_call`.
+
+            :param float deadline: Time of the deadline, or None
+        """
+        self._call_state.in_call = True
+        self._call_state.deadline = deadline
+
+    def end_call(self):
+        """Ends the call of the current thread, which was started by :func:`start_call`"""
+        self._call_state.in_call = False
+        self._call_state.deadline = None
+
+    @property
+    def remaining_time(self):
+        """Seconds until the deadline of the current call of this thread, or None without deadline"""
+        deadline = getattr(self._call_state, "deadline", None)
+        if deadline is None:
+            return None
+        return deadline - time.time()
+
+    def check_deadline(self):
+        """Raises DeadlineExceeded when the deadline of the current call has passed"""
+        remaining = self.remaining_time
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceeded("Deadline of the call on node %s exceeded" % self.url)
+
+    def get_timeout(self, timeout):
+        """ Returns the timeout for the next request of the current call, which
+            is timeout or the remaining time until the deadline, when that is shorter
+        """
+        self.check_deadline()
+        remaining = self.remaining_time
+        if remaining is None:
+            return timeout
+        elif timeout is None:
+            return remaining
+        return min(timeout, remaining)
+
     def sleep_and_check_retries(self, errorMsg=None, sleep=True, call_retry=False, showMsg=True):
         """Sleep and check if num_retries is reached"""
         if errorMsg:
             log.warning("Error: {}".format(errorMsg))
+        self.check_deadline()
+        fail_over = self.node is not None and self.node.state != CLOSED and self.available_nodes_count > 0
         if call_retry:
             cnt = self.error_cnt_call
             if (self.num_retries_call >= 0 and self.error_cnt_call > self.num_retries_call):
                 raise CallRetriesReached()
+            elif fail_over:
+                # Switch to another node instead of retrying on a failing one
+                raise CallRetriesReached()
         else:
             cnt = self.error_cnt
             if (self.num_retries >= 0 and self.error_cnt > self.num_retries):
@@ -158,14 +562,12 @@ class Nodes(list):
                 log.warning("Retry RPC Call on node: %s (%d/%d) \n" % (self.url, cnt, self.num_retries_call))
             else:
                 log.warning("Lost connection or internal error on node: %s (%d/%d) \n" % (self.url, cnt, self.num_retries))
-        if not sleep:
+        if not sleep or fail_over:
             return
-        if cnt < 1:
-            sleeptime = 0
-        elif cnt < 10:
-            sleeptime = (cnt - 1) * 1.5 + 0.5
-        else:
-            sleeptime = 10
-        if sleeptime:
-            log.warning("Retrying in %d seconds\n" % sleeptime)
+        sleeptime = self.retry_delay(cnt)
+        remaining = self.remaining_time
+        if remaining is not None:
+            sleeptime = min(sleeptime, remaining)
+        if sleeptime > 0:
+            log.warning("Retrying in %.1f seconds\n" % sleeptime)
             time.sleep(sleeptime)
@@ -0,0 +1,127 @@
+"""Priority classes of rpc calls."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from builtins import object
+from contextlib import contextmanager
+import threading
+from . import rpcutils
+
+#: Latency critical calls, e.g. broadcasts, use reserved connections and nodes
+CRITICAL = "critical"
+#: Default class
+NORMAL = "normal"
+#: Bulk reads, e.g. block scans, are limited to a share of the connections
+BULK = "bulk"
+PRIORITIES = [CRITICAL, NORMAL, BULK]
+
+#: Methods which are critical, when their call has no explicit priority
+CRITICAL_METHODS = [
+    "broadcast_transaction", "broadcast_transaction_synchronous", "broadcast_block", "verify_authority",
+]
+
+#: Share of the connections which bulk calls may use at the same time, so that the
+#: other calls keep their headroom during block scans
+DEFAULT_BULK_SHARE = 0.5
+
+#: Number of connections which bulk_share refers to, when the client has no pool_size,
+#: i.e. the pool size of the shared requests session
+DEFAULT_CAPACITY = 10
+
+
+class PriorityLanes(object):
+    """ Keeps the priority of the calls of every thread and limits the number
+        of bulk requests which are sent at the same time.
+
+        :param int max_bulk_requests: Maximum number of bulk requests in flight,
+            None for no limit (default is None)
+        :param list critical_methods: Methods which are critical, when no priority
+            is set (default is ``CRITICAL_METHODS``)
+
+        .. code-block:: python
+
+            from morphenepythonapi.priority import PriorityLanes, BULK
+            lanes = PriorityLanes(max_bulk_requests=6)
+            with lanes.use(BULK):
+                with lanes.slot():
+                    reply = send(payload)
+
+    """
+    def __init__(self, max_bulk_requests=None, critical_methods=None):
+        self.critical_methods = set(CRITICAL_METHODS if critical_methods is None else critical_methods)
+        self.set_max_bulk_requests(max_bulk_requests)
+        self._state = threading.local()
+
+    def set_max_bulk_requests(self, max_bulk_requests):
+        """ Changes the maximum number of bulk requests in flight. Requests which
+            are in flight keep their slot.
+
+            :param int max_bulk_requests: Maximum number, None for no limit
+        """
+        self.max_bulk_requests = max_bulk_requests
+        if max_bulk_requests is None:
+            self._bulk_slots = None
+        else:
+            self._bulk_slots = threading.BoundedSemaphore(max(1, max_bulk_requests))
+
+    @property
+    def priority(self):
+        """Priority which is set for the current thread, or None"""
+        return getattr(self._state, "priority", None)
+
+    def set_priority(self, priority=None):
+        """ Sets the priority of the following calls of the current thread and
+            returns the previous one
+
+            :param str priority: ``critical``, ``normal``, ``bulk`` or None to remove it
+        """
+        if priority is not None and priority not in PRIORITIES:
+            raise ValueError("Unknown priority %s, valid priorities are %s" % (priority, str(PRIORITIES)))
+        previous = self.priority
+        self._state.priority = priority
+        return previous
+
+    @contextmanager
+    def use(self, priority):
+        """Sets the priority of the calls of the current thread within the ``with`` block"""
+        previous = self.set_priority(priority)
+        try:
+            yield
+        finally:
+            self._state.priority = previous
+
+    def get_priority(self, payload=None):
+        """ Returns the priority of a call: the one of the current thread, when set,
+            otherwise ``critical`` for the critical methods and ``normal`` for all others
+
+            :param payload: Query, batch (list) of queries or method name of the call
+        """
+        if self.priority is not None:
+            return self.priority
+        if payload is None:
+            return NORMAL
+        if isinstance(payload, (list, dict)):
+            queries = payload if isinstance(payload, list) else [payload]
+            try:
+                methods = [rpcutils.get_method_name(query) for query in queries]
+            except (KeyError, IndexError, TypeError):
+                return NORMAL
+        else:
+            methods = [payload]
+        if methods and all(method in self.critical_methods for method in methods):
+            return CRITICAL
+        return NORMAL
+
+    @contextmanager
+    def slot(self):
+        """Waits for a free bulk slot within the ``with`` block, when the current call is a bulk call"""
+        bulk_slots = self._bulk_slots
+        if bulk_slots is None or self.priority != BULK:
+            yield
+            return
+        bulk_slots.acquire()
+        try:
+            yield
+        finally:
+            bulk_slots.release()
@@ -0,0 +1,112 @@
+"""Client side rate limits."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from builtins import object
+import threading
+import time
+import logging
+
+log = logging.getLogger(__name__)
+
+
+class AdaptiveRateLimiter(object):
+    """ Token bucket which limits the requests per second to a single node.
+        The allowed rate adapts additive-increase/multiplicative-decrease (AIMD):
+        every successful request raises the rate by ``additive_increase / rate``
+        (about ``additive_increase`` per second at full rate), a throttled
+        request (429/503) multiplies it by ``multiplicative_decrease``.
+
+        :param float rate: Initial rate in requests per second (default is ``initial_rate``)
+
+        The class attributes are used as defaults for all limiters.
+    """
+    initial_rate = 20.
+    min_rate = 1.
+    max_rate = 500.
+    additive_increase = 1.
+    multiplicative_decrease = 0.5
+    #: Maximum number of tokens, in seconds at the current rate
+    burst_seconds = 1.
+    #: Throttled requests within this time (in seconds) decrease the rate only once
+    decrease_cooldown = 1.
+
+    def __init__(self, rate=None):
+        self.rate = float(rate or self.initial_rate)
+        self.tokens = self.burst
+        self.last_refill = time.time()
+        self.last_decrease = 0.
+        self.blocked_until = 0.
+        self.lock = threading.Lock()
+
+    @property
+    def burst(self):
+        return max(1., self.rate * self.burst_seconds)
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def acquire(self):
+        """Waits until the next request may be sent, returns the waiting time in seconds"""
+        with self.lock:
+            now = time.time()
+            self._refill(now)
+            self.tokens -= 1
+            wait = max(0., self.blocked_until - now)
+            if self.tokens < 0:
+                wait = max(wait, -self.tokens / self.rate)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def increase(self):
+        """Raises the rate after a successful request"""
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.additive_increase / self.rate)
+
+    def decrease(self, retry_after=None):
+        """ Lowers the rate after a throttled request
+
+            :param float retry_after: Seconds to wait before the next request, from the
+                ``Retry-After`` header
+        """
+        with self.lock:
+            now = time.time()
+            if now - self.last_decrease >= self.decrease_cooldown:
+                self.rate = max(self.min_rate, self.rate * self.multiplicative_decrease)
+                self.last_decrease = now
+                self._refill(now)
+                self.tokens = min(self.tokens, 0.)
+            if retry_after is not None:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+        log.debug("Request was throttled, rate is now %.1f/s" % self.rate)
+
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(url):
+    """Returns the rate limiter of the node, which is shared by all clients of the process"""
+    with _rate_limiters_lock:
+        if url not in _rate_limiters:
+            _rate_limiters[url] = AdaptiveRateLimiter()
+        return _rate_limiters[url]
+
+
+def get_rates():
+    """Returns the currently allowed rate in requests per second by node url"""
+    with _rate_limiters_lock:
+        return dict((url, limiter.rate) for url, limiter in _rate_limiters.items())
+
+
+def parse_retry_after(value):
+    """Returns the seconds of a ``Retry-After`` header, or None when it is missing or a date"""
+    if value is None:
+        return None
+    try:
+        return max(0., float(value))
+    except ValueError:
+        return None
@@ -0,0 +1,75 @@
+"""Retry delays and deadlines of rpc calls."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from builtins import object
+import random
+from . import rpcutils
+
+
+class RetryPolicy(object):
+    """ Decides how long to wait before a retry and how long a call may take in total.
+
+        The delay before the cnt-th retry is drawn uniformly between 0 and
+        ``min(max_delay, base_delay * multiplier ** (cnt - 1))`` ("full jitter"), so that
+        clients which failed at the same time do not retry at the same time.
+
+        The deadline of a call covers all its retries, node switches and reconnects.
+        Requests are sent with a timeout of at most the remaining time, and
+        :class:`morphenepythonapi.exceptions.DeadlineExceeded` is raised when it is used up.
+
+        :param float base_delay: Upper bound of the first delay in seconds (default is 0.5)
+        :param float max_delay: Upper bound of all delays in seconds (default is 10)
+        :param float multiplier: Growth of the upper bound with every retry (default is 2)
+        :param bool jitter: When False, the upper bound itself is used as delay (default is True)
+        :param float deadline: Seconds which a call may take, None for no limit (default is None)
+        :param dict method_deadlines: Deadlines by method name, which override ``deadline``,
+            e.g. ``{"get_dynamic_global_properties": 2, "get_account_history": 30}``.
+            A batch uses the deadline of its method, when all its requests have the same one.
+
+        .. code-block:: python
+
+            from morphenepythonapi.retry import RetryPolicy
+            from morphenepythonapi.morphenenoderpc import MorpheneNodeRPC
+            policy = RetryPolicy(deadline=10, method_deadlines={"get_dynamic_global_properties": 2})
+            rpc = MorpheneNodeRPC("https://morphene.io/rpc", num_retries=-1, retry_policy=policy)
+
+    """
+    def __init__(self, base_delay=0.5, max_delay=10., multiplier=2., jitter=True,
+                 deadline=None, method_deadlines=None):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.deadline = deadline
+        self.method_deadlines = dict(method_deadlines or {})
+        self.random = random.Random()
+
+    def delay(self, cnt):
+        """Returns the time in seconds to wait before the cnt-th retry"""
+        if cnt < 1:
+            return 0
+        # Avoids an overflow of the power for large counts
+        bound = self.max_delay
+        if cnt < 64:
+            bound = min(self.max_delay, self.base_delay * self.multiplier ** (cnt - 1))
+        if not self.jitter:
+            return bound
+        return self.random.uniform(0, bound)
+
+    def get_deadline(self, payload=None):
+        """ Returns the seconds which a call may take, or None without limit
+
+            :param payload: Query or batch (list) of queries of the call
+        """
+        if not self.method_deadlines or not payload:
+            return self.deadline
+        queries = payload if isinstance(payload, list) else [payload]
+        try:
+            methods = set(rpcutils.get_method_name(query) for query in queries)
+        except (KeyError, IndexError, TypeError):
+            return self.deadline
+        if len(methods) != 1:
+            return self.deadline
+        return self.method_deadlines.get(methods.pop(), self.deadline)
@@ -0,0 +1,291 @@
+"""JSON-RPC batches."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from builtins import object
+from collections import deque
+import threading
+import time
+import logging
+from .exceptions import RPCError, TimeoutException
+from .batchsize import AdaptiveBatchSize
+from .rpcutils import get_api_name, get_query
+from . import jsoncodec
+try:
+    from queue import Queue, Empty
+except ImportError:
+    from Queue import Queue, Empty
+
+log = logging.getLogger(__name__)
+
+
+class RPCFuture(object):
+    """ Result of a single call inside a :class:`RPCBatch`
+
+        :param RPCBatch batch: Batch which sends the call
+        :param query: JSON-RPC request (or list of requests) of the call
+    """
+    def __init__(self, batch, query):
+        self.batch = batch
+        self.query = query
+        self._event = threading.Event()
+        self._result = None
+        self._exception = None
+
+    @property
+    def request_ids(self):
+        if isinstance(self.query, list):
+            return [q["id"] for q in self.query]
+        return [self.query["id"]]
+
+    def done(self):
+        """Returns True when the call has a result or an error"""
+        return self._event.is_set()
+
+    def set_result(self, result):
+        self._result = result
+        self._event.set()
+
+    def set_exception(self, exception):
+        self._exception = exception
+        self._event.set()
+
+    def exception(self, timeout=None):
+        """ Returns the error of the call, or None when it succeeded.
+            Sends the batch when it was not sent yet.
+        """
+        if not self.done() and not self.batch.executed:
+            self.batch.execute()
+        if not self._event.wait(timeout):
+            raise TimeoutException("No result received within %s s" % str(timeout))
+        return self._exception
+
+    def result(self, timeout=None):
+        """ Returns the result of the call and raises its error, when the
+            node returned one. Sends the batch when it was not sent yet.
+        """
+        exception = self.exception(timeout=timeout)
+        if exception is not None:
+            raise exception
+        return self._result
+
+    def __repr__(self):
+        if not self.done():
+            state = "pending"
+        elif self._exception is not None:
+            state = "error"
+        else:
+            state = "finished"
+        return "<%s %s %s>" % (self.__class__.__name__, str(self.request_ids[0]), state)
+
+
+class RPCBatch(object):
+    """ Collects calls and sends them as JSON-RPC batches
+
+        :param GrapheneRPC rpc: rpc instance which sends the batches
+        :param max_batch_size: Maximum number of requests in a single batch (default is 100), or
+            a :class:`morphenepythonapi.batchsize.AdaptiveBatchSize`, which sets the size of
+            every batch from the latency, size and errors of the previous ones
+        :param int max_payload_bytes: Maximum size of the encoded batch in bytes,
+            no limit when set to None (default is None)
+        :param int max_workers: Maximum number of batches which are sent
+            at the same time (default is 4)
+
+        All api methods can be called on the batch, each call returns a
+        :class:`RPCFuture`. The collected calls are split into batches of at
+        most ``max_batch_size`` requests and ``max_payload_bytes`` bytes when
+        the ``with`` block is left (or :func:`execute` is called), the
+        batches are sent concurrently, with the priority of the thread which
+        executes the batch. Errors of single requests are only raised by the
+        ``result()`` of their future. With an adaptive batch size, the next
+        batch is taken from the remaining calls when a worker is free.
+
+        .. code-block:: python
+
+            from morphenepythonapi.morphenenoderpc import MorpheneNodeRPC
+            rpc = MorpheneNodeRPC("https://morphene.io/rpc")
+            with rpc.batch(max_batch_size=50) as batch:
+                futures = [batch.get_block(n) for n in range(1, 201)]
+            blocks = [f.result() for f in futures]
+
+    """
+    def __init__(self, rpc, max_batch_size=100, max_payload_bytes=None, max_workers=4):
+        self.adaptive_batch_size = None
+        if isinstance(max_batch_size, AdaptiveBatchSize):
+            self.adaptive_batch_size = max_batch_size
+            max_batch_size = max_batch_size.max_size
+        if max_batch_size is not None and max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.rpc = rpc
+        self.max_batch_size = max_batch_size
+        self.max_payload_bytes = max_payload_bytes
+        self.max_workers = max(1, max_workers)
+        self.futures = []
+        self.executed = False
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.execute()
+
+    def __len__(self):
+        return len(self.futures)
+
+    def __getattr__(self, name):
+        """Map all methods to batched RPC calls and pass through the arguments."""
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def method(*args, **kwargs):
+            if self.executed:
+                raise RPCError("The batch was already sent!")
+            api_name = get_api_name(*args, **kwargs)
+            count = 1
+            if len(args) > 0 and isinstance(args[0], list):
+                count = max(1, len(args[0]))
+            query = get_query(self.rpc.get_request_id(count), api_name, name, args)
+            future = RPCFuture(self, query)
+            self.futures.append(future)
+            return future
+        return method
+
+    def split(self):
+        """ Returns the collected futures as list of batches, which stay
+            below max_batch_size requests and max_payload_bytes bytes
+        """
+        batches = []
+        pending = deque(self.futures)
+        while pending:
+            batches.append(self._take(pending, self.max_batch_size))
+        return batches
+
+    def _take(self, pending, max_batch_size):
+        """Removes the futures of the next batch from the start of pending and returns them"""
+        batch = []
+        batch_size = 0
+        batch_bytes = 2
+        while pending:
+            future = pending[0]
+            size = len(future.request_ids)
+            nbytes = 0
+            if self.max_payload_bytes is not None:
+                nbytes = len(jsoncodec.dumpb(future.query)) + 1
+            if batch and ((max_batch_size is not None and batch_size + size > max_batch_size) or
+                          (self.max_payload_bytes is not None and batch_bytes + nbytes > self.max_payload_bytes)):
+                break
+            batch.append(pending.popleft())
+            batch_size += size
+            batch_bytes += nbytes
+        return batch
+
+    def execute(self):
+        """Sends all collected calls, returns the list of futures"""
+        with self.lock:
+            if self.executed:
+                return self.futures
+            self.executed = True
+            if self.adaptive_batch_size is not None:
+                return self._execute_adaptive()
+            batches = self.split()
+            if len(batches) <= 1 or self.max_workers == 1:
+                for batch in batches:
+                    self._send(batch)
+                return self.futures
+            queue = Queue()
+            for batch in batches:
+                queue.put(batch)
+            priority = self.rpc.lanes.priority
+            workers = []
+            for i in range(min(self.max_workers, len(batches))):
+                worker = threading.Thread(target=self._work, args=(queue, priority), name="rpc-batch-%d" % i)
+                worker.daemon = True
+                worker.start()
+                workers.append(worker)
+            for worker in workers:
+                worker.join()
+        return self.futures
+
+    def _execute_adaptive(self):
+        """Sends the calls in batches of the current adaptive size, until none are left"""
+        pending = deque(self.futures)
+        pending_lock = threading.Lock()
+
+        def next_batch():
+            with pending_lock:
+                return self._take(pending, self.adaptive_batch_size.size)
+
+        def work(priority):
+            with self.rpc.lanes.use(priority):
+                while True:
+                    batch = next_batch()
+                    if not batch:
+                        return
+                    self._send(batch)
+        size = self.adaptive_batch_size.size
+        num_workers = min(self.max_workers, (len(self.futures) + size - 1) // size)
+        if num_workers <= 1:
+            work(self.rpc.lanes.priority)
+            return self.futures
+        workers = []
+        for i in range(num_workers):
+            worker = threading.Thread(target=work, args=(self.rpc.lanes.priority, ), name="rpc-batch-%d" % i)
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+        for worker in workers:
+            worker.join()
+        return self.futures
+
+    def _work(self, queue, priority=None):
+        with self.rpc.lanes.use(priority):
+            while True:
+                try:
+                    batch = queue.get_nowait()
+                except Empty:
+                    return
+                self._send(batch)
+
+    def _send(self, batch):
+        """Sends a single batch and hands every reply to its future"""
+        payload = []
+        for future in batch:
+            if isinstance(future.query, list):
+                payload.extend(future.query)
+            else:
+                payload.append(future.query)
+        start = time.time()
+        try:
+            replies = self.rpc.rpcexec(payload, collect_errors=True)
+        except Exception as e:
+            if self.adaptive_batch_size is not None:
+                self.adaptive_batch_size.observe(len(payload), time.time() - start, error=True)
+            for future in batch:
+                future.set_exception(e)
+            return
+        if self.adaptive_batch_size is not None:
+            missing = any(query["id"] not in replies for query in payload)
+            self.adaptive_batch_size.observe(len(payload), time.time() - start,
+                                             response_bytes=self.rpc.last_reply_bytes, error=missing)
+        for future in batch:
+            results = []
+            exception = None
+            for request_id in future.request_ids:
+                reply = replies.get(request_id)
+                if reply is None:
+                    exception = RPCError("Received no reply for request %s" % str(request_id))
+                elif "error" in reply:
+                    exception = self.rpc._get_batch_error(reply["error"])
+                else:
+                    results.append(reply.get("result"))
+                if exception is not None:
+                    break
+            if exception is not None:
+                future.set_exception(exception)
+            elif isinstance(future.query, list):
+                future.set_result(results)
+            else:
+                future.set_result(results[0])
@@ -4,7 +4,6 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 import time
-import json
 import logging
 from .exceptions import (
     UnauthorizedError, RPCConnection, RPCError, NumRetriesReached, CallRetriesReached
@@ -16,8 +15,10 @@ log = logging.getLogger(__name__)
 
 def get_query(request_id, api_name, name, args):
     query = []
-    args = json.loads(json.dumps(args))
-    # print(args)
+    # The arguments are encoded together with the query, a copy is not needed
+    args = list(args)
+    if len(args) > 0 and isinstance(args[0], tuple):
+        args[0] = list(args[0])
     if len(args) > 0 and isinstance(args, list) and isinstance(args[0], dict):
         query = {"method": api_name + "." + name,
                  "params": args[0],
@@ -54,3 +55,12 @@ def get_api_name(*args, **kwargs):
     else:
         api_name = None
     return api_name
+
+
+def get_method_name(query):
+    """ Returns the method name of a query without the api name,
+        e.g. ``get_block`` for both ``call`` and ``block_api.get_block`` queries
+    """
+    if query["method"] == "call":
+        return query["params"][1]
+    return query["method"].split(".")[-1]
@@ -0,0 +1,105 @@
+"""Coalescing of identical rpc calls."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from builtins import object
+from collections import OrderedDict
+import copy
+import threading
+import time
+
+
+class _Flight(object):
+    """A call which is currently executed"""
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight(object):
+    """ Lets identical calls, which are executed at the same time, share a single
+        execution. All callers receive the same result (each one its own copy) or
+        the same exception.
+
+        :param dict cache_ttl: Seconds for which the result of a method is reused
+            by later calls, by method name, e.g. ``{"get_dynamic_global_properties": 0.5}``
+            (default is no caching)
+        :param int max_cache_entries: Maximum number of cached results (default is 1000)
+
+        .. code-block:: python
+
+            from morphenepythonapi.singleflight import SingleFlight
+            single_flight = SingleFlight()
+            props = single_flight.do(("get_config", "[]"), "get_config", lambda: rpc.get_config())
+
+    """
+    def __init__(self, cache_ttl=None, max_cache_entries=1000):
+        self.cache_ttl = dict(cache_ttl or {})
+        self.max_cache_entries = max_cache_entries
+        self.lock = threading.Lock()
+        self.flights = {}
+        self.cache = OrderedDict()
+        self.stats = {"calls": 0, "coalesced": 0, "cache_hits": 0}
+
+    def clear_cache(self):
+        with self.lock:
+            self.cache.clear()
+
+    def _store(self, key, result, ttl):
+        now = time.time()
+        self.cache.pop(key, None)
+        self.cache[key] = (copy.deepcopy(result), now + ttl)
+        if len(self.cache) > self.max_cache_entries:
+            for k in [k for k, v in self.cache.items() if v[1] <= now]:
+                del self.cache[k]
+        while len(self.cache) > self.max_cache_entries:
+            self.cache.popitem(last=False)
+
+    def do(self, key, method, func):
+        """ Executes func, unless a call with the same key is running already,
+            whose result is returned instead.
+
+            :param key: Hashable key, which is equal for identical calls
+            :param str method: Method name, used for looking up the cache ttl
+            :param func: Function without arguments, which executes the call
+        """
+        ttl = self.cache_ttl.get(method)
+        with self.lock:
+            self.stats["calls"] += 1
+            if ttl:
+                cached = self.cache.get(key)
+                if cached is not None and cached[1] > time.time():
+                    self.stats["cache_hits"] += 1
+                    return copy.deepcopy(cached[0])
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self.flights[key] = flight
+            else:
+                flight.waiters += 1
+                self.stats["coalesced"] += 1
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.result)
+        try:
+            flight.result = func()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+                waiters = flight.waiters
+                if ttl and flight.error is None:
+                    self._store(key, flight.result, ttl)
+            flight.event.set()
+        if waiters > 0:
+            # The other callers copy the result at the same time
+            return copy.deepcopy(flight.result)
+        return flight.result
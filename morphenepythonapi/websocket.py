@@ -8,7 +8,6 @@ import traceback
 import threading
 import ssl
 import time
-import json
 import logging
 import websocket
 from itertools import cycle
@@ -18,6 +17,7 @@ from morphenepythonapi.rpcutils import (
     RPCConnection, RPCError, NumRetriesReached
 )
 from morphenepythonapi.node import Nodes
+from morphenepythonapi import jsoncodec
 from events import Events
 
 log = logging.getLogger(__name__)
@@ -167,7 +167,7 @@ class MorpheneWebsocket(Events):
         log.debug("Received message: %s" % str(reply))
         data = {}
         try:
-            data = json.loads(reply, strict=False)
+            data = jsoncodec.loads(reply)
         except ValueError:
             raise ValueError("API node returned invalid format. Expected JSON!")
 
@@ -277,8 +277,9 @@ class MorpheneWebsocket(Events):
         :raises ValueError: if the server does not respond in proper JSON format
         :raises RPCError: if the server returns an error
         """
-        log.debug(json.dumps(payload))
-        self.ws.send(json.dumps(payload, ensure_ascii=False).encode('utf8'))
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug(jsoncodec.dumps(payload))
+        self.ws.send(jsoncodec.dumpb(payload))
 
     def __getattr__(self, name):
         """ Map all methods to RPC calls and pass through the arguments
@@ -97,6 +97,7 @@ if __name__ == '__main__':
             'Topic :: Office/Business :: Financial',
         ],
         install_requires=requires,
+        extras_require={"async": ["aiohttp"]},
         entry_points={
             'console_scripts': [
                 'morphenepy=morphenepython.cli:cli',
@@ -0,0 +1,134 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from builtins import range
+import os
+import shutil
+import tempfile
+import unittest
+from morphenepython import MorpheneClient
+from morphenepython.block import Block
+from morphenepython.blockarchive import BlockArchive, INDEX_ENTRY
+from morphenepython.blockchain import Blockchain
+from morphenepython.blockchainobject import BlockchainObject
+from morphenepythonapi.localnode import LocalNode
+
+
+class Testcases(unittest.TestCase):
+
+    def setUp(self):
+        BlockchainObject.clear_cache()
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_put_get(self):
+        with BlockArchive(self.path, segment_size=10) as archive:
+            self.assertTrue(archive.put(5, {"block_id": "a"}))
+            self.assertFalse(archive.put(5, {"block_id": "b"}))
+            self.assertTrue(archive.put(12, {"block_id": "c"}))
+            self.assertEqual(archive.get(5), {"block_id": "a"})
+            self.assertEqual(archive.get(12), {"block_id": "c"})
+            self.assertIsNone(archive.get(6))
+            self.assertIsNone(archive.get(35))
+            self.assertIn(12, archive)
+            self.assertNotIn(11, archive)
+            self.assertEqual(archive.missing_ranges(1, 15), [(1, 4), (6, 11), (13, 15)])
+            self.assertEqual(archive.archived_until(5), 5)
+            self.assertEqual(archive.archived_until(6), 5)
+        # The segment size is read from the existing archive
+        with BlockArchive(self.path) as archive:
+            self.assertEqual(archive.segment_size, 10)
+            self.assertEqual(archive.get(12), {"block_id": "c"})
+
+    def test_damaged_record(self):
+        with BlockArchive(self.path, segment_size=10) as archive:
+            archive.put(3, {"block_id": "a"})
+        with open(os.path.join(self.path, "blocks-0000000000.dat"), "r+b") as f:
+            f.seek(4)
+            f.write(b"\x00\x00")
+        with BlockArchive(self.path) as archive:
+            self.assertIsNone(archive.get(3))
+            self.assertEqual(os.path.getsize(os.path.join(self.path, "blocks-0000000000.idx")),
+                             4 * INDEX_ENTRY.size)
+            # Only the index is read for the ranges
+            self.assertEqual(archive.missing_ranges(1, 5), [(1, 2), (4, 5)])
+            # A damaged block can be stored again
+            self.assertTrue(archive.put(3, {"block_id": "b"}))
+            self.assertEqual(archive.get(3), {"block_id": "b"})
+
+    def damage_block(self, archive, block_num):
+        offset, length, crc = archive._get_entry(block_num)
+        name = os.path.join(self.path, "blocks-%010d.dat" % (block_num // archive.segment_size * archive.segment_size))
+        with open(name, "r+b") as f:
+            f.seek(offset + 4)
+            f.write(b"\x00\x00")
+
+    def test_version(self):
+        BlockArchive(self.path).close()
+        with open(os.path.join(self.path, "archive.json"), "w") as f:
+            f.write('{"version": 99, "segment_size": 10}')
+        with self.assertRaises(ValueError):
+            BlockArchive(self.path)
+
+    def test_archive(self):
+        with LocalNode() as node:
+            mph = MorpheneClient(node=node.url, handshake_cache=False, node_stats={}, block_archive=self.path)
+            blockchain = Blockchain(morphene_instance=mph)
+            self.assertEqual(blockchain.archive(1, 50, max_batch_size=20), 50)
+            self.assertEqual(blockchain.archive(1, 60), 10)
+            # Blocks after the last irreversible block are not archived
+            self.assertEqual(blockchain.archive(1, node.chain.head_block_num + 10),
+                             node.chain.last_irreversible_block_num - 60)
+            block_id = node.chain.block_id(42)
+        mph.block_archive.close()
+
+        # Offline, all blocks are read from the archive
+        mph = MorpheneClient(offline=True, block_archive=self.path)
+        self.assertEqual(Block(42, morphene_instance=mph)["block_id"], block_id)
+        blocks = list(Blockchain(morphene_instance=mph).blocks(start=1, stop=100))
+        self.assertEqual([block.block_num for block in blocks], list(range(1, 101)))
+        self.assertEqual(blocks[41]["block_id"], block_id)
+        mph.block_archive.close()
+
+    def test_blocks_with_gaps(self):
+        with LocalNode() as node:
+            mph = MorpheneClient(node=node.url, handshake_cache=False, node_stats={}, block_archive=self.path)
+            blockchain = Blockchain(morphene_instance=mph)
+            blockchain.archive(1, 30)
+            blockchain.archive(61, 90)
+            calls = node.stats["calls"]
+            blocks = list(blockchain.blocks(start=1, stop=90, use_archive=True))
+            self.assertEqual([block.block_num for block in blocks], list(range(1, 91)))
+            self.assertEqual(blocks[44]["block_id"], node.chain.block_id(45))
+            # Only blocks 31 to 60 are requested
+            gap_calls = node.stats["calls"] - calls
+            self.assertGreater(gap_calls, 0)
+            calls = node.stats["calls"]
+            list(blockchain.blocks(start=1, stop=30))
+            self.assertEqual(node.stats["calls"], calls)
+            mph.block_archive.close()
+
+    def test_blocks_with_damaged_record(self):
+        with LocalNode() as node:
+            mph = MorpheneClient(node=node.url, handshake_cache=False, node_stats={}, block_archive=self.path)
+            blockchain = Blockchain(morphene_instance=mph)
+            blockchain.archive(1, 30)
+            self.damage_block(mph.block_archive, 10)
+            BlockchainObject.clear_cache()
+            block = blockchain._get_archived_block(mph.block_archive, 10)
+            self.assertEqual(block.block_num, 10)
+            self.assertEqual(block["block_id"], node.chain.block_id(10))
+            BlockchainObject.clear_cache()
+            blocks = list(blockchain.blocks(start=1, stop=30))
+            self.assertEqual([block.block_num for block in blocks], list(range(1, 31)))
+            self.assertEqual(blocks[9]["block_id"], node.chain.block_id(10))
+            # The damaged block was archived again, when it was read from the node
+            self.assertEqual(mph.block_archive.get(10)["block_id"], node.chain.block_id(10))
+            mph.block_archive.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from builtins import range
+import threading
+import unittest
+from morphenepython import MorpheneClient
+from morphenepython.blockchain import Blockchain
+from morphenepython.blockchainobject import BlockchainObject
+from morphenepythonapi.batchsize import AdaptiveBatchSize
+from morphenepythonapi.localnode import LocalNode
+
+
+class Testcases(unittest.TestCase):
+
+    def setUp(self):
+        BlockchainObject.clear_cache()
+        self.node = LocalNode().start()
+        self.mph = MorpheneClient(node=self.node.url, handshake_cache=False, node_stats={}, num_retries_call=1)
+
+    def tearDown(self):
+        self.node.stop()
+
+    def test_retry_failed_blocks(self):
+        lock = threading.Lock()
+        fail_blocks = set([105, 230, 231])
+        requested = []
+        get_block = self.node.methods["get_block"]
+
+        def failing_get_block(args):
+            block_num = int(args[0])
+            with lock:
+                requested.append(block_num)
+                if block_num in fail_blocks:
+                    fail_blocks.remove(block_num)
+                    raise ValueError("block %d is not available" % block_num)
+            return get_block(args)
+        self.node.methods["get_block"] = failing_get_block
+        blockchain = Blockchain(morphene_instance=self.mph, use_block_range=False)
+        blocks = list(blockchain.blocks(start=1, stop=300, max_batch_size=50))
+        self.assertEqual([block.block_num for block in blocks], list(range(1, 301)))
+        # Only the failed blocks are requested again
+        requested = [n for n in requested if n <= 300]
+        self.assertEqual(len(requested), 303)
+        self.assertEqual(sorted(n for n in set(requested) if requested.count(n) > 1), [105, 230, 231])
+
+    def test_adaptive_batch_size(self):
+        self.node.latency = 0.01
+        batch_size = AdaptiveBatchSize(200, initial_size=5, target_latency=10.)
+        blockchain = Blockchain(morphene_instance=self.mph, use_block_range=False)
+        blocks = list(blockchain.blocks(start=1, stop=600, max_batch_size=200, adaptive_batch_size=batch_size))
+        self.assertEqual(len(blocks), 600)
+        self.assertEqual(batch_size.size, 200)
+        # Fewer requests than with batches of the initial size
+        self.assertLess(self.node.stats["requests"], 600 // 5)
@@ -0,0 +1,143 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import random
+import threading
+import time
+import unittest
+from morphenepython import MorpheneClient
+from morphenepython.blockchain import Blockchain, BlockFetcher
+from morphenepython.blockchainobject import BlockchainObject
+from morphenepython.exceptions import BlockWaitTimeExceeded
+from morphenepythonapi.localnode import LocalNode
+
+
+class SlowBlockRPC(object):
+    """Answers get_block calls after a random delay and fails once for some blocks"""
+    def __init__(self, fail_blocks=[]):
+        self.fail_blocks = set(fail_blocks)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def set_next_node_on_empty_reply(self, next_node_on_empty_reply=True):
+        pass
+
+    def get_block(self, block_num):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(random.random() * 0.01)
+            with self.lock:
+                if block_num in self.fail_blocks:
+                    self.fail_blocks.remove(block_num)
+                    raise ValueError("block %d failed" % block_num)
+            return {"block_id": "%08x" % block_num + "0" * 32,
+                    "timestamp": "2019-06-01T16:20:00",
+                    "transactions": []}
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+class Testcases(unittest.TestCase):
+
+    def setUp(self):
+        BlockchainObject.clear_cache()
+
+    def get_instances(self, rpc, n):
+        instances = []
+        for i in range(n):
+            mph = MorpheneClient(offline=True)
+            mph.rpc = rpc
+            instances.append(mph)
+        return instances
+
+    def test_blocks_in_order(self):
+        rpc = SlowBlockRPC(fail_blocks=[3, 17])
+        fetcher = BlockFetcher(self.get_instances(rpc, 4), read_ahead=8)
+        try:
+            block_nums = [block.block_num for block in fetcher.blocks(1, 50)]
+        finally:
+            fetcher.close()
+        self.assertEqual(block_nums, list(range(1, 51)))
+        self.assertTrue(rpc.max_in_flight <= 4)
+
+    def test_max_retries(self):
+        rpc = SlowBlockRPC()
+        get_block = rpc.get_block
+        attempts = []
+
+        def failing_get_block(block_num):
+            if block_num == 5:
+                attempts.append(time.time())
+                raise ValueError("block 5 is not available")
+            return get_block(block_num)
+        rpc.get_block = failing_get_block
+        fetcher = BlockFetcher(self.get_instances(rpc, 2), max_retries=2, retry_delay=0.05)
+        block_nums = []
+        try:
+            with self.assertRaises(ValueError):
+                for block in fetcher.blocks(1, 10):
+                    block_nums.append(block.block_num)
+        finally:
+            fetcher.close()
+        self.assertEqual(block_nums, [1, 2, 3, 4])
+        self.assertEqual(len(attempts), 3)
+        # The repetitions are delayed
+        self.assertGreaterEqual(attempts[2] - attempts[0], 0.15)
+
+    def test_timeout(self):
+        rpc = SlowBlockRPC()
+        release = threading.Event()
+        rpc.get_block = lambda block_num: release.wait(5)
+        fetcher = BlockFetcher(self.get_instances(rpc, 2), timeout=0.2)
+        try:
+            start = time.time()
+            with self.assertRaises(BlockWaitTimeExceeded):
+                next(fetcher.blocks(1, 10))
+            self.assertLess(time.time() - start, 2)
+        finally:
+            release.set()
+            fetcher.close()
+
+    def test_backpressure(self):
+        rpc = SlowBlockRPC()
+        fetcher = BlockFetcher(self.get_instances(rpc, 2), read_ahead=4)
+        try:
+            blocks = fetcher.blocks(1, 100)
+            next(blocks)
+            time.sleep(0.2)
+            # Never more than read_ahead blocks ahead of the consumer
+            self.assertTrue(len(fetcher.results) <= 4)
+            self.assertTrue(fetcher.tasks.empty())
+        finally:
+            fetcher.close()
+
+    def test_thread_num(self):
+        lock = threading.Lock()
+        in_flight = [0, 0]
+        with LocalNode() as node:
+            get_block = node.methods["get_block"]
+
+            def slow_get_block(args):
+                with lock:
+                    in_flight[0] += 1
+                    in_flight[1] = max(in_flight)
+                time.sleep(0.05)
+                with lock:
+                    in_flight[0] -= 1
+                return get_block(args)
+            node.methods["get_block"] = slow_get_block
+            mph = MorpheneClient(node=node.url, handshake_cache=False, node_stats={})
+            blockchain = Blockchain(morphene_instance=mph)
+            blocks = list(blockchain.blocks(start=1, stop=160, threading=True, thread_num=16))
+        self.assertEqual(len(blocks), 160)
+        # All workers request blocks at the same time
+        self.assertEqual(in_flight[1], 16)
+        # The client got its own pool, in which the workers use the bulk share
+        self.assertEqual(mph.rpc.pool_size, 32)
+        self.assertEqual(mph.rpc.lanes.max_bulk_requests, 16)
+        self.assertEqual(mph.rpc.session.get_adapter(node.url)._pool_maxsize, 32)
@@ -0,0 +1,89 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from builtins import range
+import unittest
+from morphenepython import MorpheneClient
+from morphenepython.blockchain import Blockchain
+from morphenepython.blockchainobject import BlockchainObject
+from morphenepythonapi.localnode import LocalNode
+
+
+class Testcases(unittest.TestCase):
+
+    def setUp(self):
+        BlockchainObject.clear_cache()
+        self.node = LocalNode().start()
+        self.mph = MorpheneClient(node=self.node.url, handshake_cache=False, node_stats={})
+        self.fork = None
+        self.irreversible_block_num = None
+        get_block = self.node.methods["get_block"]
+        get_props = self.node.methods["get_dynamic_global_properties"]
+
+        def forked_block_id(block_num):
+            return "%08x" % block_num + ("%04x" % self.fork[0]) * 8
+
+        def forked_get_block(args):
+            block_num = int(args[0])
+            if self.fork is None or block_num < self.fork[0]:
+                return get_block(args)
+            if block_num > self.fork[1]:
+                return None
+            # The fork can be longer than the chain of the node
+            block = get_block([min(block_num, self.node.chain.head_block_num)])
+            block["block_id"] = forked_block_id(block_num)
+            if block_num > self.fork[0]:
+                block["previous"] = forked_block_id(block_num - 1)
+            return block
+
+        def forked_get_props(args):
+            props = get_props(args)
+            if self.fork is not None:
+                props["head_block_number"] = self.fork[1]
+                props["head_block_id"] = forked_block_id(self.fork[1])
+            if self.irreversible_block_num is not None:
+                props["last_irreversible_block_num"] = self.irreversible_block_num
+            return props
+        self.node.methods["get_block"] = forked_get_block
+        self.node.methods["get_dynamic_global_properties"] = forked_get_props
+
+    def tearDown(self):
+        self.node.stop()
+
+    def get_events(self, events, count):
+        return [(event["type"], event["block_num"]) for event in [next(events) for i in range(count)]]
+
+    def test_head_blocks(self):
+        blockchain = Blockchain(morphene_instance=self.mph, mode="head")
+        events = list(blockchain.head_blocks(start=975, stop=980, poll_interval=0))
+        self.assertEqual([(event["type"], event["block_num"]) for event in events],
+                         [("irreversible", 980)] + [("block", n) for n in range(975, 981)])
+        self.assertEqual(events[1]["block"]["block_id"], self.node.chain.block_id(975))
+
+    def test_fork(self):
+        blockchain = Blockchain(morphene_instance=self.mph, mode="head")
+        events = blockchain.head_blocks(start=995, poll_interval=0)
+        self.assertEqual(self.get_events(events, 7), [("irreversible", 980)] + [("block", n) for n in range(995, 1001)])
+        # Blocks from 998 on are replaced by a longer fork
+        self.fork = (998, 1001)
+        self.irreversible_block_num = 990
+        self.assertEqual(self.get_events(events, 8), [
+            ("irreversible", 990), ("rollback", 1000), ("rollback", 999), ("rollback", 998),
+            ("block", 998), ("block", 999), ("block", 1000), ("block", 1001)])
+        # The node switches to a shorter fork, which branches off the first chain
+        self.fork = (1000, 1000)
+        self.assertEqual(self.get_events(events, 7), [
+            ("rollback", 1001), ("rollback", 1000), ("rollback", 999), ("rollback", 998),
+            ("block", 998), ("block", 999), ("block", 1000)])
+        # Blocks up to the last irreversible block are not tracked anymore
+        self.fork = None
+        self.irreversible_block_num = 999
+        last_events = [next(events) for i in range(3)]
+        self.assertEqual([(event["type"], event["block_num"]) for event in last_events],
+                         [("irreversible", 999), ("rollback", 1000), ("block", 1000)])
+        self.assertEqual(last_events[2]["block_id"], self.node.chain.block_id(1000))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from builtins import range
+import unittest
+from morphenepython import MorpheneClient
+from morphenepython.blockchain import Blockchain
+from morphenepython.blockchainobject import BlockchainObject
+from morphenepythonapi.localnode import LocalNode
+
+
+class Testcases(unittest.TestCase):
+
+    def setUp(self):
+        BlockchainObject.clear_cache()
+        self.node = LocalNode().start()
+        self.mph = MorpheneClient(node=self.node.url, handshake_cache=False, node_stats={})
+
+    def tearDown(self):
+        self.node.stop()
+
+    def count_calls(self, method):
+        calls = []
+        func = self.node.methods[method]
+
+        def counted(args):
+            calls.append(args)
+            return func(args)
+        self.node.methods[method] = counted
+        return calls
+
+    def test_get_api_methods(self):
+        self.assertIn("block_api.get_block_range", self.mph.get_api_methods())
+        self.assertIn("block_api", self.mph.get_apis())
+        # The reply of the node, not the list of the handshake
+        self.node.methods["get_methods"] = lambda args: ["block_api.get_block"]
+        self.assertEqual(self.mph.get_api_methods(), ["block_api.get_block"])
+
+    def test_blocks_by_range(self):
+        range_calls = self.count_calls("get_block_range")
+        block_calls = self.count_calls("get_block")
+        blockchain = Blockchain(morphene_instance=self.mph)
+        blocks = list(blockchain.blocks(start=1, stop=900))
+        self.assertEqual([block.block_num for block in blocks], list(range(1, 901)))
+        self.assertEqual(blocks[10]["block_id"], self.node.chain.block_id(11))
+        self.assertLess(len(range_calls), 15)
+        # Only the current block
+        self.assertEqual(len(block_calls), 1)
+        ops = list(blockchain.stream(start=1, stop=20))
+        self.assertGreater(len(ops), 0)
+
+    def test_max_batch_size(self):
+        range_calls = self.count_calls("get_block_range")
+        blockchain = Blockchain(morphene_instance=self.mph)
+        blocks = list(blockchain.blocks(start=1, stop=100, max_batch_size=20))
+        self.assertEqual([block.block_num for block in blocks], list(range(1, 101)))
+        # Batch calls of max_batch_size blocks are used
+        self.assertEqual(len(range_calls), 0)
+
+    def test_retry_with_fewer_blocks(self):
+        get_block_range = self.node.methods["get_block_range"]
+        counts = []
+
+        def limited_get_block_range(args):
+            counts.append(int(args["count"]))
+            if int(args["count"]) > 20:
+                raise ValueError("too many blocks")
+            return get_block_range(args)
+        self.node.methods["get_block_range"] = limited_get_block_range
+        blockchain = Blockchain(morphene_instance=self.mph)
+        blocks = list(blockchain.blocks(start=1, stop=100, adaptive_batch_size=False))
+        self.assertEqual([block.block_num for block in blocks], list(range(1, 101)))
+        self.assertEqual(counts[:4], [100, 50, 25, 12])
+
+    def test_fallback(self):
+        del self.node.methods["get_block_range"]
+        block_calls = self.count_calls("get_block")
+        blockchain = Blockchain(morphene_instance=self.mph)
+        blocks = list(blockchain.blocks(start=1, stop=20))
+        self.assertEqual([block.block_num for block in blocks], list(range(1, 21)))
+        self.assertEqual(len(block_calls), 21)
+
+    def test_fallback_on_error(self):
+        # The node lists the method, but does not serve it
+        self.node.methods["get_methods"] = lambda args: ["block_api.get_block", "block_api.get_block_range"]
+        del self.node.methods["get_block_range"]
+        blockchain = Blockchain(morphene_instance=self.mph)
+        blocks = list(blockchain.blocks(start=1, stop=20))
+        self.assertEqual([block.block_num for block in blocks], list(range(1, 21)))
+        self.assertFalse(blockchain.use_block_range)
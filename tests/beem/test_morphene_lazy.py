@@ -0,0 +1,86 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import os
+import shutil
+import tempfile
+import unittest
+import weakref
+from morphenepython import MorpheneClient
+from morphenepython import morphene
+from morphenepythonapi.localnode import LocalNode
+
+
+class Testcases(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.cache_file = os.path.join(self.path, "handshake.json")
+        self.node = LocalNode().start()
+
+    def tearDown(self):
+        self.node.stop()
+        shutil.rmtree(self.path)
+
+    def get_client(self):
+        return MorpheneClient(node=self.node.url, handshake_cache=self.cache_file, node_stats={})
+
+    def test_lazy_startup(self):
+        mph = self.get_client()
+        self.assertEqual(self.node.stats["calls"], 0)
+        self.assertIsNone(mph._wallet)
+        repr(mph)
+        mph.get_dynamic_global_properties()
+        # get_config of the connect and the properties
+        self.assertEqual(self.node.stats["calls"], 2)
+        self.assertEqual(mph.get_block_interval(), 3)
+        mph.get_network()
+        self.assertEqual(self.node.stats["calls"], 2)
+        mph.get_dynamic_global_properties()
+        self.assertEqual(self.node.stats["calls"], 2)
+        mph.get_witness_schedule()
+        self.assertEqual(self.node.stats["calls"], 3)
+
+        # The next client uses the cached handshake
+        self.node.stats["calls"] = 0
+        mph = self.get_client()
+        self.assertEqual(mph.get_network()["chain_id"], self.node.chain.get_config()["MORPHENE_CHAIN_ID"])
+        self.assertEqual(self.node.stats["calls"], 0)
+        mph.refresh_data()
+        # dynamic global properties, hardfork properties and the witness schedule
+        self.assertEqual(self.node.stats["calls"], 3)
+        mph.refresh_data(force_refresh=True)
+        self.assertEqual(self.node.stats["calls"], 7)
+
+    def test_handshake_cache_opt_in(self):
+        mph = MorpheneClient(node=self.node.url, node_stats={})
+        self.assertIsNone(mph.rpc.handshake_cache)
+        mph.get_network()
+        mph = MorpheneClient(node=self.node.url, node_stats={})
+        mph.get_network()
+        # Every client does its own handshake
+        self.assertEqual(self.node.stats["calls"], 2)
+
+    def test_keep_node_stats(self):
+        stored_config = morphene.config
+        morphene.config = {}
+        try:
+            # The statistics are not stored as side effect of a refresh
+            mph = MorpheneClient(node=self.node.url, handshake_cache=False)
+            mph.refresh_data(force_refresh=True)
+            self.assertNotIn("node_stats", morphene.config)
+
+            mph = MorpheneClient(node=self.node.url, handshake_cache=False, keep_node_stats=True)
+            mph.refresh_data(force_refresh=True)
+            self.assertNotIn("node_stats", morphene.config)
+            morphene._store_node_stats_at_exit(weakref.ref(mph))
+            self.assertIn(self.node.url, mph.get_stored_node_stats())
+
+            # The next client starts with the stored statistics
+            latency = mph.rpc.nodes[0].latency
+            self.assertIsNotNone(latency)
+            mph = MorpheneClient(node=self.node.url, handshake_cache=False, keep_node_stats=True)
+            self.assertEqual(mph.rpc.nodes[0].latency, latency)
+        finally:
+            morphene.config = stored_config
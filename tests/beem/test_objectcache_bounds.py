@@ -0,0 +1,158 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import unittest
+from morphenepython import MorpheneClient
+from morphenepython.block import Block, BlockHeader
+from morphenepython.blockchainobject import ObjectCache, BlockchainObject
+
+
+class FakeBlockRPC(object):
+    """Answers get_block calls with synthetic blocks and counts them"""
+    def __init__(self):
+        self.calls = 0
+
+    def set_next_node_on_empty_reply(self, next_node_on_empty_reply=True):
+        pass
+
+    def get_block(self, block_num):
+        self.calls += 1
+        return {"block_id": "%08x" % block_num + "0" * 32,
+                "previous": "%08x" % (block_num - 1) + "0" * 32,
+                "timestamp": "2019-06-01T16:20:00",
+                "transactions": []}
+
+    def get_block_header(self, block_num):
+        self.calls += 1
+        return {"previous": "%08x" % (block_num - 1) + "0" * 32,
+                "timestamp": "2019-06-01T16:20:00"}
+
+
+class Testcases(unittest.TestCase):
+    def test_cache_lru(self):
+        cache = ObjectCache(default_expiration=60, max_entries=3)
+        cache["a"] = 1
+        cache["b"] = 2
+        cache["c"] = 3
+        # touch "a", so that "b" is the least recently used entry
+        self.assertEqual(cache["a"], 1)
+        cache["d"] = 4
+        self.assertNotIn("b", cache)
+        self.assertIn("a", cache)
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_cache_max_bytes(self):
+        cache = ObjectCache(default_expiration=60, max_entries=None, max_bytes=20000)
+        for i in range(100):
+            cache[i] = "x" * 1000
+        self.assertTrue(cache.stats()["bytes"] <= 20000)
+        self.assertTrue(len(cache) < 100)
+        self.assertIn(99, cache)
+        self.assertNotIn(0, cache)
+
+    def test_cache_namespaces(self):
+        cache = ObjectCache(default_expiration=60)
+        cache.set(5, "block", namespace="Block")
+        cache.set(5, "account", namespace="Account")
+        self.assertEqual(cache.get(5, namespace="Block"), "block")
+        self.assertEqual(cache.get(5, namespace="Account"), "account")
+        self.assertNotIn(5, cache)
+        cache.delete(5, namespace="Block")
+        self.assertFalse(cache.contains(5, namespace="Block"))
+        self.assertTrue(cache.contains(5, namespace="Account"))
+
+    def test_cache_stats(self):
+        cache = ObjectCache(default_expiration=60)
+        cache["foo"] = "bar"
+        cache.get("foo")
+        cache.get("bar")
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["entries"], 1)
+
+    def test_cache_max_bytes_later(self):
+        cache = ObjectCache(default_expiration=60, max_entries=None)
+        for i in range(100):
+            cache[i] = "x" * 1000
+        self.assertEqual(cache.stats()["bytes"], 0)
+        cache.set_max_size(max_entries=None, max_bytes=20000)
+        self.assertTrue(0 < cache.stats()["bytes"] <= 20000)
+        self.assertTrue(len(cache) < 100)
+        self.assertIn(99, cache)
+        self.assertNotIn(0, cache)
+        # The estimated sizes are released with the entries
+        cache.clear()
+        self.assertEqual(cache.stats()["bytes"], 0)
+
+    def test_cache_stats_no_value(self):
+        cache = ObjectCache(default_expiration=60)
+        cache["none"] = None
+        cache.set("old", "value", expiration=0)
+        self.assertEqual(cache.get("none", "default"), "default")
+        self.assertIsNone(cache.get("old"))
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 0)
+        self.assertEqual(stats["misses"], 2)
+        self.assertEqual(stats["expirations"], 1)
+
+    def test_cache_no_expiration(self):
+        cache = ObjectCache(default_expiration=0)
+        cache.set("foo", "bar", expiration=-1)
+        cache["bar"] = "foo"
+        self.assertIn("foo", cache)
+        self.assertNotIn("bar", cache)
+
+    def test_immutable_block_cache(self):
+        BlockchainObject.clear_cache()
+        mph = MorpheneClient(offline=True)
+        mph.rpc = FakeBlockRPC()
+        mph.data["last_irreversible_block_num"] = 100
+
+        # Irreversible blocks are read only once
+        self.assertEqual(Block(50, morphene_instance=mph).block_num, 50)
+        self.assertEqual(Block(50, morphene_instance=mph).block_num, 50)
+        self.assertEqual(mph.rpc.calls, 1)
+        self.assertTrue(Block.is_immutable_cached(50))
+        self.assertFalse(Block.is_immutable_cached(50, only_ops=True))
+
+        # Reversible blocks are always refreshed
+        Block(150, morphene_instance=mph)
+        Block(150, morphene_instance=mph)
+        self.assertEqual(mph.rpc.calls, 3)
+        self.assertFalse(Block.is_immutable_cached(150))
+
+        # Block headers have their own entries
+        BlockHeader(50, morphene_instance=mph)
+        BlockHeader(50, morphene_instance=mph)
+        self.assertEqual(mph.rpc.calls, 4)
+        BlockchainObject.clear_cache()
+
+    def test_immutable_cache_copies(self):
+        BlockchainObject.clear_cache()
+        mph = MorpheneClient(offline=True)
+        mph.rpc = FakeBlockRPC()
+        mph.data["last_irreversible_block_num"] = 100
+
+        # Changes of a returned block do not reach the cache
+        block = Block(50, morphene_instance=mph)
+        block["transactions"].append({"operations": []})
+        block["witness"] = "changed"
+        cached = Block(50, morphene_instance=mph)
+        self.assertEqual(mph.rpc.calls, 1)
+        self.assertEqual(cached["transactions"], [])
+        self.assertNotIn("witness", cached)
+        cached["transactions"].append({"operations": []})
+        self.assertEqual(Block(50, morphene_instance=mph)["transactions"], [])
+
+        # Blocks which are stored by cache_if_irreversible
+        block = Block(mph.rpc.get_block(60), morphene_instance=mph)
+        block["id"] = 60
+        block.identifier = 60
+        block.cache_if_irreversible()
+        block["transactions"].append({"operations": []})
+        self.assertEqual(Block(60, morphene_instance=mph)["transactions"], [])
+        self.assertEqual(mph.rpc.calls, 2)
+        BlockchainObject.clear_cache()
@@ -0,0 +1,128 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import os
+import shutil
+import tempfile
+import unittest
+from morphenepython import MorpheneClient
+from morphenepython.blockchain import Blockchain
+from morphenepython.blockchainobject import BlockchainObject
+from morphenepython.exceptions import NoWriteAccess
+from morphenepython.storage import Checkpoints
+from morphenepython.streamconsumer import StreamConsumer
+from morphenepythonapi.localnode import LocalNode
+
+
+class Testcases(unittest.TestCase):
+
+    def setUp(self):
+        BlockchainObject.clear_cache()
+        self.node = LocalNode().start()
+        self.mph = MorpheneClient(node=self.node.url, handshake_cache=False, node_stats={})
+        self.path = tempfile.mkdtemp()
+        self.store = Checkpoints(os.path.join(self.path, "checkpoints.sqlite"))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+        self.node.stop()
+
+    def get_consumer(self, name="consumer", **kwargs):
+        return StreamConsumer(name, start=1, stop=20, store=self.store, morphene_instance=self.mph, **kwargs)
+
+    def get_positions(self, ops):
+        return [(op["block_num"], op["trx_num"], op["op_num"]) for op in ops]
+
+    def test_resume(self):
+        expected = self.get_positions(Blockchain(morphene_instance=self.mph).stream(start=1, stop=20))
+        self.assertGreater(len(expected), 10)
+        consumer = self.get_consumer(commit_every=3)
+        ops = []
+        stream = consumer.stream()
+        for op in stream:
+            ops.append(op)
+            if len(ops) == 7:
+                break
+        # The sixth operation is committed, the seventh was not acknowledged by requesting the next one
+        self.assertEqual(self.store.get("consumer"), expected[5])
+        stream.close()
+        self.assertEqual(self.store.get("consumer")[0], expected[5][0])
+        self.assertLess(self.store.get("consumer"), expected[6])
+
+        consumer = self.get_consumer(commit_every=3)
+        ops = ops[:6] + list(consumer.stream())
+        self.assertEqual(self.get_positions(ops), expected)
+        self.assertEqual(self.store.get("consumer"), (20, None, None))
+        self.assertEqual(list(self.get_consumer().stream()), [])
+
+    def test_uncommitted(self):
+        consumer = self.get_consumer(commit_every=100, commit_interval=60)
+        stream = consumer.stream()
+        first = next(stream)
+        next(stream)
+        self.assertIsNone(self.store.get("consumer"))
+        # After a crash, the operations are yielded again
+        op = next(self.get_consumer().stream())
+        self.assertEqual(self.get_positions([op]), self.get_positions([first]))
+        consumer.commit()
+        self.assertEqual(self.store.get("consumer"), consumer.position)
+        self.assertEqual(self.get_positions([first]), [consumer.position])
+
+    def test_named_consumers(self):
+        transfers = self.get_consumer("transfers", opNames=["transfer"])
+        nothing = self.get_consumer("nothing", opNames=["no_such_operation"])
+        self.assertTrue(all(op["type"] == "transfer" for op in transfers.stream()))
+        self.assertEqual(list(nothing.stream()), [])
+        # Blocks without matching operations move the checkpoint as well
+        self.assertEqual(self.store.get("nothing"), (20, None, None))
+        self.assertEqual(self.store.getConsumers(), ["nothing", "transfers"])
+        nothing.reset()
+        self.assertEqual(self.store.getConsumers(), ["transfers"])
+        nothing.reset((10, None, None))
+        consumer = self.get_consumer("nothing")
+        self.assertEqual(self.get_positions(consumer.stream())[0][0], 11)
+
+    def test_process(self):
+        expected = self.get_positions(Blockchain(morphene_instance=self.mph).stream(start=1, stop=20))
+        connection = self.store.connect()
+        connection.execute("CREATE TABLE results (block_num INTEGER, trx_num INTEGER, op_num INTEGER)")
+        connection.commit()
+        fail_at = [expected[7]]
+
+        def handle(op, connection):
+            position = (op["block_num"], op["trx_num"], op["op_num"])
+            connection.execute("INSERT INTO results VALUES (?, ?, ?)", position)
+            if position in fail_at:
+                raise ValueError("handler failed")
+
+        def get_results():
+            return [tuple(row) for row in connection.execute("SELECT * FROM results ORDER BY rowid")]
+
+        with self.assertRaises(ValueError):
+            self.get_consumer(commit_every=3).process(handle)
+        # The results and the checkpoint of the sixth operation were committed together
+        self.assertEqual(get_results(), expected[:6])
+        self.assertEqual(self.store.get("consumer"), expected[5])
+
+        # The rolled back operations are processed again, and their results are stored once
+        fail_at.pop()
+        self.get_consumer(commit_every=3).process(handle)
+        self.assertEqual(get_results(), expected)
+        self.assertEqual(self.store.get("consumer"), (20, None, None))
+
+    def test_no_memory_fallback(self):
+        with self.assertRaises(NoWriteAccess):
+            Checkpoints(self.path)
+        blocker = os.path.join(self.path, "blocker")
+        open(blocker, "w").close()
+
+        class UnwritableCheckpoints(Checkpoints):
+            data_dir = os.path.join(blocker, "data")
+            sqlDataBaseFile = os.path.join(data_dir, "morphenepython.sqlite")
+        with self.assertRaises(NoWriteAccess):
+            UnwritableCheckpoints()
+
+
+if __name__ == '__main__':
+    unittest.main()
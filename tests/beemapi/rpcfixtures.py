@@ -0,0 +1,24 @@
+# This Python file uses the following encoding: utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from morphenepythonapi.morphenenoderpc import MorpheneNodeRPC
+
+
+def get_fake_rpc(urls, request_send, **kwargs):
+    """Returns a rpc instance which sends its http requests to request_send
+
+    :param urls: node url or list of node urls
+    :param request_send: replaces the http transport, it is called with the
+        payload (and the url when a call goes to a certain node)
+    :param kwargs: passed to MorpheneNodeRPC, calls are not coalesced by default
+
+    """
+    kwargs.setdefault("coalesce", False)
+    rpc = MorpheneNodeRPC(urls, autoconnect=False, **kwargs)
+    rpc.url = next(rpc.nodes)
+    rpc.current_rpc = rpc.rpc_methods["jsonrpc"]
+    rpc.request_send = request_send
+    rpc.nodes.retry_delay = lambda cnt: 0
+    return rpc
@@ -0,0 +1,140 @@
+# This Python file uses the following encoding: utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import asyncio
+import json
+import random
+import socket
+import time
+import unittest
+import pytest
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web
+from morphenepythonapi.asyncnoderpc import AsyncMorpheneNodeRPC
+from morphenepythonapi.retry import RetryPolicy
+from morphenepythonapi import exceptions
+
+
+def answer(request):
+    method = request["method"]
+    if method == "call":
+        method = request["params"][0] + "." + request["params"][1]
+        params = request["params"][2]
+    else:
+        params = request.get("params")
+    if method == "database_api.get_config":
+        result = {"MORPHENE_CHAIN_ID": "0" * 64, "MORPHENE_BLOCKCHAIN_VERSION": "0.1.0"}
+    elif method == "database_api.get_block":
+        result = {"block_id": "%08x" % params[0] + "0" * 32}
+    else:
+        return {"jsonrpc": "2.0", "id": request["id"],
+                "error": {"code": -32601, "message": "Could not find method %s" % method}}
+    return {"jsonrpc": "2.0", "id": request["id"], "result": result}
+
+
+class StandInNode(object):
+    """JSON-RPC node on localhost answering after a random delay"""
+    def __init__(self):
+        self.peers = set()
+
+    async def http_handler(self, request):
+        self.peers.add(request.transport.get_extra_info("peername"))
+        payload = await request.json()
+        await asyncio.sleep(random.random() * 0.01)
+        if isinstance(payload, list):
+            return web.json_response([answer(r) for r in payload])
+        return web.json_response(answer(payload))
+
+    async def ws_handler(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+
+        async def reply(data):
+            await asyncio.sleep(random.random() * 0.01)
+            await ws.send_str(json.dumps(answer(json.loads(data))))
+
+        tasks = []
+        async for msg in ws:
+            tasks.append(asyncio.ensure_future(reply(msg.data)))
+        await asyncio.gather(*tasks)
+        return ws
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/", self.http_handler)
+        app.router.add_get("/ws", self.ws_handler)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = self.runner.addresses[0][1]
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+
+def unused_url():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return "http://127.0.0.1:%d/" % port
+
+
+class Testcases(unittest.TestCase):
+
+    def run_with_node(self, test):
+        async def main():
+            node = StandInNode()
+            await node.start()
+            try:
+                await test(node)
+            finally:
+                await node.stop()
+        asyncio.run(main())
+
+    def test_http_concurrent_calls(self):
+        async def test(node):
+            async with AsyncMorpheneNodeRPC("http://127.0.0.1:%d/" % node.port, max_connections=10) as rpc:
+                blocks = await asyncio.gather(*[rpc.get_block(n) for n in range(1, 501)])
+            self.assertEqual([int(b["block_id"][:8], 16) for b in blocks], list(range(1, 501)))
+            self.assertTrue(len(node.peers) <= 10)
+        self.run_with_node(test)
+
+    def test_websocket_pipelined_calls(self):
+        async def test(node):
+            async with AsyncMorpheneNodeRPC("ws://127.0.0.1:%d/ws" % node.port) as rpc:
+                blocks = await asyncio.gather(*[rpc.get_block(n) for n in range(1, 501)])
+            self.assertEqual([int(b["block_id"][:8], 16) for b in blocks], list(range(1, 501)))
+        self.run_with_node(test)
+
+    def test_failover(self):
+        async def test(node):
+            rpc = AsyncMorpheneNodeRPC([unused_url(), "http://127.0.0.1:%d/" % node.port], num_retries=2)
+            try:
+                block = await rpc.get_block(5)
+            finally:
+                await rpc.rpcclose()
+            self.assertEqual(int(block["block_id"][:8], 16), 5)
+        self.run_with_node(test)
+
+    def test_error_classification(self):
+        async def test(node):
+            async with AsyncMorpheneNodeRPC("http://127.0.0.1:%d/" % node.port) as rpc:
+                with self.assertRaises(exceptions.NoMethodWithName):
+                    await rpc.get_unknown_method()
+        self.run_with_node(test)
+
+    def test_deadline(self):
+        async def test():
+            rpc = AsyncMorpheneNodeRPC(unused_url(), num_retries=-1, retry_policy=RetryPolicy(deadline=0.5))
+            start = time.time()
+            try:
+                with self.assertRaises(exceptions.DeadlineExceeded):
+                    await rpc.get_block(5)
+            finally:
+                await rpc.rpcclose()
+            self.assertLess(time.time() - start, 1.5)
+        asyncio.run(test())
@@ -0,0 +1,77 @@
+# This Python file uses the following encoding: utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from builtins import range
+import json
+import threading
+import time
+import unittest
+from morphenepythonapi.morphenenoderpc import MorpheneNodeRPC
+from morphenepythonapi.batchsize import AdaptiveBatchSize
+
+
+class Testcases(unittest.TestCase):
+
+    def test_grow(self):
+        batch_size = AdaptiveBatchSize(1000, initial_size=10, target_latency=1.)
+        sizes = []
+        for i in range(10):
+            sizes.append(batch_size.size)
+            batch_size.observe(batch_size.size, 0.001 * batch_size.size, 100 * batch_size.size)
+        self.assertEqual(sizes[:4], [10, 20, 40, 80])
+        self.assertEqual(batch_size.size, 1000)
+
+    def test_shrink(self):
+        batch_size = AdaptiveBatchSize(1000, initial_size=1000, target_latency=1.)
+        # 10 ms per request
+        batch_size.observe(1000, 10.)
+        self.assertEqual(batch_size.size, 100)
+        for i in range(5):
+            batch_size.observe(batch_size.size, 0.01 * batch_size.size)
+        self.assertEqual(batch_size.size, 100)
+        # Large responses
+        batch_size = AdaptiveBatchSize(1000, initial_size=1000, max_response_bytes=1000000)
+        batch_size.observe(1000, 0.1, 50000000)
+        self.assertEqual(batch_size.size, 20)
+
+    def test_errors(self):
+        batch_size = AdaptiveBatchSize(100, min_size=5, initial_size=100)
+        batch_size.observe(100, 60., error=True)
+        self.assertEqual(batch_size.size, 50)
+        for i in range(10):
+            batch_size.observe(batch_size.size, 60., error=True)
+        self.assertEqual(batch_size.size, 5)
+        self.assertEqual(batch_size.errors, 11)
+        with self.assertRaises(ValueError):
+            AdaptiveBatchSize(10, min_size=20)
+
+    def test_adaptive_rpc_batch(self):
+        lock = threading.Lock()
+        batch_sizes = []
+
+        def request_send(payload, url=None):
+            queries = json.loads(payload.decode('utf8'))
+            with lock:
+                batch_sizes.append(len(queries))
+            # 1 ms per block
+            time.sleep(0.001 * len(queries))
+            return json.dumps([{"jsonrpc": "2.0", "id": q["id"], "result": {"block_num": q["params"][2][0]}}
+                               for q in queries])
+
+        rpc = MorpheneNodeRPC("http://127.0.0.1:8090", autoconnect=False, coalesce=False)
+        rpc.url = next(rpc.nodes)
+        rpc.current_rpc = rpc.rpc_methods["jsonrpc"]
+        rpc.request_send = request_send
+        batch_size = AdaptiveBatchSize(1000, initial_size=10, target_latency=0.05)
+        with rpc.batch(max_batch_size=batch_size, max_workers=2) as batch:
+            for n in range(2000):
+                batch.get_block(n)
+        self.assertEqual([f.result()["block_num"] for f in batch.futures], list(range(2000)))
+        self.assertEqual(sum(batch_sizes), 2000)
+        self.assertEqual(batch_sizes[0], 10)
+        # The size settles at the 50 requests which take the target latency
+        self.assertTrue(20 <= batch_size.size <= 60)
+        self.assertTrue(max(batch_sizes) <= 160)
+        self.assertGreater(batch_size.bytes_per_request, 0)
@@ -0,0 +1,93 @@
+# This Python file uses the following encoding: utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from builtins import range
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from morphenepythonapi.morphenenoderpc import MorpheneNodeRPC
+from morphenepythonapi.localnode import LocalNode
+from morphenepythonapi.cassette import CassetteRecorder, CassettePlayer, read_cassette
+from morphenepythonapi.exceptions import UnhandledRPCError
+
+
+class Testcases(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.cassette = os.path.join(self.path, "test.cassette.gz")
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def record(self, node):
+        rpc = MorpheneNodeRPC(node.url, record=self.cassette)
+        blocks = [rpc.get_block(n) for n in range(1, 11)]
+        with rpc.batch() as batch:
+            for n in range(11, 16):
+                batch.get_block(n)
+        blocks += [f.result() for f in batch.futures]
+        history = rpc.get_account_history("test1", -1, 9)
+        rpc.stop_recording()
+        return blocks, history
+
+    def test_record_and_replay(self):
+        with LocalNode(latency=0.02) as node:
+            blocks, history = self.record(node)
+            url = node.url
+        header, interactions = read_cassette(self.cassette)
+        self.assertEqual(header["cassette"], 1)
+        # get_config of the connect, 10 blocks, one batch and the history
+        self.assertEqual(len(interactions), 13)
+        self.assertTrue(all(i["url"] == url and i["latency"] >= 0.02 for i in interactions))
+
+        # The node is stopped, all replies come from the cassette
+        rpc = MorpheneNodeRPC("", replay=self.cassette, num_retries=0)
+        self.assertEqual(rpc.url, url)
+        # Different request ids than during the recording
+        rpc.get_request_id(100)
+        start = time.time()
+        self.assertEqual(rpc.get_account_history("test1", -1, 9), history)
+        self.assertEqual([rpc.get_block(n) for n in range(1, 11)], blocks[:10])
+        with rpc.batch() as batch:
+            for n in range(11, 16):
+                batch.get_block(n)
+        self.assertEqual([f.result() for f in batch.futures], blocks[10:])
+        self.assertLess(time.time() - start, 0.2)
+        self.assertEqual(len(rpc.cassette_player), 0)
+        # Repeated requests get the last recorded reply
+        self.assertEqual(rpc.get_block(1), blocks[0])
+        with self.assertRaises(UnhandledRPCError):
+            rpc.get_block(100)
+        self.assertEqual(rpc.cassette_player.misses, 1)
+
+    def test_realtime(self):
+        with LocalNode(latency=0.05) as node:
+            self.record(node)
+        rpc = MorpheneNodeRPC("", replay=self.cassette, replay_realtime=True)
+        start = time.time()
+        for n in range(1, 5):
+            rpc.get_block(n)
+        self.assertGreaterEqual(time.time() - start, 0.2)
+
+    def test_truncated(self):
+        recorder = CassetteRecorder(self.cassette)
+        for n in range(100):
+            recorder.record({"jsonrpc": "2.0", "id": n, "method": "call", "params": [n]},
+                            '{"jsonrpc": "2.0", "id": %d, "result": %d}' % (n, n), 0.01)
+        recorder.close()
+        with gzip.open(self.cassette, "rb") as f:
+            data = f.read()
+        with open(self.cassette, "wb") as f:
+            f.write(gzip.compress(data)[:-30])
+        header, interactions = read_cassette(self.cassette)
+        self.assertTrue(0 < len(interactions) < 100)
+        player = CassettePlayer(interactions)
+        reply = player.send(b'{"jsonrpc": "2.0", "id": 7, "method": "call", "params": [3]}')
+        self.assertEqual(json.loads(reply), {"jsonrpc": "2.0", "id": 7, "result": 3})
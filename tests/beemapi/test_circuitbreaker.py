@@ -0,0 +1,112 @@
+# This Python file uses the following encoding: utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from builtins import range
+import json
+import threading
+import time
+import unittest
+from morphenepythonapi.morphenenoderpc import MorpheneNodeRPC
+from morphenepythonapi.node import Nodes, CLOSED, OPEN
+from morphenepythonapi.exceptions import CallRetriesReached
+
+
+class Testcases(unittest.TestCase):
+
+    def record_errors(self, nodes, node, cnt=3):
+        for i in range(cnt):
+            nodes.record_call(error=True, node=node)
+
+    def test_open_after_errors(self):
+        nodes = Nodes(["a", "b", "c"], -1, 5)
+        self.assertEqual(next(nodes), "a")
+        self.record_errors(nodes, nodes[1], cnt=2)
+        self.assertEqual(nodes[1].state, CLOSED)
+        nodes.record_call(latency=0.1, node=nodes[1])
+        self.record_errors(nodes, nodes[1], cnt=2)
+        self.assertEqual(nodes[1].state, CLOSED)
+        nodes.record_call(error=True, node=nodes[1])
+        self.assertEqual(nodes[1].state, OPEN)
+        self.assertEqual(nodes.available_nodes_count, 2)
+        self.assertEqual(next(nodes), "c")
+        self.assertEqual(next(nodes), "a")
+
+    def test_probe(self):
+        nodes = Nodes(["a", "b"], -1, 5)
+        nodes.breaker_timeout = 0.05
+        probes = []
+        nodes.probe = lambda url: probes.append(url) or len(probes) > 1
+        self.record_errors(nodes, nodes[0])
+        self.assertEqual(nodes[0].state, OPEN)
+        self.assertEqual(nodes.probe_open_nodes(), 1)
+        self.assertEqual(probes, [])
+        time.sleep(0.06)
+        # First probe fails, the wait time doubles
+        self.assertEqual(nodes.probe_open_nodes(), 1)
+        self.assertEqual(nodes[0].state, OPEN)
+        self.assertTrue(nodes.breaker_wait_time(nodes[0]) > 0.05)
+        time.sleep(0.11)
+        self.assertEqual(nodes.probe_open_nodes(), 0)
+        self.assertEqual(nodes[0].state, CLOSED)
+        self.assertEqual(probes, ["a", "a"])
+
+    def test_background_prober(self):
+        nodes = Nodes(["a", "b"], -1, 5)
+        nodes.breaker_timeout = 0.01
+        probe_threads = []
+
+        def probe(url):
+            probe_threads.append(threading.current_thread())
+            return True
+        nodes.probe = probe
+        self.record_errors(nodes, nodes[0])
+        for i in range(100):
+            if nodes[0].state == CLOSED:
+                break
+            time.sleep(0.01)
+        self.assertEqual(nodes[0].state, CLOSED)
+        self.assertTrue(threading.current_thread() not in probe_threads)
+
+    def test_without_probe(self):
+        nodes = Nodes(["a", "b"], -1, 5)
+        nodes.breaker_timeout = 0.01
+        self.record_errors(nodes, nodes[0])
+        self.assertEqual(nodes.available_nodes_count, 1)
+        time.sleep(0.02)
+        self.assertEqual(nodes.available_nodes_count, 2)
+        nodes.record_call(latency=0.1, node=nodes[0])
+        self.assertEqual(nodes[0].state, CLOSED)
+
+    def test_no_sleep_on_open_node(self):
+        nodes = Nodes(["a", "b"], -1, 5)
+        next(nodes)
+        nodes.increase_error_cnt_call()
+        self.record_errors(nodes, nodes[0])
+        start = time.time()
+        with self.assertRaises(CallRetriesReached):
+            nodes.sleep_and_check_retries("error", call_retry=True)
+        nodes.sleep_and_check_retries("error", sleep=True)
+        self.assertTrue(time.time() - start < 0.5)
+
+    def test_rpc_fails_over(self):
+        requests = []
+
+        def request_send(payload, url=None):
+            query = json.loads(payload.decode('utf8'))
+            requests.append(rpc.url)
+            if rpc.url == "http://a":
+                return "<html><body><h1>502 Bad Gateway</h1></body></html>"
+            return json.dumps({"jsonrpc": "2.0", "id": query["id"], "result": {"node": rpc.url}})
+
+        rpc = MorpheneNodeRPC(["http://a", "http://b"], autoconnect=False)
+        rpc.nodes.probe = None
+        rpc.url = next(rpc.nodes)
+        rpc.current_rpc = rpc.rpc_methods["jsonrpc"]
+        rpc.headers = {}
+        rpc.request_send = request_send
+        start = time.time()
+        self.assertEqual(rpc.get_dynamic_global_properties()["node"], "http://b")
+        self.assertTrue(time.time() - start < 5)
+        self.assertEqual(rpc.nodes[0].state, OPEN)
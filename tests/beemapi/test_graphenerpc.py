@@ -0,0 +1,142 @@
+# This Python file uses the following encoding: utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from builtins import range
+import json
+import random
+import threading
+import time
+import unittest
+from morphenepythonapi.exceptions import RPCError
+from morphenepythonapi.graphenerpc import MultiplexedWebsocket
+from websocket._exceptions import WebSocketConnectionClosedException, WebSocketTimeoutException
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
+
+
+class FakeWebSocket(object):
+    """Answers requests in random order from a responder thread"""
+    def __init__(self, answer=True):
+        self.answer = answer
+        self.requests = Queue()
+        self.replies = Queue()
+        self.connected = True
+        self.responder = threading.Thread(target=self._respond)
+        self.responder.daemon = True
+        self.responder.start()
+
+    def _respond(self):
+        while True:
+            batch = [self.requests.get()]
+            time.sleep(0.01)
+            while not self.requests.empty():
+                batch.append(self.requests.get())
+            random.shuffle(batch)
+            for request in batch:
+                if request is None:
+                    return
+                if self.answer:
+                    self.replies.put(json.dumps({"jsonrpc": "2.0", "id": request["id"],
+                                                 "result": request["params"]}))
+
+    def settimeout(self, timeout):
+        pass
+
+    def send(self, payload):
+        self.requests.put(json.loads(payload))
+
+    def recv(self):
+        reply = self.replies.get()
+        if reply is None:
+            raise WebSocketConnectionClosedException("closed")
+        return reply
+
+    def abort(self):
+        self.connected = False
+        self.replies.put(None)
+
+    def close(self):
+        self.requests.put(None)
+
+
+class Testcases(unittest.TestCase):
+
+    def test_multiplexed_websocket(self):
+        transport = MultiplexedWebsocket(FakeWebSocket(), timeout=5)
+        results = {}
+
+        def call(n):
+            payload = json.dumps({"jsonrpc": "2.0", "id": n, "method": "test", "params": [n]})
+            results[n] = json.loads(transport.send(payload.encode("utf8"), n))["result"]
+
+        threads = [threading.Thread(target=call, args=(n, )) for n in range(50)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        transport.close()
+        self.assertEqual(len(results), 50)
+        for n in range(50):
+            self.assertEqual(results[n], [n])
+
+    def test_multiplexed_websocket_parsed(self):
+        transport = MultiplexedWebsocket(FakeWebSocket(), timeout=5)
+        reply, data = transport.send(b'{"jsonrpc": "2.0", "id": 7, "method": "test", "params": [7]}', 7, parsed=True)
+        transport.close()
+        self.assertEqual(json.loads(reply), data)
+        self.assertEqual(data["result"], [7])
+
+    def test_multiplexed_websocket_close(self):
+        transport = MultiplexedWebsocket(FakeWebSocket(answer=False), timeout=5)
+        errors = []
+
+        def call():
+            try:
+                transport.send(b'{"jsonrpc": "2.0", "id": 1, "method": "test", "params": []}', 1)
+            except WebSocketConnectionClosedException as e:
+                errors.append(e)
+
+        t = threading.Thread(target=call)
+        t.start()
+        time.sleep(0.1)
+        transport.close()
+        t.join()
+        self.assertEqual(len(errors), 1)
+        with self.assertRaises(WebSocketConnectionClosedException):
+            transport.send(b'{"jsonrpc": "2.0", "id": 2, "method": "test", "params": []}', 2)
+
+    def test_multiplexed_websocket_invalid_reply(self):
+        ws = FakeWebSocket(answer=False)
+        transport = MultiplexedWebsocket(ws, timeout=5)
+        for reply in ["no json", json.dumps({"jsonrpc": "2.0", "error": {"code": -32700}})]:
+            errors = []
+
+            def call():
+                try:
+                    transport.send(b'{"jsonrpc": "2.0", "id": 1, "method": "test", "params": []}', 1)
+                except RPCError as e:
+                    errors.append(e)
+
+            t = threading.Thread(target=call)
+            t.start()
+            time.sleep(0.1)
+            start = time.time()
+            ws.replies.put(reply)
+            t.join()
+            self.assertLess(time.time() - start, 1)
+            self.assertEqual(len(errors), 1)
+        # The connection is still usable
+        ws.answer = True
+        self.assertEqual(json.loads(transport.send(b'{"jsonrpc": "2.0", "id": 2, "method": "test", "params": [2]}', 2)),
+                         {"jsonrpc": "2.0", "id": 2, "result": [2]})
+        transport.close()
+
+    def test_multiplexed_websocket_timeout(self):
+        transport = MultiplexedWebsocket(FakeWebSocket(answer=False), timeout=0.1)
+        with self.assertRaises(WebSocketTimeoutException):
+            transport.send(b'{"jsonrpc": "2.0", "id": 1, "method": "test", "params": []}', 1)
+        transport.close()
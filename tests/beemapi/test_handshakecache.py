@@ -0,0 +1,96 @@
+# This Python file uses the following encoding: utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from morphenepythonapi.morphenenoderpc import MorpheneNodeRPC
+from morphenepythonapi.localnode import LocalNode
+from morphenepythonapi.handshakecache import HandshakeCache, HANDSHAKE_CACHE_VERSION
+
+
+class Testcases(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.cache_file = os.path.join(self.path, "cache", "handshake.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_cache(self):
+        cache = HandshakeCache(self.cache_file, ttl=0.2)
+        self.assertIsNone(cache.get("http://a"))
+        cache.set("http://a", {"MORPHENE_CHAIN_ID": "00"})
+        cache.set("http://b", {"MORPHENE_CHAIN_ID": "01"})
+        self.assertEqual(cache.get("http://a"), {"MORPHENE_CHAIN_ID": "00"})
+        # A new instance reads the file
+        cache = HandshakeCache(self.cache_file, ttl=0.2)
+        self.assertEqual(cache.get("http://b"), {"MORPHENE_CHAIN_ID": "01"})
+        cache.invalidate("http://b")
+        self.assertIsNone(HandshakeCache(self.cache_file).get("http://b"))
+        time.sleep(0.25)
+        self.assertIsNone(cache.get("http://a"))
+
+    def test_other_version(self):
+        os.makedirs(os.path.dirname(self.cache_file))
+        for content in [json.dumps({"version": HANDSHAKE_CACHE_VERSION + 1, "nodes": {
+                        "http://a": {"time": time.time(), "config": {}}}}), "{\"version\": 1, \"nod"]:
+            with io.open(self.cache_file, "w") as f:
+                f.write(content)
+            cache = HandshakeCache(self.cache_file)
+            self.assertIsNone(cache.get("http://a"))
+            cache.set("http://a", {"MORPHENE_CHAIN_ID": "00"})
+            self.assertEqual(HandshakeCache(self.cache_file).get("http://a"), {"MORPHENE_CHAIN_ID": "00"})
+
+    def test_lazy_connect(self):
+        with LocalNode() as node:
+            rpc = MorpheneNodeRPC(node.url, autoconnect=False)
+            self.assertIsNone(rpc.url)
+            self.assertEqual(node.stats["calls"], 0)
+            self.assertEqual(rpc.get_block(1)["block_id"], node.chain.block_id(1))
+            # get_config of the connect and get_block
+            self.assertEqual(node.stats["calls"], 2)
+            # The network is identified with the config of the handshake
+            self.assertEqual(rpc.get_network()["chain_id"], node.chain.get_config()["MORPHENE_CHAIN_ID"])
+            self.assertEqual(node.stats["calls"], 2)
+
+    def test_cached_handshake(self):
+        with LocalNode() as node:
+            for url in [node.url, node.ws_url]:
+                rpc = MorpheneNodeRPC(url, handshake_cache=self.cache_file)
+                self.assertEqual(node.stats["calls"], 1)
+                rpc.rpcclose()
+                rpc = MorpheneNodeRPC(url, handshake_cache=self.cache_file)
+                self.assertEqual(node.stats["calls"], 1)
+                self.assertEqual(rpc.get_cached_config(), node.chain.get_config())
+                rpc.get_network()
+                self.assertEqual(node.stats["calls"], 1)
+                self.assertEqual(rpc.get_block(1)["block_id"], node.chain.block_id(1))
+                self.assertEqual(node.stats["calls"], 2)
+                rpc.rpcclose()
+                node.stats["calls"] = 0
+            # An expired handshake is done again
+            rpc = MorpheneNodeRPC(node.url, handshake_cache=self.cache_file, handshake_ttl=0)
+            self.assertEqual(node.stats["calls"], 1)
+
+    def test_supported_methods(self):
+        with LocalNode() as node:
+            rpc = MorpheneNodeRPC(node.url, handshake_cache=self.cache_file)
+            self.assertTrue(rpc.supports_method("block_api.get_block_range"))
+            self.assertFalse(rpc.supports_method("block_api.get_block_ranges"))
+            self.assertEqual(node.stats["calls"], 2)
+            # The methods are kept with the handshake
+            rpc = MorpheneNodeRPC(node.url, handshake_cache=self.cache_file)
+            self.assertIn("database_api.get_config", rpc.get_supported_methods())
+            self.assertEqual(node.stats["calls"], 2)
+            # A node which does not list its methods
+            del node.methods["get_methods"]
+            rpc = MorpheneNodeRPC(node.url)
+            self.assertEqual(rpc.get_supported_methods(), set())
@@ -0,0 +1,121 @@
+# This Python file uses the following encoding: utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from builtins import range
+import json
+import threading
+import time
+import unittest
+from morphenepythonapi.morphenenoderpc import MorpheneNodeRPC
+from morphenepythonapi.localnode import LocalNode
+from morphenepythonapi.retry import RetryPolicy
+from morphenepythonapi.rpcutils import get_method_name
+from .rpcfixtures import get_fake_rpc
+
+
+class FakeNodes(object):
+    """Answers http requests after a fixed delay per url"""
+    def __init__(self, delays):
+        self.delays = delays
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def request_send(self, payload, url):
+        query = json.loads(payload.decode('utf8'))
+        with self.lock:
+            self.requests.append((url, get_method_name(query)))
+        time.sleep(self.delays[url])
+        return json.dumps({"jsonrpc": "2.0", "id": query["id"], "result": {"node": url}})
+
+
+class Testcases(unittest.TestCase):
+
+    def get_rpc(self, delays, **kwargs):
+        fake = FakeNodes(delays)
+        rpc = get_fake_rpc(sorted(delays), lambda payload, url=None: fake.request_send(payload, url or rpc.url), **kwargs)
+        return rpc, fake
+
+    def test_hedged_call(self):
+        rpc, fake = self.get_rpc({"http://a": 1, "http://b": 0.01}, hedge=True, hedge_delay=0.05)
+        start = time.time()
+        props = rpc.get_dynamic_global_properties()
+        self.assertTrue(time.time() - start < 0.5)
+        self.assertEqual(props["node"], "http://b")
+        self.assertEqual([r[0] for r in fake.requests], ["http://a", "http://b"])
+        # Only the node which answered gets the latency, measured from its own request
+        self.assertIsNone(rpc.nodes[0].latency)
+        self.assertLess(rpc.nodes[1].latency, 0.5)
+        self.assertEqual(rpc.nodes[0].calls, 0)
+        self.assertEqual(rpc.nodes[1].calls, 1)
+
+    def test_fast_primary(self):
+        rpc, fake = self.get_rpc({"http://a": 0.01, "http://b": 0.01}, hedge=True, hedge_delay=0.5)
+        props = rpc.get_dynamic_global_properties()
+        self.assertEqual(props["node"], "http://a")
+        self.assertEqual(len(fake.requests), 1)
+
+    def test_allow_list(self):
+        rpc, fake = self.get_rpc({"http://a": 0.2, "http://b": 0.01}, hedge=True, hedge_delay=0.01)
+        result = rpc.broadcast_transaction_synchronous({"trx": {}}, api="network_broadcast")
+        self.assertEqual(result["node"], "http://a")
+        self.assertEqual(len(fake.requests), 1)
+
+    def test_disabled_by_default(self):
+        rpc, fake = self.get_rpc({"http://a": 0.2, "http://b": 0.01})
+        self.assertEqual(rpc.get_dynamic_global_properties()["node"], "http://a")
+        self.assertEqual(len(fake.requests), 1)
+
+    def test_percentile_delay(self):
+        rpc, fake = self.get_rpc({"http://a": 0.01, "http://b": 0.01}, hedge=True)
+        self.assertEqual(rpc.get_hedge_delay(), 1.)
+        for i in range(20):
+            rpc.nodes.record_call(latency=0.01 * (i + 1))
+        self.assertAlmostEqual(rpc.get_hedge_delay(), 0.19)
+
+    def test_call_state(self):
+        rpc, fake = self.get_rpc({"http://a": 0.2, "http://b": 0.01}, hedge=True, hedge_delay=0.01,
+                                 retry_policy=RetryPolicy(deadline=5))
+        states = []
+        request_send = rpc.request_send
+
+        def recording_request_send(payload, url=None):
+            states.append((rpc.lanes.priority, rpc.nodes.remaining_time))
+            return request_send(payload, url=url)
+        rpc.request_send = recording_request_send
+        with rpc.priority("bulk"):
+            rpc.get_dynamic_global_properties()
+        self.assertEqual(len(states), 2)
+        for priority, remaining_time in states:
+            self.assertEqual(priority, "bulk")
+            self.assertTrue(0 < remaining_time <= 5)
+
+    def test_cancel_slower_request(self):
+        with LocalNode() as slow_node, LocalNode() as fast_node:
+            rpc = MorpheneNodeRPC([slow_node.url, fast_node.url], hedge=True, hedge_delay=0.05,
+                                  handshake_cache=False)
+            self.assertEqual(rpc.url, slow_node.url)
+            slow_node.latency = 2
+            start = time.time()
+            rpc.get_dynamic_global_properties(api="database")
+            self.assertTrue(time.time() - start < 1)
+            # The slower request does not wait for its reply
+            while any(t.name == "rpc-hedge" for t in threading.enumerate()) and time.time() - start < 1.5:
+                time.sleep(0.01)
+            self.assertFalse(any(t.name == "rpc-hedge" for t in threading.enumerate()))
+
+    def test_cancel_after_release(self):
+        with LocalNode() as node:
+            rpc = MorpheneNodeRPC(node.url, hedge=True, handshake_cache=False)
+            session = rpc.get_hedge_session()
+            adapter = rpc._hedge_adapter
+            token = object()
+            adapter.bind(token)
+            payload = json.dumps({"jsonrpc": "2.0", "id": 1, "method": "condenser_api.get_config", "params": []})
+            self.assertEqual(session.post(node.url, data=payload).status_code, 200)
+            # The connection went back to the pool, it is no longer tracked under the token
+            self.assertNotIn(token, adapter._in_flight)
+            adapter.bind(None)
+            adapter.cancel(token)
+            self.assertEqual(session.post(node.url, data=payload).status_code, 200)
@@ -0,0 +1,44 @@
+# This Python file uses the following encoding: utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import json
+import unittest
+from morphenepythonapi import jsoncodec
+from morphenepythonapi.rpcutils import get_query
+
+
+class Testcases(unittest.TestCase):
+
+    def tearDown(self):
+        jsoncodec.set_codec()
+
+    def test_roundtrip(self):
+        for codec in jsoncodec.CODECS:
+            jsoncodec.set_codec(codec)
+            self.assertEqual(jsoncodec.get_codec(), codec)
+            obj = {"b": [1, 2.5, None, True], "a": "äöü", "big": 2 ** 70}
+            data = jsoncodec.dumpb(obj)
+            self.assertTrue(isinstance(data, bytes))
+            self.assertEqual(json.loads(data.decode('utf8')), obj)
+            self.assertEqual(jsoncodec.loads(data), obj)
+            self.assertEqual(jsoncodec.loads(data.decode('utf8')), obj)
+            self.assertEqual(jsoncodec.dumps({"b": 1, "a": 2}, sort_keys=True).replace(" ", ""), '{"a":2,"b":1}')
+            # Control characters within strings are accepted
+            self.assertEqual(jsoncodec.loads('{"a": "x\ty"}'), {"a": "x\ty"})
+            with self.assertRaises(ValueError):
+                jsoncodec.loads('{"a": ')
+
+    def test_unknown_codec(self):
+        with self.assertRaises(ValueError):
+            jsoncodec.set_codec("simplejson")
+
+    def test_query(self):
+        params = {"account": "test"}
+        query = get_query(1, "database_api", "find_accounts", (params, ))
+        self.assertIs(query["params"], params)
+        query = get_query(1, "database_api", "get_block", (1, ))
+        self.assertEqual(query["params"], ["database_api", "get_block", [1]])
+        query = get_query(1, "block_api", "get_block", (({"block_num": 1}, {"block_num": 2}), ))
+        self.assertEqual([q["id"] for q in query], [1, 2])
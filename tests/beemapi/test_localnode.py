@@ -0,0 +1,78 @@
+# This Python file uses the following encoding: utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from builtins import range
+import unittest
+from morphenepythonapi.morphenenoderpc import MorpheneNodeRPC
+from morphenepythonapi.localnode import LocalNode, SyntheticChain, RecordedChain
+from morphenepythonapi.exceptions import NoMethodWithName
+
+
+class Testcases(unittest.TestCase):
+
+    def test_synthetic_chain(self):
+        chain = SyntheticChain(head_block_num=100, seed=1)
+        self.assertEqual(chain.get_block(10), SyntheticChain(head_block_num=100, seed=1).get_block(10))
+        self.assertNotEqual(chain.get_block(10), SyntheticChain(head_block_num=100, seed=2).get_block(10))
+        self.assertEqual(chain.get_block(10)["previous"], chain.get_block(9)["block_id"])
+        self.assertEqual(int(chain.get_block(10)["block_id"][:8], 16), 10)
+        self.assertIsNone(chain.get_block(101))
+        self.assertEqual(chain.get_dynamic_global_properties()["last_irreversible_block_num"], 80)
+        history = chain.get_account_history("test1", -1, 9)
+        self.assertEqual(len(history), 10)
+        self.assertEqual([h[0] for h in history], list(range(history[0][0], history[0][0] + 10)))
+        self.assertEqual(chain.get_account_history("test1", 3, 3)[0][0], 0)
+        for index, op in history:
+            self.assertIn("test1", [op["op"][1]["from"], op["op"][1]["to"]])
+
+    def test_recorded_chain(self):
+        chain = SyntheticChain(head_block_num=20)
+        recorded = RecordedChain([chain.get_block(n) for n in range(5, 11)])
+        self.assertEqual(recorded.head_block_num, 10)
+        self.assertEqual(recorded.get_block(7), chain.get_block(7))
+        self.assertIsNone(recorded.get_block(4))
+        self.assertTrue(set(recorded.accounts) <= set(chain.accounts))
+
+    def test_http_and_websocket(self):
+        with LocalNode(SyntheticChain(head_block_num=100)) as node:
+            for url in [node.url, node.ws_url]:
+                rpc = MorpheneNodeRPC(url, num_retries=2)
+                self.assertEqual(rpc.get_dynamic_global_properties(api="database")["head_block_number"], 100)
+                self.assertEqual(rpc.get_block(5), node.chain.get_block(5))
+                self.assertEqual(rpc.get_block({"block_num": 6}, api="block")["block"], node.chain.get_block(6))
+                self.assertEqual(len(rpc.get_accounts(["test1", "unknown"])), 1)
+                with rpc.batch() as batch:
+                    for n in range(1, 21):
+                        batch.get_block(n)
+                self.assertEqual([f.result()["block_id"] for f in batch.futures],
+                                 [node.chain.block_id(n) for n in range(1, 21)])
+                with self.assertRaises(NoMethodWithName):
+                    rpc.get_unknown_thing()
+                rpc.rpcclose()
+
+    def test_error_injection(self):
+        with LocalNode(error_rate=0.3, seed=1) as node:
+            rpc = MorpheneNodeRPC(node.url, num_retries=-1, num_retries_call=20)
+            rpc.nodes.retry_delay = lambda cnt: 0
+            for n in range(1, 21):
+                self.assertEqual(rpc.get_block(n)["block_id"], node.chain.block_id(n))
+            self.assertTrue(node.stats["errors"] > 0)
+
+    def test_throttling(self):
+        with LocalNode(rate_limit=20, retry_after=0) as node:
+            rpc = MorpheneNodeRPC(node.url, num_retries=-1, num_retries_call=100)
+            rpc.nodes.retry_delay = lambda cnt: 0.05
+            for n in range(1, 41):
+                self.assertEqual(rpc.get_block(n)["block_id"], node.chain.block_id(n))
+            self.assertTrue(node.stats["throttled"] > 0)
+
+    def test_failover(self):
+        with LocalNode() as first, LocalNode() as second:
+            rpc = MorpheneNodeRPC([first.url, second.url], num_retries=-1)
+            rpc.nodes.retry_delay = lambda cnt: 0
+            self.assertEqual(rpc.url, first.url)
+            first.stop()
+            self.assertEqual(rpc.get_block(1)["block_id"], second.chain.block_id(1))
+            self.assertEqual(rpc.url, second.url)
@@ -0,0 +1,94 @@
+# This Python file uses the following encoding: utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+import json
+import unittest
+try:
+    from urllib.request import urlopen
+except ImportError:
+    from urllib2 import urlopen
+from morphenepythonapi.morphenenoderpc import MorpheneNodeRPC
+from morphenepythonapi.metrics import RPCMetrics, get_metric_method
+
+
+class Testcases(unittest.TestCase):
+
+    def test_method_label(self):
+        self.assertEqual(get_metric_method({"method": "call", "params": ["database_api", "get_config", []]}),
+                         "database_api.get_config")
+        self.assertEqual(get_metric_method({"method": "condenser_api.get_block", "params": [1]}),
+                         "condenser_api.get_block")
+        batch = [{"method": "call", "params": ["database_api", "get_block", [i]]} for i in range(3)]
+        self.assertEqual(get_metric_method(batch), "database_api.get_block")
+        batch.append({"method": "call", "params": ["database_api", "get_config", []]})
+        self.assertEqual(get_metric_method(batch), "batch")
+
+    def test_snapshot(self):
+        metrics = RPCMetrics()
+        metrics.observe("http://a", "get_config", 0.02, 50, 500)
+        metrics.observe("http://a", "get_config", 3., 50, 0, error=ValueError())
+        metrics.inc_retry("http://a", "get_config")
+        metrics.inc_node_switch("http://a")
+        metrics.inc_node_switch("http://b")
+        snapshot = metrics.snapshot()
+        m = snapshot["http://a"]["methods"]["get_config"]
+        self.assertEqual(m["requests"], 2)
+        self.assertEqual(m["retries"], 1)
+        self.assertEqual(m["request_bytes"], 100)
+        self.assertEqual(m["response_bytes"], 500)
+        self.assertEqual(m["errors"], {"ValueError": 1})
+        self.assertEqual(m["latency"]["count"], 2)
+        self.assertEqual(m["latency"]["buckets"]["0.01"], 0)
+        self.assertEqual(m["latency"]["buckets"]["0.025"], 1)
+        self.assertEqual(m["latency"]["buckets"]["5.0"], 2)
+        self.assertEqual(m["latency"]["buckets"]["+Inf"], 2)
+        self.assertEqual(snapshot["http://a"]["node_switches"], 1)
+        self.assertEqual(snapshot["http://b"], {"node_switches": 1, "methods": {}})
+        json.dumps(snapshot)
+
+    def test_prometheus(self):
+        metrics = RPCMetrics()
+        metrics.observe('http://"a"', "get_config", 0.02, 50, 500, error="RPCError")
+        text = metrics.to_prometheus()
+        self.assertIn('morphene_rpc_requests_total{node="http://\\"a\\"",method="get_config"} 1\n', text)
+        self.assertIn('morphene_rpc_errors_total{node="http://\\"a\\"",method="get_config",error="RPCError"} 1\n', text)
+        self.assertIn('morphene_rpc_request_duration_seconds_bucket{node="http://\\"a\\"",method="get_config",le="+Inf"} 1\n', text)
+        self.assertIn("# TYPE morphene_rpc_request_duration_seconds histogram\n", text)
+        server = metrics_server = None
+        try:
+            from morphenepythonapi.metrics import start_metrics_server
+            server = start_metrics_server(metrics, port=0)
+            metrics_server = urlopen("http://127.0.0.1:%d/metrics" % server.server_address[1], timeout=5)
+            self.assertEqual(metrics_server.read().decode('utf8'), metrics.to_prometheus())
+        finally:
+            if metrics_server is not None:
+                metrics_server.close()
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+
+    def test_rpc(self):
+        url = "http://127.0.0.1:8090"
+        replies = ["", json.dumps({"jsonrpc": "2.0", "id": 1, "error": {"message": "Internal Error"}})]
+
+        def request_send(payload, url=None):
+            query = json.loads(payload.decode('utf8'))
+            if replies:
+                return replies.pop(0)
+            return json.dumps({"jsonrpc": "2.0", "id": query["id"], "result": {"ok": True}})
+
+        rpc = MorpheneNodeRPC(url, autoconnect=False, num_retries_call=3)
+        rpc.url = url
+        rpc.current_rpc = rpc.rpc_methods["jsonrpc"]
+        rpc.request_send = request_send
+        rpc.nodes.retry_delay = lambda cnt: 0
+        rpc.coalesce = False
+        self.assertEqual(rpc.get_config(api="database"), {"ok": True})
+        m = rpc.metrics()[url]["methods"]["database_api.get_config"]
+        self.assertEqual(m["requests"], 3)
+        self.assertEqual(m["retries"], 2)
+        self.assertEqual(m["errors"], {"EmptyReply": 1, "RPCError": 1})
+        self.assertTrue(m["request_bytes"] > 0)
+        self.assertIn("morphene_rpc_retries_total", rpc.metrics_prometheus())
@@ -0,0 +1,96 @@
+# This Python file uses the following encoding: utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from builtins import range
+import json
+import unittest
+from morphenepythonapi.node import Nodes
+
+
+class Testcases(unittest.TestCase):
+
+    def get_nodes(self, policy):
+        nodes = Nodes(["a", "b", "c"], 5, 5, policy=policy)
+        for node, latency in zip(nodes[:], [0.3, 0.05, 0.2]):
+            for i in range(5):
+                nodes.record_call(latency=latency, node=node)
+        return nodes
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            Nodes(["a", "b"], 5, 5, policy="fastest")
+
+    def test_ewma(self):
+        nodes = Nodes(["a"], 5, 5, ewma_alpha=0.5)
+        nodes.record_call(latency=1.)
+        self.assertEqual(nodes.node.latency, 1.)
+        nodes.record_call(latency=0.)
+        self.assertEqual(nodes.node.latency, 0.5)
+        nodes.record_call(error=True)
+        self.assertEqual(nodes.node.latency, 0.5)
+        self.assertEqual(nodes.node.error_rate, 0.5)
+        self.assertEqual(nodes.node.calls, 3)
+
+    def test_head_lag(self):
+        nodes = Nodes(["a", "b"], 5, 5, ewma_alpha=1.)
+        nodes.record_head_block(100, node=nodes[0])
+        nodes.record_head_block(90, node=nodes[1])
+        self.assertEqual(nodes[0].head_lag, 0)
+        self.assertEqual(nodes[1].head_lag, 10)
+        for node in nodes[:]:
+            nodes.record_call(latency=0.1, node=node)
+        self.assertTrue(nodes.score(nodes[1]) > nodes.score(nodes[0]))
+
+    def test_lowest_latency(self):
+        nodes = Nodes(["a", "b", "c"], 5, 5, policy="lowest_latency")
+        # Nodes without samples are tried first
+        self.assertEqual(next(nodes), "a")
+        nodes.record_call(latency=0.3)
+        self.assertEqual(next(nodes), "b")
+        nodes.record_call(latency=0.05)
+        self.assertEqual(next(nodes), "c")
+        nodes.record_call(latency=0.2)
+        self.assertEqual(nodes.select(), "b")
+        # The current node is skipped when switching after an error
+        self.assertEqual(next(nodes), "c")
+        for i in range(10):
+            nodes.record_call(error=True, node=nodes[1])
+        self.assertEqual(nodes.select(), "c")
+
+    def test_weighted_random(self):
+        nodes = self.get_nodes("weighted_random")
+        counts = {"a": 0, "b": 0, "c": 0}
+        for i in range(2000):
+            counts[nodes.select()] += 1
+        self.assertTrue(counts["b"] > counts["c"] > counts["a"] > 0)
+
+    def test_power_of_two(self):
+        nodes = self.get_nodes("power_of_two")
+        counts = {"a": 0, "b": 0, "c": 0}
+        for i in range(2000):
+            counts[nodes.select()] += 1
+        # The slowest node never wins a comparison
+        self.assertEqual(counts["a"], 0)
+        self.assertTrue(counts["b"] > counts["c"])
+
+    def test_reselect(self):
+        nodes = self.get_nodes("lowest_latency")
+        nodes.current_node_index = 0
+        self.assertFalse(nodes.needs_reselect)
+        for i in range(nodes.reselect_calls):
+            nodes.record_call(latency=0.3)
+        self.assertTrue(nodes.needs_reselect)
+        self.assertEqual(nodes.select(), "b")
+        self.assertFalse(nodes.needs_reselect)
+
+    def test_export_import_stats(self):
+        nodes = self.get_nodes("lowest_latency")
+        stats = json.loads(json.dumps(nodes.export_stats()))
+        nodes2 = Nodes(["c", "b", "d"], 5, 5, policy="lowest_latency", stats=stats)
+        self.assertEqual(nodes2[0].latency, nodes[2].latency)
+        self.assertEqual(nodes2[1].latency, nodes[1].latency)
+        self.assertIsNone(nodes2[2].latency)
+        nodes3 = Nodes(nodes, 5, 5)
+        self.assertEqual(nodes3[1].latency, nodes[1].latency)
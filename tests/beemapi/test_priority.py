@@ -0,0 +1,135 @@
+# This Python file uses the following encoding: utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from builtins import range
+import json
+import threading
+import time
+import unittest
+from morphenepythonapi.morphenenoderpc import MorpheneNodeRPC
+from morphenepythonapi.localnode import LocalNode
+from morphenepythonapi.priority import PriorityLanes, CRITICAL, NORMAL, BULK
+from morphenepythonapi.rpcutils import get_query
+from .rpcfixtures import get_fake_rpc
+
+
+class Testcases(unittest.TestCase):
+
+    def test_get_priority(self):
+        lanes = PriorityLanes()
+        broadcast = get_query(1, "network_broadcast_api", "broadcast_transaction", ({}, ))
+        block = get_query(2, "database_api", "get_block", (1, ))
+        self.assertEqual(lanes.get_priority(broadcast), CRITICAL)
+        self.assertEqual(lanes.get_priority("verify_authority"), CRITICAL)
+        self.assertEqual(lanes.get_priority(block), NORMAL)
+        self.assertEqual(lanes.get_priority([broadcast, block]), NORMAL)
+        with lanes.use(BULK):
+            self.assertEqual(lanes.get_priority(broadcast), BULK)
+            with lanes.use(CRITICAL):
+                self.assertEqual(lanes.get_priority(block), CRITICAL)
+            self.assertEqual(lanes.priority, BULK)
+        self.assertIsNone(lanes.priority)
+        with self.assertRaises(ValueError):
+            lanes.set_priority("urgent")
+
+    def test_bulk_share(self):
+        lock = threading.Lock()
+        in_flight = {BULK: 0, NORMAL: 0}
+        max_in_flight = {BULK: 0, NORMAL: 0}
+        rpc = None
+
+        def request_send(payload, url=None):
+            query = json.loads(payload.decode('utf8'))
+            priority = rpc.lanes.priority
+            with lock:
+                in_flight[priority] += 1
+                max_in_flight[priority] = max(max_in_flight[priority], in_flight[priority])
+            time.sleep(0.02)
+            with lock:
+                in_flight[priority] -= 1
+            return json.dumps({"jsonrpc": "2.0", "id": query["id"], "result": {}})
+
+        rpc = get_fake_rpc("http://127.0.0.1:8090", request_send, pool_size=8, bulk_share=0.5)
+
+        def work(priority):
+            with rpc.priority(priority):
+                for i in range(5):
+                    rpc.get_block(1)
+        threads = [threading.Thread(target=work, args=(BULK if i < 12 else NORMAL, )) for i in range(16)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(max_in_flight[BULK], 4)
+        self.assertEqual(max_in_flight[NORMAL], 4)
+
+    def test_pool_size(self):
+        rpc = get_fake_rpc("http://127.0.0.1:8090", None, bulk_share=0.5)
+        self.assertEqual(rpc.lanes.max_bulk_requests, 5)
+        rpc.ensure_pool_size(16)
+        self.assertEqual(rpc.lanes.max_bulk_requests, 8)
+        rpc.ensure_pool_size(4)
+        self.assertEqual(rpc.pool_size, 16)
+        rpc.ensure_bulk_requests(12)
+        self.assertEqual(rpc.pool_size, 24)
+        self.assertEqual(rpc.lanes.max_bulk_requests, 12)
+        # Bulk calls get half of the connections by default
+        self.assertEqual(get_fake_rpc("http://127.0.0.1:8090", None).lanes.max_bulk_requests, 5)
+        self.assertIsNone(get_fake_rpc("http://127.0.0.1:8090", None, bulk_share=None).lanes.max_bulk_requests)
+
+    def test_pool_size_connected(self):
+        with LocalNode() as node:
+            rpc = MorpheneNodeRPC(node.url)
+            shared_session = rpc.session
+            rpc.ensure_pool_size(16)
+            # The requests of the connected client use the new pool
+            self.assertIsNot(rpc.session, shared_session)
+            adapter = rpc.session.get_adapter(node.url)
+            self.assertEqual(adapter._pool_maxsize, 16)
+            self.assertTrue(adapter._pool_block)
+            self.assertIs(rpc.get_session(), rpc.session)
+            self.assertIsNot(MorpheneNodeRPC(node.url, autoconnect=False).get_session(), rpc.session)
+            rpc.get_block(1)
+            self.assertEqual(len(rpc.session.get_adapter(node.url).poolmanager.pools), 1)
+
+    def test_batch_priority(self):
+        priorities = []
+        rpc = None
+
+        def request_send(payload, url=None):
+            priorities.append(rpc.lanes.priority)
+            queries = json.loads(payload.decode('utf8'))
+            return json.dumps([{"jsonrpc": "2.0", "id": q["id"], "result": {}} for q in queries])
+
+        rpc = get_fake_rpc("http://127.0.0.1:8090", request_send)
+        with rpc.priority(BULK):
+            with rpc.batch(max_batch_size=10, max_workers=4) as batch:
+                for n in range(100):
+                    batch.get_block(n)
+        self.assertEqual(priorities, [BULK] * 10)
+
+    def test_reserved_connections(self):
+        with LocalNode() as node:
+            rpc = MorpheneNodeRPC(node.url, critical_pool_size=3)
+            self.assertIsNone(rpc._critical_session)
+            rpc.broadcast_transaction({"operations": []}, api="network_broadcast")
+            self.assertEqual(len(node.broadcasts), 1)
+            adapter = rpc._critical_session.get_adapter(node.url)
+            self.assertEqual(adapter._pool_maxsize, 3)
+            self.assertIsNot(rpc._critical_session, rpc.get_session())
+
+    def test_critical_nodes(self):
+        with LocalNode() as node, LocalNode() as critical_node:
+            rpc = MorpheneNodeRPC(node.url, critical_nodes=[critical_node.url])
+            rpc.get_block(1)
+            rpc.broadcast_transaction({"operations": []}, api="network_broadcast")
+            with rpc.priority(CRITICAL):
+                rpc.get_dynamic_global_properties()
+            self.assertEqual(len(node.broadcasts), 0)
+            self.assertEqual(len(critical_node.broadcasts), 1)
+            # get_config of the connect, and the two critical calls
+            self.assertEqual(critical_node.stats["calls"], 3)
+            self.assertEqual(node.stats["calls"], 2)
+            self.assertIs(rpc.get_critical_rpc().rpc_metrics, rpc.rpc_metrics)
@@ -0,0 +1,103 @@
+# This Python file uses the following encoding: utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from builtins import range
+import json
+import threading
+import time
+import unittest
+from morphenepythonapi.morphenenoderpc import MorpheneNodeRPC
+from morphenepythonapi.ratelimit import AdaptiveRateLimiter, get_rate_limiter, get_rates, parse_retry_after
+
+
+class FakeResponse(object):
+    def __init__(self, status_code, text, headers={}):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers
+
+
+class FakeSession(object):
+    """Throttles every second request"""
+    def __init__(self):
+        self.cnt = 0
+
+    def post(self, url, data=None, **kwargs):
+        self.cnt += 1
+        if self.cnt % 2 == 0:
+            return FakeResponse(429, "429 Too Many Requests", {"Retry-After": "0"})
+        query = json.loads(data.decode('utf8'))
+        return FakeResponse(200, json.dumps({"jsonrpc": "2.0", "id": query["id"], "result": {}}))
+
+
+class Testcases(unittest.TestCase):
+
+    def test_token_bucket(self):
+        limiter = AdaptiveRateLimiter(rate=100)
+        limiter.burst_seconds = 0.1
+        limiter.tokens = limiter.burst
+        start = time.time()
+        for i in range(60):
+            limiter.acquire()
+        duration = time.time() - start
+        self.assertTrue(0.4 < duration < 1.0)
+
+    def test_shared_by_threads(self):
+        limiter = AdaptiveRateLimiter(rate=100)
+        limiter.burst_seconds = 0
+        limiter.tokens = 0
+
+        def work():
+            for i in range(20):
+                limiter.acquire()
+        threads = [threading.Thread(target=work) for i in range(4)]
+        start = time.time()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        duration = time.time() - start
+        self.assertTrue(0.7 < duration < 1.5)
+
+    def test_aimd(self):
+        limiter = AdaptiveRateLimiter(rate=10)
+        limiter.increase()
+        self.assertAlmostEqual(limiter.rate, 10.1)
+        limiter.decrease()
+        self.assertAlmostEqual(limiter.rate, 5.05)
+        # Throttled requests of the same burst lower the rate once
+        limiter.decrease()
+        self.assertAlmostEqual(limiter.rate, 5.05)
+        limiter.last_decrease = 0
+        for i in range(20):
+            limiter.last_decrease = 0
+            limiter.decrease()
+        self.assertEqual(limiter.rate, limiter.min_rate)
+
+    def test_retry_after(self):
+        self.assertEqual(parse_retry_after("2"), 2)
+        self.assertIsNone(parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"))
+        self.assertIsNone(parse_retry_after(None))
+        limiter = AdaptiveRateLimiter(rate=1000)
+        limiter.decrease(retry_after=0.2)
+        self.assertTrue(limiter.acquire() > 0.1)
+
+    def test_shared_by_clients(self):
+        self.assertIs(get_rate_limiter("http://shared"), get_rate_limiter("http://shared"))
+        self.assertIn("http://shared", get_rates())
+
+    def test_rpc_backs_off(self):
+        url = "http://127.0.0.1:8099"
+        rpc = MorpheneNodeRPC(url, autoconnect=False, rate_limit=True, num_retries_call=10)
+        rpc.url = url
+        rpc.current_rpc = rpc.rpc_methods["jsonrpc"]
+        rpc.headers = {}
+        rpc.session = FakeSession()
+        rpc.nodes.retry_delay = lambda cnt: 0
+        start_rate = rpc.get_rate_limit()
+        for i in range(3):
+            rpc.get_config()
+        self.assertTrue(rpc.get_rate_limit() < start_rate)
+        self.assertIsNone(MorpheneNodeRPC(url, autoconnect=False).get_rate_limit())
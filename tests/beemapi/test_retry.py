@@ -0,0 +1,80 @@
+# This Python file uses the following encoding: utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from builtins import range
+import time
+import unittest
+from morphenepythonapi.morphenenoderpc import MorpheneNodeRPC
+from morphenepythonapi.localnode import LocalNode
+from morphenepythonapi.retry import RetryPolicy
+from morphenepythonapi.rpcutils import get_query
+from morphenepythonapi.node import Nodes
+from morphenepythonapi.exceptions import DeadlineExceeded
+
+
+class Testcases(unittest.TestCase):
+
+    def test_delay(self):
+        policy = RetryPolicy(base_delay=0.5, max_delay=10, jitter=False)
+        self.assertEqual([policy.delay(cnt) for cnt in range(7)], [0, 0.5, 1, 2, 4, 8, 10])
+        self.assertEqual(policy.delay(1000), 10)
+        policy = RetryPolicy(base_delay=0.5, max_delay=10)
+        for cnt in range(1, 10):
+            delays = [policy.delay(cnt) for i in range(100)]
+            self.assertTrue(all(0 <= d <= min(10, 0.5 * 2 ** (cnt - 1)) for d in delays))
+            self.assertGreater(len(set(delays)), 1)
+
+    def test_get_deadline(self):
+        policy = RetryPolicy(deadline=10, method_deadlines={"get_dynamic_global_properties": 2,
+                                                            "get_account_history": 30})
+        self.assertEqual(policy.get_deadline(), 10)
+        query = get_query(1, "database_api", "get_dynamic_global_properties", [])
+        self.assertEqual(policy.get_deadline(query), 2)
+        query = get_query(1, "condenser_api", "get_account_history", ("test", -1, 10))
+        self.assertEqual(policy.get_deadline([query, query]), 30)
+        query2 = get_query(1, "database_api", "get_block", (1, ))
+        self.assertEqual(policy.get_deadline(query2), 10)
+        self.assertEqual(policy.get_deadline([query, query2]), 10)
+
+    def test_nested_calls(self):
+        nodes = Nodes(["a"], -1, -1, retry_policy=RetryPolicy(deadline=1))
+        self.assertIsNone(nodes.remaining_time)
+        self.assertTrue(nodes.start_call())
+        remaining = nodes.remaining_time
+        self.assertFalse(nodes.start_call())
+        self.assertLessEqual(nodes.remaining_time, remaining)
+        self.assertEqual(nodes.get_timeout(0.1), 0.1)
+        self.assertLessEqual(nodes.get_timeout(60), 1)
+        nodes.end_call()
+        self.assertIsNone(nodes.remaining_time)
+        self.assertEqual(nodes.get_timeout(60), 60)
+
+    def test_deadline_on_errors(self):
+        policy = RetryPolicy(deadline=0.5, base_delay=0.2)
+        with LocalNode() as node:
+            rpc = MorpheneNodeRPC(node.url, num_retries=-1, num_retries_call=1000, retry_policy=policy)
+            node.error_rate = 1.
+            start = time.time()
+            with self.assertRaises(DeadlineExceeded):
+                rpc.get_block(1)
+            self.assertLess(time.time() - start, 1.)
+            # The next call gets its own deadline
+            node.error_rate = 0.
+            self.assertEqual(rpc.get_block(1)["block_id"], node.chain.block_id(1))
+
+    def test_deadline_bounds_request_timeout(self):
+        policy = RetryPolicy(method_deadlines={"get_block": 0.3})
+        with LocalNode() as node:
+            for url in [node.url, node.ws_url]:
+                rpc = MorpheneNodeRPC(url, num_retries=-1, timeout=30, retry_policy=policy)
+                node.latency = 2.
+                start = time.time()
+                with self.assertRaises(DeadlineExceeded):
+                    rpc.get_block(1)
+                self.assertLess(time.time() - start, 1.)
+                node.latency = 0.
+                # Methods without a deadline are not limited
+                self.assertEqual(rpc.get_config()["MORPHENE_CHAIN_ID"], node.chain.get_config()["MORPHENE_CHAIN_ID"])
+                rpc.rpcclose()
@@ -0,0 +1,120 @@
+# This Python file uses the following encoding: utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from builtins import range
+import json
+import random
+import threading
+import time
+import unittest
+from morphenepythonapi import exceptions
+from .rpcfixtures import get_fake_rpc
+
+
+class FakeNode(object):
+    """Answers batches over the http transport of a rpc instance"""
+    def __init__(self, reject_batches=False):
+        self.reject_batches = reject_batches
+        self.batch_sizes = []
+        self.payload_bytes = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def request_send(self, payload):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            self.batch_sizes.append(len(json.loads(payload.decode('utf8'))))
+            self.payload_bytes.append(len(payload))
+        time.sleep(0.02)
+        with self.lock:
+            self.active -= 1
+        if self.reject_batches:
+            return json.dumps({"jsonrpc": "2.0", "id": None, "error": {"message": "Batch requests are disabled"}})
+        replies = []
+        for request in json.loads(payload.decode('utf8')):
+            name = request["params"][1]
+            if name == "get_block":
+                block_num = request["params"][2][0]
+                replies.append({"jsonrpc": "2.0", "id": request["id"],
+                                "result": {"block_num": block_num, "block_id": "%08x" % block_num + "0" * 32}})
+            else:
+                replies.append({"jsonrpc": "2.0", "id": request["id"],
+                                "error": {"code": -32601, "message": "Could not find method %s" % name}})
+        random.shuffle(replies)
+        return json.dumps(replies)
+
+
+class Testcases(unittest.TestCase):
+
+    def test_results_by_call(self):
+        node = FakeNode()
+        rpc = get_fake_rpc("http://127.0.0.1:8090", node.request_send)
+        with rpc.batch(max_batch_size=10) as batch:
+            futures = [batch.get_block(n) for n in range(1, 36)]
+        self.assertEqual([f.result()["block_num"] for f in futures], list(range(1, 36)))
+        self.assertEqual(sorted(node.batch_sizes), [5, 10, 10, 10])
+        self.assertTrue(node.max_active > 1)
+
+    def test_add_to_queue(self):
+        node = FakeNode()
+        rpc = get_fake_rpc("http://127.0.0.1:8090", node.request_send)
+        with self.assertRaises(TypeError):
+            rpc.get_block(1, add_to_queue=True)
+        with self.assertRaises(TypeError):
+            rpc.get_block(1, add_to_queue=False)
+        self.assertEqual(node.batch_sizes, [])
+
+    def test_split_by_bytes(self):
+        node = FakeNode()
+        rpc = get_fake_rpc("http://127.0.0.1:8090", node.request_send)
+        with rpc.batch(max_batch_size=None, max_payload_bytes=500) as batch:
+            futures = [batch.get_block(n) for n in range(1, 51)]
+        self.assertEqual([f.result()["block_num"] for f in futures], list(range(1, 51)))
+        self.assertTrue(len(node.batch_sizes) > 1)
+        self.assertTrue(max(node.payload_bytes) <= 500)
+
+    def test_single_worker(self):
+        node = FakeNode()
+        rpc = get_fake_rpc("http://127.0.0.1:8090", node.request_send)
+        with rpc.batch(max_batch_size=2, max_workers=1) as batch:
+            futures = [batch.get_block(n) for n in range(1, 6)]
+        self.assertEqual(node.max_active, 1)
+        self.assertEqual([f.result()["block_num"] for f in futures], list(range(1, 6)))
+
+    def test_per_call_errors(self):
+        node = FakeNode()
+        rpc = get_fake_rpc("http://127.0.0.1:8090", node.request_send)
+        with rpc.batch() as batch:
+            f1 = batch.get_block(1)
+            f2 = batch.get_unknown_method(2)
+            f3 = batch.get_block(3)
+        self.assertEqual(f1.result()["block_num"], 1)
+        self.assertEqual(f3.result()["block_num"], 3)
+        self.assertIsInstance(f2.exception(), exceptions.NoMethodWithName)
+        with self.assertRaises(exceptions.NoMethodWithName):
+            f2.result()
+
+    def test_result_sends_batch(self):
+        node = FakeNode()
+        rpc = get_fake_rpc("http://127.0.0.1:8090", node.request_send)
+        batch = rpc.batch()
+        f1 = batch.get_block(1)
+        f2 = batch.get_block(2)
+        self.assertFalse(f2.done())
+        self.assertEqual(f1.result()["block_num"], 1)
+        self.assertTrue(f2.done())
+        self.assertEqual(node.batch_sizes, [2])
+        with self.assertRaises(exceptions.RPCError):
+            batch.get_block(3)
+
+    def test_rejected_batch(self):
+        node = FakeNode(reject_batches=True)
+        rpc = get_fake_rpc("http://127.0.0.1:8090", node.request_send)
+        with rpc.batch() as batch:
+            futures = [batch.get_block(n) for n in range(1, 4)]
+        for f in futures:
+            self.assertIsInstance(f.exception(), exceptions.RPCError)
@@ -0,0 +1,92 @@
+# This Python file uses the following encoding: utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from builtins import range
+import json
+import threading
+import time
+import unittest
+from morphenepythonapi.node import Nodes
+from .rpcfixtures import get_fake_rpc
+
+
+def run_threads(func, n=64):
+    errors = []
+
+    def work(i):
+        try:
+            func(i)
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=work, args=(i, )) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return errors
+
+
+class Testcases(unittest.TestCase):
+
+    def test_shared_by_threads(self):
+        ids = []
+        lock = threading.Lock()
+
+        def request_send(payload, url=None):
+            query = json.loads(payload.decode('utf8'))
+            with lock:
+                ids.append(query["id"])
+            time.sleep(0.001)
+            return json.dumps({"jsonrpc": "2.0", "id": query["id"], "result": query["params"]})
+
+        rpc = get_fake_rpc("http://127.0.0.1:8090", request_send)
+
+        def work(i):
+            for n in range(10):
+                ret = rpc.get_block(i * 100 + n)
+                assert ret == ["database_api", "get_block", [i * 100 + n]]
+        self.assertEqual(run_threads(work), [])
+        self.assertEqual(len(ids), 640)
+        self.assertEqual(len(set(ids)), 640)
+
+    def test_num_retries_call_per_thread(self):
+        nodes = Nodes(["a"], -1, 5)
+        seen = []
+        ready = threading.Event()
+
+        def other():
+            ready.wait()
+            seen.append(nodes.num_retries_call)
+            nodes.increase_error_cnt_call()
+            seen.append(nodes.error_cnt_call)
+        t = threading.Thread(target=other)
+        t.start()
+        previous = nodes.set_num_retries_call(0)
+        nodes.increase_error_cnt_call()
+        nodes.increase_error_cnt_call()
+        ready.set()
+        t.join()
+        self.assertEqual(seen, [5, 1])
+        self.assertEqual(nodes.num_retries_call, 0)
+        self.assertEqual(nodes.error_cnt_call, 2)
+        nodes.set_num_retries_call(previous)
+        self.assertEqual(nodes.num_retries_call, 5)
+
+    def test_single_failover(self):
+        bad = "http://127.0.0.1:8091"
+        good = "http://127.0.0.1:8092"
+        rpc = None
+
+        def request_send(payload, url=None):
+            query = json.loads(payload.decode('utf8'))
+            time.sleep(0.01)
+            if (url or rpc.url) == bad:
+                raise ConnectionError("connection refused")
+            return json.dumps({"jsonrpc": "2.0", "id": query["id"], "result": {"ok": True}})
+
+        rpc = get_fake_rpc([bad, good], request_send, num_retries=-1)
+        self.assertEqual(run_threads(lambda i: rpc.get_config(), n=16), [])
+        self.assertEqual(rpc.url, good)
+        self.assertEqual(rpc.metrics()[bad]["node_switches"], 1)
@@ -0,0 +1,133 @@
+# This Python file uses the following encoding: utf-8
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+from builtins import range
+import json
+import threading
+import time
+import unittest
+from morphenepythonapi.morphenenoderpc import MorpheneNodeRPC
+from morphenepythonapi.singleflight import SingleFlight
+from morphenepythonapi.rpcutils import get_method_name
+
+
+def run_threads(func, n=8):
+    results = [None] * n
+    errors = [None] * n
+
+    def work(i):
+        try:
+            results[i] = func()
+        except Exception as e:
+            errors[i] = e
+    threads = [threading.Thread(target=work, args=(i, )) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, errors
+
+
+class Testcases(unittest.TestCase):
+
+    def test_coalesce(self):
+        single_flight = SingleFlight()
+        calls = []
+
+        def func():
+            calls.append(1)
+            time.sleep(0.1)
+            return {"head_block_number": 1}
+        results, errors = run_threads(lambda: single_flight.do("key", "get_dynamic_global_properties", func))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(errors, [None] * 8)
+        self.assertTrue(all(r == {"head_block_number": 1} for r in results))
+        self.assertEqual(len(set(id(r) for r in results)), 8)
+        self.assertEqual(single_flight.stats["coalesced"], 7)
+        self.assertEqual(single_flight.flights, {})
+
+    def test_errors(self):
+        single_flight = SingleFlight()
+
+        def func():
+            time.sleep(0.1)
+            raise ValueError("failed")
+        results, errors = run_threads(lambda: single_flight.do("key", "get_config", func))
+        self.assertTrue(all(isinstance(e, ValueError) for e in errors))
+        # Errors are not cached
+        self.assertEqual(single_flight.do("key", "get_config", lambda: 1), 1)
+
+    def test_cache_ttl(self):
+        single_flight = SingleFlight(cache_ttl={"get_config": 0.1}, max_cache_entries=2)
+        calls = []
+
+        def func():
+            calls.append(1)
+            return [len(calls)]
+        self.assertEqual(single_flight.do("a", "get_config", func), [1])
+        cached = single_flight.do("a", "get_config", func)
+        self.assertEqual(cached, [1])
+        cached.append(5)
+        self.assertEqual(single_flight.do("a", "get_config", func), [1])
+        self.assertEqual(single_flight.do("b", "get_block", func), [2])
+        self.assertEqual(single_flight.do("b", "get_block", func), [3])
+        time.sleep(0.11)
+        self.assertEqual(single_flight.do("a", "get_config", func), [4])
+        single_flight.do("c", "get_config", func)
+        single_flight.do("d", "get_config", func)
+        self.assertEqual(len(single_flight.cache), 2)
+
+    def test_rpc(self):
+        requests = []
+
+        def request_send(payload, url=None):
+            query = json.loads(payload.decode('utf8'))
+            requests.append(get_method_name(query))
+            time.sleep(0.1)
+            return json.dumps({"jsonrpc": "2.0", "id": query["id"], "result": {"head_block_number": 1}})
+
+        rpc = MorpheneNodeRPC("http://127.0.0.1:8090", autoconnect=False)
+        rpc.url = "http://127.0.0.1:8090"
+        rpc.current_rpc = rpc.rpc_methods["jsonrpc"]
+        rpc.request_send = request_send
+        results, errors = run_threads(lambda: rpc.get_dynamic_global_properties(api="database"))
+        self.assertEqual(requests, ["get_dynamic_global_properties"])
+        run_threads(lambda: rpc.broadcast_transaction({"trx": {}}, api="network_broadcast"), n=2)
+        self.assertEqual(requests.count("broadcast_transaction"), 2)
+        rpc.coalesce = False
+        run_threads(lambda: rpc.get_dynamic_global_properties(api="database"), n=2)
+        self.assertEqual(requests.count("get_dynamic_global_properties"), 3)
+        # Only frequently repeated read calls are coalesced by default
+        rpc.coalesce = True
+        run_threads(lambda: rpc.get_block(1, api="database"), n=2)
+        self.assertEqual(requests.count("get_block"), 2)
+        rpc.coalesce = ["get_block"]
+        run_threads(lambda: rpc.get_block(1, api="database"), n=2)
+        self.assertEqual(requests.count("get_block"), 3)
+
+    def test_rpc_call_settings(self):
+        requests = []
+
+        def request_send(payload, url=None):
+            query = json.loads(payload.decode('utf8'))
+            requests.append(get_method_name(query))
+            time.sleep(0.1)
+            return json.dumps({"jsonrpc": "2.0", "id": query["id"], "result": {"head_block_number": 1}})
+
+        rpc = MorpheneNodeRPC("http://127.0.0.1:8090", autoconnect=False)
+        rpc.url = "http://127.0.0.1:8090"
+        rpc.current_rpc = rpc.rpc_methods["jsonrpc"]
+        rpc.request_send = request_send
+        num_retries_call = [1, 2]
+        # Calls with other retries do not share a request
+        run_threads(lambda: rpc.get_dynamic_global_properties(api="database", num_retries_call=num_retries_call.pop()), n=2)
+        self.assertEqual(requests.count("get_dynamic_global_properties"), 2)
+        priorities = ["bulk", "critical"]
+
+        def call_with_priority():
+            with rpc.priority(priorities.pop()):
+                return rpc.get_dynamic_global_properties(api="database")
+        run_threads(call_with_priority, n=2)
+        self.assertEqual(requests.count("get_dynamic_global_properties"), 4)